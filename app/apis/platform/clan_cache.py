@@ -1,5 +1,3 @@
-import gc
-
 from app.log import ExceptionLogger
 from app.response import ResponseDict, JSONResponse
 from app.models import ClanModel
@@ -1,5 +1,3 @@
-import gc
-
 from app.log import ExceptionLogger
 from app.response import ResponseDict, JSONResponse
 from app.network import BasicAPI
@@ -31,6 +29,4 @@ class GameBasic:
                 return result
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
         
\ No newline at end of file
@@ -1,5 +1,3 @@
-import gc
-
 from app.log import ExceptionLogger
 from app.response import ResponseDict, JSONResponse
 from app.models import UserModel, ClanModel, UserAccessToken
@@ -15,8 +13,6 @@ class GameUser:
             return result
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     # @ExceptionLogger.handle_program_exception_async
     # async def update_user_data(user_data: dict) -> ResponseDict:
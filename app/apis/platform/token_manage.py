@@ -1,5 +1,3 @@
-import gc
-
 from app.log import ExceptionLogger
 from app.middlewares import RedisConnection
 from app.response import ResponseDict, JSONResponse
@@ -23,8 +21,6 @@ class GameUser:
             return token_result
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @ExceptionLogger.handle_program_exception_async
     async def set_user_token(region_id: int, account_id: int, token_type: int) -> ResponseDict:
@@ -32,14 +28,10 @@ class GameUser:
             ...
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @ExceptionLogger.handle_program_exception_async
     async def delete_user_token(region_id: int, account_id: int, token_type: int) -> ResponseDict:
         try:
             ...
         except Exception as e:
-            raise e
-        finally:
-            gc.collect()
\ No newline at end of file
+            raise e
\ No newline at end of file
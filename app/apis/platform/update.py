@@ -1,5 +1,3 @@
-import gc
-
 from app.log import ExceptionLogger
 from app.network import OtherAPI
 from app.response import JSONResponse, ResponseDict
@@ -14,8 +12,8 @@ class Update:
                 server = 'lesta'
             else:
                 server = 'wg'
-            # 加载旧数据
-            ship_name_data = JsonData.read_json_data(f'ship_name_{server}')
+            # 加载旧数据，需要修改数据所以读取缓存的副本
+            ship_name_data = JsonData.read_json_data(f'ship_name_{server}', copy_data=True)
             # 获取当前最新的数据
             ship_name_result = await OtherAPI.get_ship_name_data(region_id)
             if ship_name_result['code'] != 1000:
@@ -116,6 +114,4 @@ class Update:
             # 返回数据
             return JSONResponse.get_success_response(result)
         except Exception as e:
-            raise e
-        finally:
-            gc.collect()
\ No newline at end of file
+            raise e
\ No newline at end of file
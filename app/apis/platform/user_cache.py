@@ -1,18 +1,18 @@
-import gc
-
 from app.log import ExceptionLogger
 from app.response import ResponseDict, JSONResponse
 from app.network import BasicAPI
 from app.models import UserModel, UserAccessToken, ShipsCacheModel
-from app.utils import UtilityFunctions
+from app.utils import UserShipsDiff
 
 class UserCache:
     @ExceptionLogger.handle_program_exception_async
     async def update_user_cache(region_id: int, account_id: int) -> ResponseDict:
         try:
-            user_data = await UserModel.get_user_cache(region_id, account_id)
+            user_data = await UserModel.get_user_cache(account_id, region_id)
             if user_data['code'] != 1000:
                 return user_data
+            # 新用户没有缓存数据
+            cache_data = user_data['data'] or {'hash_value': None, 'ships_data': None}
             token_data = await UserAccessToken.get_ac_value_by_id(account_id, region_id)
             if token_data['code'] != 1000:
                 return token_data
@@ -77,42 +77,26 @@ class UserCache:
             if ships_data['code'] != 1000 and ships_data['code'] != 1001:
                 return ships_data
             new_user_data = ships_data['data']
-            sorted_dict = dict(sorted(new_user_data['basic'].items()))
-            new_hash_value = UtilityFunctions.get_sha256_value(str(sorted_dict))
-            if user_data['user_ships']['hash_value'] == new_hash_value:
-                user_cache['battles_count'] = user_info['total_battles']
-            else:
-                user_cache['battles_count'] = user_info['total_battles']
+            new_hash_value = UserShipsDiff.get_hash_value(new_user_data['basic'])
+            user_cache['battles_count'] = user_info['total_battles']
+            if cache_data['hash_value'] != new_hash_value:
                 user_cache['hash_value'] = new_hash_value
-                user_cache['ships_data'] = sorted_dict
-                user_cache['details_data'] = new_user_data['details']
-            cache_data = UserModel.get_user_cache(account_id, region_id)
-            if cache_data.get('code', None) != 1000:
-                return cache_data
-            ship_id_set = set()
-            replace_ship_dict = {}
-            if 'hash_value' in user_cache:
-                for ship_id, ship_battles in user_cache['ships_data'].items():
-                    if (
-                        int(ship_id) not in cache_data['data']['ships_data'] or 
-                        ship_battles != cache_data['data']['ships_data']
-                    ):
-                        replace_ship_dict[int(ship_id)] = user_cache['details_data'][ship_id]
-                        ship_id_set.add(int(ship_id))
-                check_ship_id_result = ShipsCacheModel.check_existing_ship(ship_id_set)
+                user_cache['ships_data'] = new_user_data['basic']
+                # 只有新增、场次变化和已经不存在的船只需要写入船只表
+                added, changed, removed = UserShipsDiff.get_delta(
+                    cache_data['ships_data'], new_user_data['basic']
+                )
+                check_ship_id_result = await ShipsCacheModel.check_existing_ship(set(added + changed + removed))
                 if check_ship_id_result.get('code', None) != 1000:
                     return check_ship_id_result
-                if replace_ship_dict != {}:
-                    user_cache['ship_dict'] = replace_ship_dict
-                else:
-                    user_cache['ship_dict'] = None
-                del user_data['details_data']
+                user_cache['ship_dict'] = {ship_id: new_user_data['details'][ship_id] for ship_id in added + changed}
+                user_cache['delete_ship_list'] = removed
+                # 用户所有船只的数据，和船只表在同一个事务中写入user_ship_stats
+                user_cache['ships_stats'] = new_user_data['details']
             update_result = await ShipsCacheModel.update_user_ships(user_cache)
             return update_result
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     # @ExceptionLogger.handle_program_exception_async
     # async def get_user_cache_data_batch(offset: int, limit: int = 1000) -> ResponseDict:
@@ -0,0 +1,166 @@
+import os
+import csv
+import time
+import threading
+from array import array
+
+from app.core import EnvConfig, api_logger
+
+config = EnvConfig.get_config()
+
+
+def parse_column(values: list[str]):
+    '''将csv中的一列数据转换为紧凑的列式存储
+
+    整数列使用array('q')，浮点列使用array('d')，包含空值或者字符串的列使用list，空值为None
+    '''
+    has_empty = False
+    for value in values:
+        if value == '':
+            has_empty = True
+            break
+    parsed = []
+    for parser in (int, float):
+        try:
+            parsed = [parser(value) if value != '' else None for value in values]
+        except ValueError:
+            continue
+        if has_empty:
+            return parsed
+        return array('q' if parser is int else 'd', parsed)
+    return [value if value != '' else None for value in values]
+
+
+class LeaderBoard:
+    '''单个船只的排行榜数据
+
+    数据按列存储，行顺序即csv中的排名顺序，每个服务器预先计算行号索引(0表示全部服务器)
+    '''
+    __slots__ = ('fields', 'columns', 'region_index', 'stat_key')
+
+    def __init__(self, fields: list[str], columns: list, region_index: dict, stat_key: tuple):
+        self.fields = fields
+        self.columns = columns
+        self.region_index = region_index
+        self.stat_key = stat_key
+
+    @classmethod
+    def from_csv(self, file_path: str, stat_key: tuple) -> 'LeaderBoard':
+        with open(file_path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            fields = next(reader, [])
+            rows = [row for row in reader if row]
+        columns = [parse_column([row[i] if i < len(row) else '' for row in rows]) for i in range(len(fields))]
+        region_index = {0: range(len(rows))}
+        if 'region_id' in fields:
+            region_column = columns[fields.index('region_id')]
+            for i, region_id in enumerate(region_column):
+                if region_id is None:
+                    continue
+                if region_id not in region_index:
+                    region_index[region_id] = array('I')
+                region_index[region_id].append(i)
+        return self(fields, columns, region_index, stat_key)
+
+    def get_page(self, region_id: int, page: int, page_size: int) -> list[dict]:
+        '''获取某一页的排行榜数据
+
+        返回:
+            list 每一项包含rank和csv中的所有字段
+        '''
+        offsets = self.region_index.get(region_id)
+        if offsets is None:
+            return []
+        start = (page - 1) * page_size
+        result = []
+        for rank, i in enumerate(offsets[start:start + page_size], start + 1):
+            player = {'rank': rank}
+            for field, column in zip(self.fields, self.columns):
+                player[field] = column[i]
+            result.append(player)
+        return result
+
+    @property
+    def version(self) -> str:
+        "数据版本，csv文件变化(重新生成或者修改)后版本随之变化"
+        return '{:x}-{:x}-{:x}'.format(*self.stat_key)
+
+    def count(self, region_id: int) -> int:
+        "某个服务器上榜的用户数量"
+        offsets = self.region_index.get(region_id)
+        return len(offsets) if offsets is not None else 0
+
+
+class LeaderBoardStore:
+    '''进程内的排行榜数据
+
+    每个船只的排行榜csv只加载一次，之后按页获取只需要切片行号索引
+    距离上次检查超过CHECK_INTERVAL后才会检查文件是否变化，变化后重新加载
+    '''
+    PAGE_SIZE = 100
+    CHECK_INTERVAL = 60
+    __lock = threading.Lock()
+    __boards: dict[int, LeaderBoard] = {}
+    __checked_at: dict[int, float] = {}
+
+    def get_file_path(ship_id: int) -> str:
+        return os.path.join(config.LEADER_PATH, f'{ship_id}.csv')
+
+    @classmethod
+    def __load_board(self, ship_id: int) -> LeaderBoard | None:
+        "加载或者在文件变化后重新加载排行榜数据"
+        now = time.monotonic()
+        board = self.__boards.get(ship_id)
+        if board is not None and now - self.__checked_at.get(ship_id, 0) < self.CHECK_INTERVAL:
+            return board
+        with self.__lock:
+            self.__checked_at[ship_id] = now
+            file_path = self.get_file_path(ship_id)
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                self.__boards.pop(ship_id, None)
+                return None
+            stat_key = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+            board = self.__boards.get(ship_id)
+            if board is not None and board.stat_key == stat_key:
+                return board
+            # 整体替换，正在读取旧数据的请求不受影响
+            board = LeaderBoard.from_csv(file_path, stat_key)
+            self.__boards[ship_id] = board
+            return board
+
+    @classmethod
+    def preload(self) -> int:
+        '''预先加载目录下所有船只的排行榜数据
+
+        返回:
+            int 加载的船只数量
+        '''
+        if not os.path.isdir(config.LEADER_PATH):
+            return 0
+        count = 0
+        for file_name in os.listdir(config.LEADER_PATH):
+            ship_id, ext = os.path.splitext(file_name)
+            if ext != '.csv' or not ship_id.isdigit():
+                continue
+            if self.__load_board(int(ship_id)) is not None:
+                count += 1
+        api_logger.info(f'Leaderboard data loaded, {count} ships')
+        return count
+
+    @classmethod
+    def get_board(self, ship_id: int) -> LeaderBoard | None:
+        "获取单船的排行榜数据，船只没有排行榜数据时返回None"
+        return self.__load_board(ship_id)
+
+    @classmethod
+    def get_page(self, region_id: int, ship_id: int, page: int) -> list[dict]:
+        '''获取单船某一页的排名数据
+
+        船只没有排行榜数据时返回空列表
+        '''
+        board = self.__load_board(ship_id)
+        if board is None:
+            return []
+        return board.get_page(region_id, page, self.PAGE_SIZE)
@@ -0,0 +1,136 @@
+import json
+import uuid
+import asyncio
+from typing import Callable
+
+from app.core import api_logger
+from app.middlewares import RedisConnection
+
+# 只有锁的值和当前请求的token一致时才删除，避免锁过期后删除其他请求获取的锁
+RELEASE_LOCK_SCRIPT = '''
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+'''
+
+
+class LeaderboardPageCache:
+    '''排行榜分页数据的redis读穿缓存
+
+    每一页序列化后通过一次SET写入，命中时直接返回缓存数据
+
+    未命中时先获取一个短时间的锁，同一页只有获取到锁的请求会计算并写入，
+    其他请求等待缓存写入后读取，等待超时则自行计算(不写入)
+
+    缓存key中带有排行榜数据的版本，数据更新后直接使用新的key，旧的key等待过期
+    '''
+    TTL = 1800
+    LOCK_TTL = 5
+    # 未获取到锁时等待缓存写入的次数和间隔(s)
+    WAIT_TIMES = 10
+    WAIT_INTERVAL = 0.05
+    _stats = {
+        'hit': 0,       # 直接命中缓存
+        'wait_hit': 0,  # 等待其他请求写入后命中
+        'miss': 0,      # 未命中并计算
+        'error': 0      # redis读写失败
+    }
+    __release_script = None
+
+    def get_cache_key(region_id: int, ship_id: int, version: str, page: int) -> str:
+        return f'leaderboard:{region_id}:{ship_id}:{version}:{page}'
+
+    @classmethod
+    async def __get(self, redis, key: str) -> list | None:
+        try:
+            value = await redis.get(key)
+            return json.loads(value) if value is not None else None
+        except Exception as e:
+            # 缓存不可用或者是旧版本的list类型key，按未命中处理，写入时会被SET覆盖
+            self._stats['error'] += 1
+            api_logger.warning(f'Failed to read leaderboard cache: {e}')
+            return None
+
+    @classmethod
+    async def __release(self, redis, lock_key: str, token: str) -> None:
+        "通过脚本比较并删除锁"
+        try:
+            if self.__release_script is None:
+                self.__release_script = redis.register_script(RELEASE_LOCK_SCRIPT)
+            await self.__release_script(keys=[lock_key], args=[token], client=redis)
+        except Exception as e:
+            # 释放失败时锁会在LOCK_TTL后过期
+            self._stats['error'] += 1
+            api_logger.warning(f'Failed to release leaderboard cache lock: {e}')
+
+    @classmethod
+    async def get_page(
+        self,
+        region_id: int,
+        ship_id: int,
+        page: int,
+        version: str,
+        loader: Callable[[], list]
+    ) -> list:
+        '''读取缓存的排行榜分页数据，未命中时通过loader计算并写入缓存
+
+        参数:
+            region_id: 服务器id
+            ship_id: 船只id
+            page: 页码
+            version: 排行榜数据的版本
+            loader: 计算当前页数据的函数
+
+        返回:
+            list
+        '''
+        redis = RedisConnection.get_connection(0)
+        if redis is None:
+            self._stats['error'] += 1
+            return loader()
+        key = self.get_cache_key(region_id, ship_id, version, page)
+        data = await self.__get(redis, key)
+        if data is not None:
+            self._stats['hit'] += 1
+            return data
+        lock_key = f'{key}:lock'
+        token = uuid.uuid4().hex
+        try:
+            locked = await redis.set(lock_key, token, nx=True, ex=self.LOCK_TTL)
+        except Exception as e:
+            self._stats['error'] += 1
+            api_logger.warning(f'Failed to lock leaderboard cache: {e}')
+            return loader()
+        if not locked:
+            # 其他请求正在计算同一页
+            for _ in range(self.WAIT_TIMES):
+                await asyncio.sleep(self.WAIT_INTERVAL)
+                data = await self.__get(redis, key)
+                if data is not None:
+                    self._stats['wait_hit'] += 1
+                    return data
+            self._stats['miss'] += 1
+            return loader()
+        self._stats['miss'] += 1
+        try:
+            data = loader()
+        except Exception:
+            await self.__release(redis, lock_key, token)
+            raise
+        try:
+            await redis.set(key, json.dumps(data, ensure_ascii=False), ex=self.TTL)
+        except Exception as e:
+            self._stats['error'] += 1
+            api_logger.warning(f'Failed to write leaderboard cache: {e}')
+        await self.__release(redis, lock_key, token)
+        return data
+
+    @classmethod
+    def get_stats(self) -> dict:
+        "获取排行榜分页缓存的统计数据"
+        total = self._stats['hit'] + self._stats['wait_hit'] + self._stats['miss']
+        return {
+            **self._stats,
+            'hit_ratio': round((self._stats['hit'] + self._stats['wait_hit']) / total, 4) if total else 0.0
+        }
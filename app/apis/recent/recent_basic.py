@@ -1,5 +1,3 @@
-import gc
-
 from app.network import BasicAPI
 from app.log import ExceptionLogger
 from app.response import JSONResponse, ResponseDict
@@ -26,8 +24,6 @@ class RecentBasic:
             return JSONResponse.get_success_response(data)            
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @classmethod
     @ExceptionLogger.handle_program_exception_async
@@ -40,8 +36,6 @@ class RecentBasic:
             return result
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @ExceptionLogger.handle_program_exception_async
     async def del_recent(account_id: int,region_id: int) -> ResponseDict:
@@ -52,8 +46,6 @@ class RecentBasic:
             return result
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @ExceptionLogger.handle_program_exception_async
     async def get_user_recent(account_id: int, region_id: int) -> ResponseDict:
@@ -62,8 +54,6 @@ class RecentBasic:
             return result
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     # async def __check_user_status(account_id: int,region_id: int) -> ResponseDict:
     #     '''检查用户数据是否符合开启recent的条件
@@ -1,5 +1,3 @@
-import gc
-
 from app.log import ExceptionLogger
 from app.models import RecentUserModel
 from app.response import JSONResponse, ResponseDict
@@ -16,8 +14,6 @@ class RecentData:
             return JSONResponse.get_success_response(data)    
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     async def get_data_by_date():
         ...
@@ -1,5 +1,3 @@
-import gc
-
 from app.log import ExceptionLogger
 from app.response import ResponseDict
 from app.models import RootModel
@@ -13,8 +11,6 @@ class RootData:
             return result         
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @ExceptionLogger.handle_program_exception_async
     async def get_innodb_processlist() -> ResponseDict:
@@ -23,8 +19,6 @@ class RootData:
             return result         
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @ExceptionLogger.handle_program_exception_async
     async def get_basic_user_overview() -> ResponseDict:
@@ -33,8 +27,6 @@ class RootData:
             return result         
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @ExceptionLogger.handle_program_exception_async
     async def get_basic_clan_overview() -> ResponseDict:
@@ -43,8 +35,6 @@ class RootData:
             return result         
         except Exception as e:
             raise e
-        finally:
-            gc.collect()
 
     @ExceptionLogger.handle_program_exception_async
     async def get_recent_user_overview() -> ResponseDict:
@@ -52,6 +42,4 @@ class RootData:
             result = await RootModel.get_recent_user_overview()
             return result         
         except Exception as e:
-            raise e
-        finally:
-            gc.collect()
\ No newline at end of file
+            raise e
\ No newline at end of file
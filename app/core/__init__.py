@@ -1,9 +1,11 @@
 from .config import EnvConfig
 from .service import ServiceStatus
 from .logger import api_logger
+from .gc_manager import GCManager
 
 __all__ = [
     'EnvConfig',
     'ServiceStatus',
-    'api_logger'
+    'api_logger',
+    'GCManager'
 ]
\ No newline at end of file
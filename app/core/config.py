@@ -18,12 +18,20 @@ class LoadConfig(BaseSettings):
     DB_NAME_MAIN: str
     DB_NAME_BOT: str
     DB_NAME_SHIP: str
+    # 船只缓存数据的存储方式
+    # tables: 每个船只一张ship_{id}表
+    # partitioned: 所有船只保存在按ship_id分区的ship_stats表中
+    SHIP_STORAGE: str = 'tables'
 
     SQLITE_PATH: str
     
     REDIS_HOST: str
     REDIS_PORT: int
     REDIS_PASSWORD: str
+    # 上游接口缓存使用的redis数据库
+    REDIS_CACHE_DB: int = 2
+    # 是否在访问redis前使用进程内令牌桶预先检查限速
+    RATE_LIMIT_LOCAL: bool = True
     
     RABBITMQ_HOST: str
     RABBITMQ_USERNAME: str
@@ -32,6 +40,23 @@ class LoadConfig(BaseSettings):
     WG_API_TOKEN: str
     LESTA_API_TOKEN: str
 
+    # 垃圾回收的阈值，以及定时任务中主动回收的代(-1表示不主动回收)
+    GC_THRESHOLD_0: int = 50000
+    GC_THRESHOLD_1: int = 20
+    GC_THRESHOLD_2: int = 20
+    GC_PERIODIC_GENERATION: int = 2
+
+    # 上游接口的连接池配置
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30
+    # 相同上游请求结果的共享时间(s)，0表示只合并同时进行的请求
+    SINGLE_FLIGHT_TTL: float = 0
+
+    # 启动时是否预先加载全部排行榜数据，否则在第一次请求时加载
+    LEADERBOARD_PRELOAD: bool = True
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,82 @@
+import gc
+import time
+
+from .config import EnvConfig
+from .logger import api_logger
+
+
+class GCManager:
+    '''管理进程的垃圾回收策略
+
+    1. 启动完成后freeze，启动阶段创建的长期对象不再参与之后的回收
+    2. 调高各代的回收阈值，减少请求过程中触发的回收次数
+    3. 可选在定时任务中主动回收，而不是在请求处理中回收
+    4. 通过gc.callbacks记录每代回收的次数、停顿时间和回收的对象数量
+    '''
+    _started_at = None
+    _stats = {
+        generation: {
+            'collections': 0,       # 回收次数
+            'collected': 0,         # 回收的对象数量
+            'uncollectable': 0,     # 无法回收的对象数量
+            'pause_total': 0.0,     # 总停顿时间(s)
+            'pause_max': 0.0        # 最长停顿时间(s)
+        } for generation in range(3)
+    }
+
+    @classmethod
+    def _callback(cls, phase: str, info: dict) -> None:
+        if phase == 'start':
+            cls._started_at = time.perf_counter()
+            return
+        if cls._started_at is None:
+            return
+        pause = time.perf_counter() - cls._started_at
+        cls._started_at = None
+        stats = cls._stats[info['generation']]
+        stats['collections'] += 1
+        stats['collected'] += info['collected']
+        stats['uncollectable'] += info['uncollectable']
+        stats['pause_total'] += pause
+        if pause > stats['pause_max']:
+            stats['pause_max'] = pause
+
+    @classmethod
+    def setup(cls) -> None:
+        "设置回收阈值并开始记录回收数据"
+        config = EnvConfig.get_config()
+        gc.set_threshold(config.GC_THRESHOLD_0, config.GC_THRESHOLD_1, config.GC_THRESHOLD_2)
+        if cls._callback not in gc.callbacks:
+            gc.callbacks.append(cls._callback)
+        api_logger.info(f'GC threshold: {gc.get_threshold()}')
+
+    @classmethod
+    def freeze(cls) -> None:
+        "启动预热完成后调用，将当前存活的对象移入永久代"
+        gc.collect()
+        gc.freeze()
+        api_logger.info(f'GC freeze: {gc.get_freeze_count()} objects')
+
+    @classmethod
+    def collect(cls) -> None:
+        "在请求处理之外主动进行一次回收，由定时任务调用"
+        config = EnvConfig.get_config()
+        if config.GC_PERIODIC_GENERATION >= 0:
+            gc.collect(config.GC_PERIODIC_GENERATION)
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        "获取各代回收的统计数据"
+        return {
+            'threshold': gc.get_threshold(),
+            'count': gc.get_count(),
+            'frozen': gc.get_freeze_count(),
+            'generations': {
+                generation: {
+                    **stats,
+                    'pause_total': round(stats['pause_total'], 6),
+                    'pause_max': round(stats['pause_max'], 6),
+                    'pause_avg': round(stats['pause_total'] / stats['collections'], 6) if stats['collections'] else 0.0
+                } for generation, stats in cls._stats.items()
+            }
+        }
@@ -1,6 +1,8 @@
 from .load_data import JsonData
+from .ship_index import ShipDataIndex
 
 
 __all__ = [
-    'JsonData'
+    'JsonData',
+    'ShipDataIndex'
 ]
\ No newline at end of file
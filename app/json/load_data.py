@@ -1,20 +1,114 @@
 import os
 import json
+import time
+import hashlib
+import threading
+from copy import deepcopy
+
 from app.core import EnvConfig
 
 config = EnvConfig.get_config()
 
 class JsonData:
-    '''加载json数据'''
-    def read_json_data(self, json_file_name: str):
-        file_path = os.path.join(config.JSON_PATH,f'{json_file_name}.json')
-        temp = open(file_path, "r", encoding="utf-8")
-        data = json.load(temp)
-        temp.close()
-        return data
-    
+    '''加载json数据
+
+    进程内的json数据缓存，每个文件只会在首次读取或者文件发生变化时解析一次
+
+    文件变化通过 mtime/size 判断，mtime变化后再对比文件内容的哈希值，内容没有变化则不会重新解析
+
+    缓存条目在加载完成后整体替换，读取方不会拿到加载到一半的数据
+    '''
+    # 两次检查文件状态的最小间隔(s)，避免每次读取都调用stat
+    CHECK_INTERVAL = 1
+    # 缓存数据 {json_file_name: (stat_key, hash_value, data)}
+    __cache: dict[str, tuple] = {}
+    # 上次检查文件状态的时间 {json_file_name: timestamp}
+    __checked_at: dict[str, float] = {}
+    __lock = threading.Lock()
+    __stats = {
+        'hit': 0,       # 直接命中缓存
+        'reload': 0,    # 文件内容变化，重新解析
+        'unchanged': 0  # 文件mtime变化但内容未变化
+    }
+
+    def __get_file_path(json_file_name: str) -> str:
+        return os.path.join(config.JSON_PATH,f'{json_file_name}.json')
+
+    def __get_stat_key(file_path: str) -> tuple:
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def read_json_data(self, json_file_name: str, copy_data: bool = False):
+        '''读取json数据
+
+        参数:
+            json_file_name: json文件名称
+            copy_data: 是否返回数据的副本，需要修改数据的调用方必须使用副本
+
+        返回:
+            dict
+        '''
+        entry = self.__cache.get(json_file_name)
+        now = time.monotonic()
+        if (
+            entry is not None and
+            now - self.__checked_at.get(json_file_name, 0) < self.CHECK_INTERVAL
+        ):
+            self.__stats['hit'] += 1
+            return deepcopy(entry[2]) if copy_data else entry[2]
+        file_path = self.__get_file_path(json_file_name)
+        stat_key = self.__get_stat_key(file_path)
+        if entry is not None and entry[0] == stat_key:
+            self.__checked_at[json_file_name] = now
+            self.__stats['hit'] += 1
+            return deepcopy(entry[2]) if copy_data else entry[2]
+        with self.__lock:
+            # 等待锁的过程中可能已经被其他线程加载
+            entry = self.__cache.get(json_file_name)
+            if entry is not None and entry[0] == stat_key:
+                self.__stats['hit'] += 1
+            else:
+                with open(file_path, 'rb') as f:
+                    content = f.read()
+                stat_key = self.__get_stat_key(file_path)
+                hash_value = hashlib.sha256(content).hexdigest()
+                if entry is not None and entry[1] == hash_value:
+                    # 内容未变化，只更新文件状态
+                    entry = (stat_key, hash_value, entry[2])
+                    self.__stats['unchanged'] += 1
+                else:
+                    entry = (stat_key, hash_value, json.loads(content))
+                    self.__stats['reload'] += 1
+                self.__cache[json_file_name] = entry
+            self.__checked_at[json_file_name] = time.monotonic()
+        return deepcopy(entry[2]) if copy_data else entry[2]
+
+    @classmethod
     def write_json_data(self, json_file_name: str, json_data: dict):
-        file_path = os.path.join(config.JSON_PATH,f'{json_file_name}.json')
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(json.dumps(json_data, ensure_ascii=False))
-        f.close()
\ No newline at end of file
+        '''写入json数据
+
+        先写入临时文件再替换原文件，写入完成后直接更新缓存
+        '''
+        file_path = self.__get_file_path(json_file_name)
+        content = json.dumps(json_data, ensure_ascii=False).encode('utf-8')
+        temp_path = f'{file_path}.{os.getpid()}.tmp'
+        with self.__lock:
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, file_path)
+            self.__cache[json_file_name] = (
+                self.__get_stat_key(file_path),
+                hashlib.sha256(content).hexdigest(),
+                json.loads(content)
+            )
+            self.__checked_at[json_file_name] = time.monotonic()
+            self.__stats['reload'] += 1
+
+    @classmethod
+    def get_cache_stats(self) -> dict:
+        "获取缓存的命中和重新加载次数"
+        return {
+            'files': list(self.__cache.keys()),
+            **self.__stats
+        }
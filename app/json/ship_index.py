@@ -0,0 +1,216 @@
+import os
+import sys
+import mmap
+import json
+import asyncio
+import time
+import math
+import struct
+import bisect
+import threading
+from array import array
+
+from app.core import EnvConfig, api_logger
+from app.const import GameData
+
+config = EnvConfig.get_config()
+
+# 文件结构(小端序):
+# | header 16 bytes | ship_id uint64 * n | float64 * n * REGIONS * FIELDS |
+# header: magic(4s) version(H) regions(H) fields(I) n_ships(I)
+INDEX_MAGIC = b'KSDI'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sHHII')
+INDEX_REGIONS = [r for r, _ in sorted(GameData.REGION_LIST.items(), key=lambda x: x[1])]
+INDEX_FIELDS = ['win_rate', 'avg_damage', 'avg_frags', 'avg_exp', 'battles_count']
+
+class ShipIndexSnapshot:
+    "一次加载的索引数据，ship_id数组和数据表来自同一个文件"
+    __slots__ = ('ship_ids', 'table')
+
+    def __init__(self, ship_ids: memoryview, table: memoryview):
+        self.ship_ids = ship_ids    # memoryview('Q')
+        self.table = table          # memoryview('d')
+
+    def get_offset(self, region_id: int, ship_id: int) -> int:
+        '''获取船只某个服务器数据在数据表中的偏移量
+
+        返回:
+            int 偏移量，船只不存在或者region_id超出范围则返回 -1
+        '''
+        if not 1 <= region_id <= len(INDEX_REGIONS):
+            # 超出范围的偏移量会落在相邻船只的数据中
+            return -1
+        ship_ids = self.ship_ids
+        i = bisect.bisect_left(ship_ids, ship_id)
+        if i == len(ship_ids) or ship_ids[i] != ship_id:
+            return -1
+        return (i * len(INDEX_REGIONS) + region_id - 1) * len(INDEX_FIELDS)
+
+    def get_value(self, offset: int, field_index: int) -> float:
+        "根据偏移量读取数据，字段顺序见INDEX_FIELDS"
+        return self.table[offset + field_index]
+
+
+class ShipDataIndex:
+    '''船只服务器数据的二进制索引
+
+    将ship_data.json中每个服务器的数据编译为固定结构的二进制文件，
+    每个worker以只读方式mmap该文件，多个worker共享同一份物理内存
+
+    查询通过对有序的ship_id数组二分查找实现，复杂度O(log n)，不需要解析json
+
+    加载后的数据整体发布为一个ShipIndexSnapshot，调用方每次查询前获取一次快照，
+    重新加载不会影响正在使用旧快照的调用方
+
+    索引落后于json文件时在线程池中重新编译，编译期间继续使用当前的快照，不会阻塞事件循环
+    '''
+    CHECK_INTERVAL = 1
+    __lock = threading.Lock()
+    __mmap = None
+    __snapshot: ShipIndexSnapshot | None = None
+    __stat_key = None
+    __checked_at = 0
+    __rebuilding = False
+
+    def get_json_path(json_file_name: str = 'ship_data') -> str:
+        return os.path.join(config.JSON_PATH, f'{json_file_name}.json')
+
+    def get_index_path(json_file_name: str = 'ship_data') -> str:
+        return os.path.join(config.JSON_PATH, f'{json_file_name}.bin')
+
+    @classmethod
+    def build_index(self, json_file_name: str = 'ship_data', force: bool = False) -> bool:
+        '''从json数据编译二进制索引文件
+
+        先写入临时文件再替换，已经mmap旧文件的worker不受影响
+
+        参数:
+            json_file_name: json文件名称
+            force: 索引文件比json文件新时是否仍然重新编译
+
+        返回:
+            bool 是否重新编译
+        '''
+        json_path = self.get_json_path(json_file_name)
+        index_path = self.get_index_path(json_file_name)
+        if (
+            not force and
+            os.path.exists(index_path) and
+            os.stat(index_path).st_mtime_ns >= os.stat(json_path).st_mtime_ns
+        ):
+            return False
+        with open(json_path, 'r', encoding='utf-8') as f:
+            ship_data = json.load(f)['ship_data']
+        ship_ids = array('Q', sorted(int(ship_id) for ship_id in ship_data.keys()))
+        table = array('d')
+        for ship_id in ship_ids:
+            region_data = ship_data[str(ship_id)]
+            for region in INDEX_REGIONS:
+                data = region_data.get(region, {})
+                for field in INDEX_FIELDS:
+                    # 缺失的数据使用nan表示
+                    value = data.get(field)
+                    table.append(float(value) if value is not None else math.nan)
+        if sys.byteorder != 'little':
+            ship_ids.byteswap()
+            table.byteswap()
+        temp_path = f'{index_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(INDEX_REGIONS), len(INDEX_FIELDS), len(ship_ids)))
+            f.write(ship_ids.tobytes())
+            f.write(table.tobytes())
+        os.replace(temp_path, index_path)
+        api_logger.info(f'Ship data index built, {len(ship_ids)} ships')
+        return True
+
+    @classmethod
+    def __load_index(self) -> None:
+        "加载或者在文件变化后重新加载索引"
+        now = time.monotonic()
+        if now - self.__checked_at < self.CHECK_INTERVAL:
+            return
+        with self.__lock:
+            self.__checked_at = now
+            index_path = self.get_index_path()
+            try:
+                index_stat = os.stat(index_path)
+                json_stat = os.stat(self.get_json_path())
+            except FileNotFoundError:
+                self.__snapshot = None
+                self.__stat_key = None
+                return
+            if index_stat.st_mtime_ns < json_stat.st_mtime_ns:
+                # 索引文件落后于json文件，在后台重新编译，完成后的下一次检查会加载新文件
+                # 编译完成之前继续使用当前的快照，没有快照时调用方回退到json数据
+                self.__schedule_rebuild()
+                return
+            stat_key = (index_stat.st_ino, index_stat.st_mtime_ns, index_stat.st_size)
+            if stat_key == self.__stat_key:
+                return
+            if sys.byteorder != 'little':
+                return
+            with open(index_path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, regions, fields, n_ships = INDEX_HEADER.unpack_from(mm, 0)
+            if (
+                magic != INDEX_MAGIC or version != INDEX_VERSION or
+                regions != len(INDEX_REGIONS) or fields != len(INDEX_FIELDS)
+            ):
+                mm.close()
+                api_logger.warning('Invalid ship data index file')
+                return
+            view = memoryview(mm)
+            ids_start = INDEX_HEADER.size
+            table_start = ids_start + n_ships * 8
+            table_end = table_start + n_ships * regions * fields * 8
+            # 旧的mmap不主动关闭，仍在使用的读取方不会受影响，引用释放后自动回收
+            self.__snapshot = ShipIndexSnapshot(
+                view[ids_start:table_start].cast('Q'),
+                view[table_start:table_end].cast('d')
+            )
+            self.__mmap = mm
+            self.__stat_key = stat_key
+            api_logger.info(f'Ship data index loaded, {n_ships} ships')
+
+    @classmethod
+    def __schedule_rebuild(self) -> None:
+        "在线程池中重新编译索引，同一时间只会有一个编译任务"
+        if self.__rebuilding:
+            return
+        self.__rebuilding = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            # 不在事件循环中(例如命令行)，直接编译
+            self.__rebuild()
+        else:
+            loop.run_in_executor(None, self.__rebuild)
+
+    @classmethod
+    def __rebuild(self) -> None:
+        try:
+            self.build_index()
+        except Exception as e:
+            api_logger.warning(f'Failed to rebuild ship data index: {e}')
+        finally:
+            self.__rebuilding = False
+            # 下一次查询时立即检查新的索引文件
+            self.__checked_at = 0
+
+    @classmethod
+    def get_snapshot(self) -> ShipIndexSnapshot | None:
+        '''获取当前的索引数据
+
+        返回:
+            ShipIndexSnapshot 索引不可用时返回None，调用方应当回退到json数据
+        '''
+        self.__load_index()
+        return self.__snapshot
+
+
+if __name__ == '__main__':
+    # 编译索引: python -m app.json.ship_index
+    ShipDataIndex.build_index(force=True)
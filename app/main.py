@@ -8,10 +8,17 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
-from app.core import EnvConfig, api_logger
+from app.core import EnvConfig, GCManager, api_logger
 from app.db import MysqlConnection
+from app.json import ShipDataIndex
+from app.models import ShipsCacheModel
+from app.apis.rank.leader_store import LeaderBoardStore
+from app.network import HttpClient, no_cache_context
 from app.response import JSONResponse as API_JSONResponse
-from app.middlewares import RedisConnection, IPAccessListManager, rate_limit
+from app.middlewares import (
+    RedisConnection, IPAccessListManager, rate_limit, 
+    flush_api_calls, request_scope_context
+)
 
 from app.routers import (
     platform_router, robot_router, recent_1_router, 
@@ -21,28 +28,49 @@ from app.routers import (
 
 async def schedule():
     while True:
-        api_logger.info("API日志数据上传")
-        # 这里实现具体任务
         await asyncio.sleep(60)  # 每 60 秒执行一次任务
+        api_logger.info("API日志数据上传")
+        await flush_api_calls()
+        # 在请求处理之外进行垃圾回收
+        GCManager.collect()
 
 # 应用程序的生命周期
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 从环境中加载配置
     EnvConfig.get_config()
+    # 设置垃圾回收阈值
+    GCManager.setup()
     # 初始化redis并测试redis连接
     await RedisConnection.test_redis()
     # 初始化mysql并测试mysql连接
     await MysqlConnection.test_mysql()
+    # 创建user_ship_stats表(已存在时跳过)并读取已经创建的船只表
+    await ShipsCacheModel.provision_user_ship_stats()
+    await ShipsCacheModel.load_existing_ships()
+    # 船只数据索引落后于json文件时重新编译
+    ShipDataIndex.build_index()
+    # 预先加载排行榜数据
+    if EnvConfig.get_config().LEADERBOARD_PRELOAD:
+        LeaderBoardStore.preload()
+    # 启动阶段创建的对象不再参与之后的垃圾回收
+    GCManager.freeze()
     task = asyncio.create_task(schedule())  # 启动定时任务
 
     # 启动 lifespan
     yield
 
+    task.cancel()  # 关闭 FastAPI 时取消任务
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    # 写入剩余的api请求计数
+    await flush_api_calls()
     # 应用关闭时释放连接
     await RedisConnection.close_redis()
     await MysqlConnection.close_mysql()
-    task.cancel()  # 关闭 FastAPI 时取消任务
+    await HttpClient.close_client()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -66,7 +94,7 @@ async def request_rate_limiter(request: Request, call_next):
         )
     if not IPAccessListManager.is_whitelisted(client_ip):
         # ip是否在白名单，在则跳过限速检查
-        check_rate_limiter = await rate_limit(client_ip)
+        check_rate_limiter = await rate_limit(client_ip, request.url.path)
         if check_rate_limiter not in [True, False]:
             return JSONResponse(
                 status_code=500,
@@ -77,6 +105,10 @@ async def request_rate_limiter(request: Request, call_next):
                 status_code=429,
                 content={"detail": "Too many requests"}
             )
+    # 请求头带有Cache-Control: no-cache时跳过上游接口缓存
+    no_cache_context.set('no-cache' in request.headers.get('cache-control', '').lower())
+    # 记录请求的scope，用于按路由统计api请求
+    request_scope_context.set(request.scope)
     response = await call_next(request) 
     return response
 
@@ -1,5 +1,5 @@
 from .rate_limiter import rate_limit
-from .api_tracking import record_api_call
+from .api_tracking import record_api_call, flush_api_calls, request_scope_context
 from .redis import RedisConnection
 from .access_manager import ClanAccessListManager,UserAccessListManager,IPAccessListManager
 
@@ -7,6 +7,8 @@ __all__ = [
     'RedisConnection',
     'rate_limit',
     'record_api_call',
+    'flush_api_calls',
+    'request_scope_context',
     'ClanAccessListManager',
     'UserAccessListManager',
     'IPAccessListManager'
@@ -1,16 +1,68 @@
+from contextvars import ContextVar
+
 from .redis import RedisConnection
 from app.utils import TimeFormat
 from app.log import ExceptionLogger
 
-# 当前存在key的简单缓存，避免重复查询设置expire
-exist_daily_key = []
-exist_hourly_key = []
+# 当前请求的scope，由请求中间件设置，用于获取请求对应的路由
+request_scope_context: ContextVar[dict | None] = ContextVar('request_scope', default=None)
+
+# 各类统计key的过期时间(s)
+HOURLY_KEY_EXPIRE = 25 * 60 * 60
+DAILY_KEY_EXPIRE = 60 * 60 * 24 * 31
+
+
+class ApiCallCounter:
+    '''进程内的api请求计数
+
+    请求处理时只在内存中计数，由定时任务批量写入redis
+    '''
+    # {redis_key: {field: count}}
+    __counters: dict[str, dict[str, int]] = {}
+    # {redis_key: expire}
+    __expires: dict[str, int] = {}
+
+    @classmethod
+    def incr(self, key: str, field: str, expire: int) -> None:
+        counter = self.__counters.get(key)
+        if counter is None:
+            counter = self.__counters[key] = {}
+            self.__expires[key] = expire
+        counter[field] = counter.get(field, 0) + 1
+
+    @classmethod
+    def swap(self) -> tuple[dict, dict]:
+        "取出当前的计数并重置"
+        counters, expires = self.__counters, self.__expires
+        self.__counters, self.__expires = {}, {}
+        return counters, expires
+
+    @classmethod
+    def merge(self, counters: dict, expires: dict) -> None:
+        "写入失败时将计数合并回去，等待下次写入"
+        for key, fields in counters.items():
+            for field, count in fields.items():
+                counter = self.__counters.setdefault(key, {})
+                counter[field] = counter.get(field, 0) + count
+            self.__expires[key] = expires[key]
+
+
+def get_current_route() -> str:
+    "获取当前请求的路由模板，没有匹配到路由时返回请求路径"
+    scope = request_scope_context.get()
+    if scope is None:
+        return 'unknown'
+    route = scope.get('route')
+    if route is not None:
+        return route.path
+    return scope.get('path', 'unknown')
 
-@ExceptionLogger.handle_cache_exception_async
 async def record_api_call(status: str = 'ok') -> None:
     '''记录api请求次数和请求结果概括
 
-    记录过去24h和过去30d的请求数据
+    记录过去24h和过去30d的请求数据，以及每个路由的请求数据
+
+    只在进程内计数，不会访问redis，数据由flush_api_calls写入
 
     参数:
         status: 表示请求结果
@@ -18,30 +70,41 @@ async def record_api_call(status: str = 'ok') -> None:
     返回:
         None
     '''
+    current_hour = TimeFormat.get_form_time(time_format='%Y-%m-%d-%H')
+    current_day = TimeFormat.get_form_time(time_format='%Y-%m-%d')
+    hourly_key = f'api_calls:hourly:{current_hour}'
+    daily_key = f'api_calls:daily:{current_day}'
+    route_key = f'api_calls:routes:{current_day}'
+    route = get_current_route()
+
+    ApiCallCounter.incr(hourly_key, 'total', HOURLY_KEY_EXPIRE)
+    ApiCallCounter.incr(daily_key, 'total', DAILY_KEY_EXPIRE)
+    ApiCallCounter.incr(route_key, f'{route}:total', DAILY_KEY_EXPIRE)
+    if status in ['ok', 'error']:
+        ApiCallCounter.incr(hourly_key, status, HOURLY_KEY_EXPIRE)
+        ApiCallCounter.incr(daily_key, status, DAILY_KEY_EXPIRE)
+        ApiCallCounter.incr(route_key, f'{route}:{status}', DAILY_KEY_EXPIRE)
+    return None
+
+@ExceptionLogger.handle_cache_exception_async
+async def flush_api_calls() -> None:
+    '''将进程内的api请求计数写入redis
+
+    所有的HINCRBY和EXPIRE通过一次pipeline提交
+    '''
+    counters, expires = ApiCallCounter.swap()
+    if not counters:
+        return None
     try:
         redis = RedisConnection.get_connection()
-
-        current_hour = TimeFormat.get_form_time(time_format='%Y-%m-%d-%H')
-        current_day = TimeFormat.get_form_time(time_format='%Y-%m-%d')
-        hourly_key = f'api_calls:hourly:{current_hour}'
-        daily_key = f'api_calls:daily:{current_day}'
-
-        await redis.hincrby(hourly_key, "total", 1)
-        await redis.hincrby(daily_key, "total", 1)
-        if status == "ok":
-            await redis.hincrby(daily_key, "ok", 1)
-        elif status == "error":
-            await redis.hincrby(daily_key, "error", 1)
-        if hourly_key not in exist_hourly_key:
-            hourly_key_ttl = await redis.ttl(hourly_key)
-            if hourly_key_ttl == -1:
-                await redis.expire(hourly_key, 25 * 60 * 60)
-                exist_hourly_key.append(hourly_key)
-        if daily_key not in exist_daily_key:
-            daily_key_ttl = await redis.ttl(daily_key)
-            if daily_key_ttl == -1:
-                await redis.expire(daily_key, 60 * 60 * 24 * 31)
-                exist_daily_key.append(daily_key)
+        async with redis.pipeline(transaction=False) as pipeline:
+            for key, fields in counters.items():
+                for field, count in fields.items():
+                    pipeline.hincrby(key, field, count)
+                pipeline.expire(key, expires[key])
+            await pipeline.execute()
         return None
-    except Exception as e:
-        raise e
\ No newline at end of file
+    except BaseException as e:
+        # 包括任务被取消的情况，保证计数不会丢失
+        ApiCallCounter.merge(counters, expires)
+        raise e
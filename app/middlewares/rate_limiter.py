@@ -1,37 +1,125 @@
+import time
+
 from .redis import RedisConnection
-from app.utils import TimeFormat
+from app.core import EnvConfig
 from app.log import ExceptionLogger
 
+# 不同路由的限速规则，按顺序匹配路径前缀
+# (路径前缀, 窗口内最高请求次数, 窗口大小(s), 单次请求消耗)
+RATE_LIMIT_RULES = [
+    ('/api/v1/wows/leaderboard/', 20, 10, 2),
+    ('/api/v1/wows/recent/', 20, 10, 2),
+    ('/', 20, 10, 1)
+]
+
+# 令牌桶限速脚本，读取、计算和写入在一次请求内原子完成
+# 时间使用redis服务器的时间，避免多个worker之间的时钟差异
+TOKEN_BUCKET_SCRIPT = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local limited = 1
+if tokens >= cost then
+    tokens = tokens - cost
+    limited = 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate) + 1000)
+return limited
+'''
+
+
+class LocalTokenBucket:
+    '''进程内的令牌桶
+
+    容量是redis限速的数倍，只用于在不访问redis的情况下拦截明显异常的ip
+    '''
+    # 本地令牌桶的容量倍数
+    CAPACITY_FACTOR = 2
+    # 最多记录的桶数量，超过后清理已经回满的桶
+    MAX_BUCKETS = 10000
+    # {key: [tokens, timestamp]}
+    __buckets: dict[str, list] = {}
+
+    @classmethod
+    def consume(self, key: str, limit: int, window: int, cost: int) -> bool:
+        '''消耗令牌
+
+        返回:
+            bool 令牌是否足够
+        '''
+        now = time.monotonic()
+        capacity = limit * self.CAPACITY_FACTOR
+        rate = limit / window
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            if len(self.__buckets) >= self.MAX_BUCKETS:
+                self.__purge(now, rate, capacity)
+            bucket = self.__buckets[key] = [capacity, now]
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens < cost:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - cost
+        return True
+
+    @classmethod
+    def __purge(self, now: float, rate: float, capacity: int) -> None:
+        for key in [k for k, v in self.__buckets.items() if v[0] + (now - v[1]) * rate >= capacity]:
+            del self.__buckets[key]
+
+
+class RateLimitScript:
+    "缓存注册后的限速脚本，脚本通过EVALSHA执行"
+    __script = None
+
+    @classmethod
+    def get_script(self):
+        if self.__script is None:
+            redis = RedisConnection.get_connection()
+            self.__script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        return self.__script
+
+
+def get_rate_limit_rule(path: str) -> tuple:
+    "获取路径对应的限速规则"
+    for rule in RATE_LIMIT_RULES:
+        if path.startswith(rule[0]):
+            return rule
+    return RATE_LIMIT_RULES[-1]
+
 @ExceptionLogger.handle_cache_exception_async
-async def rate_limit(host: str, limit: int = 20, window = 10) -> bool:
+async def rate_limit(host: str, path: str = '/') -> bool:
     '''判断当前ip请求是否到达限速
 
-    使用Redis+固定窗口实现接口请求限流，默认为 20次/10秒
+    使用Redis+令牌桶实现接口请求限流，每个路由按RATE_LIMIT_RULES匹配限额和单次请求消耗
+
+    启用RATE_LIMIT_LOCAL后，会先在进程内进行一次宽松的检查，明显超出限额的请求不会访问redis
 
     参数:
-        key:请求IP地址.
-        limit:窗口内最高请求次数.
-        window:窗口大小(s).
+        host:请求IP地址.
+        path:请求路径.
 
     返回:
         bool值，是否到达限速.
     '''
     try:
-        redis = RedisConnection.get_connection()
-        # 基于当前时间生成固定窗口
-        current_time = int(TimeFormat.get_current_timestamp() / window) * window 
-        window_key = f"rate_limit:{host}:{current_time}"
-        
-        # 增加当前窗口的计数
-        current_count = await redis.incr(window_key)
-
-        # 设置key的过期时间，加上5s的冗余
-        if current_count == 1:
-            await redis.expire(window_key, window + 5)
-
-        if current_count > limit:
+        prefix, limit, window, cost = get_rate_limit_rule(path)
+        key = f"rate_limit:{prefix}:{host}"
+        if (
+            EnvConfig.get_config().RATE_LIMIT_LOCAL and
+            not LocalTokenBucket.consume(key, limit, window, cost)
+        ):
             return True
-        else:
-            return False
+        script = RateLimitScript.get_script()
+        limited = await script(keys=[key], args=[limit, limit / window / 1000, cost])
+        return limited == 1
     except Exception as e:
-        raise e
\ No newline at end of file
+        raise e
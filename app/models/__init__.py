@@ -21,6 +21,6 @@ __all__ = [
     'UserAccessToken',
     'UserAccessToken2',
     'RecentDatabaseModel',
-    'ShipsCacheModel'
+    'ShipsCacheModel',
     'RankDataModel'
 ]
\ No newline at end of file
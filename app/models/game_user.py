@@ -428,11 +428,12 @@ class UserModel:
             await conn.begin()
             cur: Cursor = await conn.cursor()
 
-            row = await cur.execute(
+            await cur.execute(
                 "SELECT battles_count, hash_value, ships_data, UNIX_TIMESTAMP(updated_at) AS update_time "
                 f"FROM {MAIN_DB}.user_ships WHERE account_id = %s;", 
                 [account_id]
             )
+            row = await cur.fetchone()
             data = None
             if row:
                 data = {
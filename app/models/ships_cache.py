@@ -1,24 +1,78 @@
+import time
+
 from aiomysql.connection import Connection
 from aiomysql.cursors import Cursor
 
+from app.core import EnvConfig
 from app.db import MysqlConnection
 from app.log import ExceptionLogger
 from app.response import JSONResponse, ResponseDict
 from app.utils import BinaryGeneratorUtils
 
 from .db_name import CACHE_DB, MAIN_DB
+from .ship_storage import get_ship_storage, decode_user_ship_stats
+
+config = EnvConfig.get_config()
+
+# 船只缓存数据的存储方式
+SHIP_STORAGE = get_ship_storage(config.SHIP_STORAGE, CACHE_DB)
+
+
+async def write_ship_rows(cur: Cursor, ship_data_list: list) -> int:
+    '''在当前事务中批量写入船只数据
+
+    由SHIP_STORAGE分组，每组执行一次executemany，INSERT ... ON DUPLICATE KEY UPDATE会被aiomysql合并为一条多行的语句
+
+    返回:
+        int 写入的行数
+    '''
+    rows_count = 0
+    for sql, rows in SHIP_STORAGE.get_write_batches(ship_data_list):
+        await cur.executemany(sql, rows)
+        rows_count += len(rows)
+    return rows_count
+
+
+class ExistingShipRegistry:
+    '''已经创建的船只表的进程内缓存
+
+    第一次使用时从existing_ships读取，之后每隔REFRESH_INTERVAL秒重新读取一次，建表失败时立即重新读取
+
+    缓存中已经存在的船只不需要任何查询，只有新船只需要通过ShipsCacheModel.provision_ship_tables建表
+    '''
+    REFRESH_INTERVAL = 10 * 60
+    _ship_ids: set = set()
+    _loaded_at: float = 0.0
+
+    @classmethod
+    def is_stale(self) -> bool:
+        return time.time() - self._loaded_at >= self.REFRESH_INTERVAL
+
+    @classmethod
+    def get_missing(self, ship_ids: set) -> set:
+        "返回还没有创建表的船只"
+        return {int(ship_id) for ship_id in ship_ids} - self._ship_ids
+
+    @classmethod
+    def replace(self, ship_ids: set) -> None:
+        self._ship_ids = set(ship_ids)
+        self._loaded_at = time.time()
+
+    @classmethod
+    def add(self, ship_ids: set) -> None:
+        self._ship_ids = self._ship_ids | set(ship_ids)
+
+    @classmethod
+    def invalidate(self) -> None:
+        "下一次检查时重新读取"
+        self._loaded_at = 0.0
 
 
 class ShipsCacheModel:
     @ExceptionLogger.handle_database_exception_async
-    async def check_existing_ship(ship_id_list: set) -> ResponseDict:
-        '''检查ship_id是否存在于数据库
-
-        方法描述
+    async def load_existing_ships() -> ResponseDict:
+        '''从existing_ships读取所有已经创建的船只表
 
-        参数:
-            ship_id_list
-        
         返回:
             ResponseDict
         '''
@@ -30,55 +84,99 @@ class ShipsCacheModel:
             await cur.execute(
                 f"SELECT ship_id FROM {CACHE_DB}.existing_ships"
             )
-            not_exists_set = set()
-            exists_list = []
             rows = await cur.fetchall()
-            for row in rows:
-                exists_list.append(row[0])
-            for ship_id in ship_id_list:
-                if ship_id not in exists_list:
-                    not_exists_set.add(ship_id)
-            for ship_id in not_exists_set:
-                await cur.execute(
-                    f'''CREATE TABLE IF NOT EXISTS {CACHE_DB}.ship_%s (
-                        id               INT          AUTO_INCREMENT,
-                        account_id       BIGINT       NOT NULL,
-                        region_id        TINYINT      NOT NULL,
-                        battles_count    INT          NOT NULL,
-                        battle_type_1    INT          NOT NULL,
-                        battle_type_2    INT          NOT NULL,
-                        battle_type_3    INT          NOT NULL,
-                        wins             INT          NOT NULL,
-                        damage_dealt     BIGINT       NOT NULL,
-                        frags            INT          NOT NULL,
-                        exp              BIGINT       NOT NULL,
-                        survived         INT          NOT NULL,
-                        scouting_damage  BIGINT       NOT NULL,
-                        art_agro         BIGINT       NOT NULL,
-                        planes_killed    INT          NOT NULL,
-                        max_exp          INT          NOT NULL,
-                        max_damage_dealt INT          NOT NULL,
-                        max_frags        INT          NOT NULL,
-                        created_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                        updated_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                        PRIMARY KEY (id), 
-                        UNIQUE INDEX idx_sid_rid_aid (region_id, account_id)
-                    );''',
-                    [ship_id]
-                )
-                await cur.execute(
-                    f"INSERT INTO {CACHE_DB}.existing_ships ( ship_id ) VALUE ( %s )",
-                    [ship_id]
-                )
+            ExistingShipRegistry.replace({row[0] for row in rows})
+            
+            await conn.commit()
+            return JSONResponse.API_1000_Success
+        except Exception as e:
+            await conn.rollback()
+            raise e
+        finally:
+            await cur.close()
+            await MysqlConnection.release_connection(conn)
+
+    @ExceptionLogger.handle_database_exception_async
+    async def provision_user_ship_stats() -> ResponseDict:
+        '''创建user_ship_stats表，表已经存在时不做任何操作
+
+        启动时执行，已有的部署升级后不需要手动建表
+
+        返回:
+            ResponseDict
+        '''
+        try:
+            conn: Connection = await MysqlConnection.get_connection()
+            await conn.begin()
+            cur: Cursor = await conn.cursor()
+
+            await cur.execute(SHIP_STORAGE.get_user_schema_sql())
+            
+            await conn.commit()
+            return JSONResponse.API_1000_Success
+        except Exception as e:
+            await conn.rollback()
+            raise e
+        finally:
+            await cur.close()
+            await MysqlConnection.release_connection(conn)
+
+    @ExceptionLogger.handle_database_exception_async
+    async def provision_ship_tables(ship_ids: set) -> ResponseDict:
+        '''创建船只表并记录到existing_ships
+
+        在单独的事务中执行，可以重复执行，必须在写入船只数据之前完成
+
+        参数:
+            ship_ids
+        
+        返回:
+            ResponseDict
+        '''
+        try:
+            conn: Connection = await MysqlConnection.get_connection()
+            await conn.begin()
+            cur: Cursor = await conn.cursor()
+
+            for ship_id in sorted(ship_ids):
+                # CREATE TABLE会隐式提交，建表和记录不在同一个事务中，失败后重新执行即可
+                for sql in SHIP_STORAGE.get_provision_sql(ship_id):
+                    await cur.execute(sql)
+            await cur.executemany(
+                f"INSERT IGNORE INTO {CACHE_DB}.existing_ships ( ship_id ) VALUES ( %s );",
+                [[ship_id] for ship_id in sorted(ship_ids)]
+            )
             
             await conn.commit()
+            ExistingShipRegistry.add(ship_ids)
             return JSONResponse.API_1000_Success
         except Exception as e:
             await conn.rollback()
+            ExistingShipRegistry.invalidate()
             raise e
         finally:
             await cur.close()
             await MysqlConnection.release_connection(conn)
+
+    async def check_existing_ship(ship_id_list: set) -> ResponseDict:
+        '''确保ship_id对应的船只表存在
+
+        已经记录在ExistingShipRegistry中的船只不会产生任何查询
+
+        参数:
+            ship_id_list
+        
+        返回:
+            ResponseDict
+        '''
+        if ExistingShipRegistry.is_stale():
+            result = await ShipsCacheModel.load_existing_ships()
+            if result.get('code', None) != 1000:
+                return result
+        missing_ship_ids = ExistingShipRegistry.get_missing(ship_id_list)
+        if not missing_ship_ids:
+            return JSONResponse.API_1000_Success
+        return await ShipsCacheModel.provision_ship_tables(missing_ship_ids)
     
     @ExceptionLogger.handle_database_exception_async
     async def update_user_ships(user_data: dict) -> ResponseDict:
@@ -107,27 +205,11 @@ class ShipsCacheModel:
                     [
                         user_data['battles_count'], 
                         user_data['hash_value'], 
-                        BinaryGeneratorUtils.to_user_binary_data_from_dict(user_data['ships_data']), 
+                        BinaryGeneratorUtils.to_user_binary_data_from_dict(user_data['ships_data'], sort_keys=True), 
                         account_id
                     ]
                 )
-                replace_ship_dict = user_data['ship_dict']
-                for update_ship_id, ship_data in replace_ship_dict.items():
-                    cur.execute(
-                        f"UPDATE {CACHE_DB}.ship_%s SET battles_count = %s, battle_type_1 = %s, battle_type_2 = %s, battle_type_3 = %s, wins = %s, "
-                        "damage_dealt = %s, frags = %s, exp = %s, survived = %s, scouting_damage = %s, art_agro = %s, "
-                        "planes_killed = %s, max_exp = %s, max_damage_dealt = %s, max_frags = %s "
-                        "WHERE region_id = %s AND account_id = %s;",
-                        [int(update_ship_id)] + ship_data + [region_id, account_id]
-                    )
-                    cur.execute(
-                        f"INSERT INTO {CACHE_DB}.ship_%s (account_id, region_id, battles_count, battle_type_1, battle_type_2, "
-                        "battle_type_3, wins, damage_dealt, frags, exp, survived, scouting_damage, art_agro, planes_killed, "
-                        "max_exp, max_damage_dealt, max_frags) "
-                        "SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s "
-                        f"WHERE NOT EXISTS (SELECT 1 FROM {CACHE_DB}.ship_%s WHERE region_id = %s AND account_id = %s);",
-                        [int(update_ship_id)] + [account_id, region_id] + ship_data + [int(update_ship_id)] + [region_id, account_id]
-                    )
+                await write_ship_rows(cur, [user_data])
             else:
                 await cur.execute(
                     f"UPDATE {MAIN_DB}.user_ships "
@@ -143,4 +225,70 @@ class ShipsCacheModel:
             raise e
         finally:
             await cur.close()
-            await MysqlConnection.release_connection(conn)
\ No newline at end of file
+            await MysqlConnection.release_connection(conn)
+
+    @ExceptionLogger.handle_database_exception_async
+    async def update_ship_cache_batch(ship_data_list: list) -> ResponseDict:
+        '''批量更新多个用户的船只数据
+
+        所有用户的数据按船只表分组后在同一个事务中写入
+
+        参数:
+            ship_data_list: [{'account_id', 'region_id', 'ship_dict', 'delete_ship_list', 'ships_stats'}]
+        
+        返回:
+            ResponseDict
+        '''
+        try:
+            conn: Connection = await MysqlConnection.get_connection()
+            await conn.begin()
+            cur: Cursor = await conn.cursor()
+
+            await write_ship_rows(cur, ship_data_list)
+            
+            await conn.commit()
+            return JSONResponse.API_1000_Success
+        except Exception as e:
+            await conn.rollback()
+            raise e
+        finally:
+            await cur.close()
+            await MysqlConnection.release_connection(conn)
+
+    @ExceptionLogger.handle_database_exception_async
+    async def get_user_ship_stats(account_id: int, region_id: int) -> ResponseDict:
+        '''读取用户所有船只的缓存数据
+
+        通过user_ship_stats的主键一次读取，不需要查询每个船只表
+
+        参数:
+            account_id
+            region_id
+        
+        返回:
+            ResponseDict，data为None时用户还没有写入过数据
+            data: {'ship_ids': ndarray, 'stats': ndarray}，stats的列顺序和SHIP_CACHE_KEYS一致
+        '''
+        try:
+            conn: Connection = await MysqlConnection.get_connection()
+            await conn.begin()
+            cur: Cursor = await conn.cursor()
+
+            await cur.execute(*SHIP_STORAGE.get_user_stats_sql(account_id, region_id))
+            row = await cur.fetchone()
+            data = None
+            if row:
+                ship_ids, stats = decode_user_ship_stats(row[1])
+                data = {
+                    'ship_ids': ship_ids,
+                    'stats': stats
+                }
+            
+            await conn.commit()
+            return JSONResponse.get_success_response(data)
+        except Exception as e:
+            await conn.rollback()
+            raise e
+        finally:
+            await cur.close()
+            await MysqlConnection.release_connection(conn)
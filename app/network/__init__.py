@@ -1,9 +1,16 @@
 from .api_basic import BasicAPI
 from .api_details import DetailsAPI
 from .api_other import OtherAPI
+from .client import HttpClient
+from .single_flight import SingleFlight
+from .response_cache import ResponseCache, no_cache_context
 
 __all__ = [
     'BasicAPI',
     'DetailsAPI',
-    'OtherAPI'
+    'OtherAPI',
+    'HttpClient',
+    'SingleFlight',
+    'ResponseCache',
+    'no_cache_context'
 ]
\ No newline at end of file
@@ -1,8 +1,9 @@
 import asyncio
 
-import httpx
-
 from .api_base import BaseUrl
+from .client import HttpClient
+from .single_flight import SingleFlight
+from .response_cache import ResponseCache
 from app.log import ExceptionLogger
 from app.response import JSONResponse
 
@@ -17,48 +18,44 @@ class BasicAPI:
     3. 获取搜索用户的结果
     4. 获取搜索工会的结果
     '''
+    @ResponseCache.cached('basic')
+    @SingleFlight.coalesce('basic')
     @ExceptionLogger.handle_network_exception_async
     async def fetch_data(url, method: str = 'get', data: dict | list = None):
         try:
-            async with httpx.AsyncClient() as client:
-                if method == 'get':
-                    res = await client.get(url=url, timeout=BaseUrl.REQUEST_TIME_OUT)
-                elif method == 'post': 
-                    res = await client.post(url=url, json=data, timeout=BaseUrl.REQUEST_TIME_OUT)
-                else:
-                    raise ValueError('Invalid Method')
-                requset_code = res.status_code
-                requset_result = res.json()
-                if '/clans.' in url:
-                    if '/api/clanbase/' in url and requset_code == 200:
-                        # 用户基础信息接口的返回值
-                        data = requset_result['clanview']
-                        return JSONResponse.get_success_response(data)
-                    if '/api/clanbase/' in url and requset_code == 503:
-                        return JSONResponse.API_1002_ClanNotExist
-                elif (
-                    '/clans/' in url
-                    and requset_code == 404
-                ):
-                    # 用户所在工会接口，如果用户没有在工会会返回404
-                    data = {
-                        "clan_id": None,
-                        "role": None, 
-                        "joined_at": None, 
-                        "clan": {},
-                    }
-                    return JSONResponse.get_success_response(data)
-                elif requset_code == 404:
-                    # 用户不存在或者账号删除的情况
-                    return JSONResponse.API_1001_UserNotExist
-                elif method == 'post' and requset_code == 200:
-                    return JSONResponse.get_success_response(requset_result)
-                elif requset_code == 200:
-                    # 正常返回值的处理
-                    data = requset_result['data']
+            res = await HttpClient.request(url, method, data, BaseUrl.REQUEST_TIME_OUT)
+            requset_code = res.status_code
+            requset_result = res.json()
+            if '/clans.' in url:
+                if '/api/clanbase/' in url and requset_code == 200:
+                    # 用户基础信息接口的返回值
+                    data = requset_result['clanview']
                     return JSONResponse.get_success_response(data)
-                else:
-                    res.raise_for_status()  # 其他状态码
+                if '/api/clanbase/' in url and requset_code == 503:
+                    return JSONResponse.API_1002_ClanNotExist
+            elif (
+                '/clans/' in url
+                and requset_code == 404
+            ):
+                # 用户所在工会接口，如果用户没有在工会会返回404
+                data = {
+                    "clan_id": None,
+                    "role": None, 
+                    "joined_at": None, 
+                    "clan": {},
+                }
+                return JSONResponse.get_success_response(data)
+            elif requset_code == 404:
+                # 用户不存在或者账号删除的情况
+                return JSONResponse.API_1001_UserNotExist
+            elif method == 'post' and requset_code == 200:
+                return JSONResponse.get_success_response(requset_result)
+            elif requset_code == 200:
+                # 正常返回值的处理
+                data = requset_result['data']
+                return JSONResponse.get_success_response(data)
+            else:
+                res.raise_for_status()  # 其他状态码
         except Exception as e:
             raise e
         
@@ -1,6 +1,7 @@
-import httpx
-
 from .api_base import BaseUrl
+from .client import HttpClient
+from .single_flight import SingleFlight
+from .response_cache import ResponseCache
 from app.log import ExceptionLogger
 from app.response import JSONResponse
 
@@ -8,19 +9,20 @@ from app.response import JSONResponse
 class OtherAPI:
     '''其他接口
     '''
+    @ResponseCache.cached('other')
+    @SingleFlight.coalesce('other')
     @ExceptionLogger.handle_network_exception_async
     async def fetch_data(url):
         try:
-            async with httpx.AsyncClient() as client:
-                res = await client.get(url=url, timeout=BaseUrl.REQUEST_TIME_OUT)
-                requset_code = res.status_code
-                requset_result = res.json()
-                if requset_code == 200:
-                    # 正常返回值的处理
-                    data = requset_result['data']
-                    return JSONResponse.get_success_response(data)
-                else:
-                    res.raise_for_status()  # 其他状态码
+            res = await HttpClient.request(url, timeout=BaseUrl.REQUEST_TIME_OUT)
+            requset_code = res.status_code
+            requset_result = res.json()
+            if requset_code == 200:
+                # 正常返回值的处理
+                data = requset_result['data']
+                return JSONResponse.get_success_response(data)
+            else:
+                res.raise_for_status()  # 其他状态码
         except Exception as e:
             raise e
 
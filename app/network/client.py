@@ -0,0 +1,141 @@
+import time
+import importlib.util
+from urllib.parse import urlsplit
+
+import httpx
+
+from .api_base import BaseUrl
+from app.core import EnvConfig, api_logger
+
+
+class HttpClient:
+    '''管理上游接口的http连接
+
+    每个上游host使用一个独立的AsyncClient，连接在请求之间复用，
+    不再为每次请求重新进行TCP和TLS握手
+
+    https的上游在安装了h2的情况下使用HTTP/2
+
+    连接池的统计数据通过httpcore的trace回调收集
+    '''
+    _clients: dict[str, httpx.AsyncClient] = {}
+    _stats: dict[str, dict] = {}
+
+    @classmethod
+    def _get_host(cls, url: str) -> str:
+        parts = urlsplit(url)
+        return f'{parts.scheme}://{parts.netloc}'
+
+    @classmethod
+    def _init_client(cls, host: str) -> httpx.AsyncClient:
+        "初始化某个host的连接池"
+        config = EnvConfig.get_config()
+        http2 = (
+            config.HTTP2_ENABLED and
+            host.startswith('https://') and
+            importlib.util.find_spec('h2') is not None
+        )
+        cls._clients[host] = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        cls._stats[host] = {
+            'http2': http2,
+            'requests': 0,          # 请求总数
+            'in_use': 0,            # 正在进行的请求数
+            'new_connections': 0,   # 新建连接的次数
+            'reused': 0,            # 复用已有连接的请求数
+            'wait_time': 0.0        # 等待获取连接的总时间(s)
+        }
+        api_logger.info(f'HTTP client for {host} initialized, http2={http2}')
+        return cls._clients[host]
+
+    @classmethod
+    def get_client(cls, url: str) -> httpx.AsyncClient:
+        "获取url对应host的AsyncClient"
+        host = cls._get_host(url)
+        client = cls._clients.get(host)
+        if client is None or client.is_closed:
+            client = cls._init_client(host)
+        return client
+
+    @classmethod
+    async def request(
+        cls,
+        url: str,
+        method: str = 'get',
+        data: dict | list = None,
+        timeout: float = BaseUrl.REQUEST_TIME_OUT
+    ) -> httpx.Response:
+        '''通过共享的连接池发送请求
+
+        参数:
+            url: 请求地址
+            method: get/post
+            data: post请求的json数据
+            timeout: 超时时间
+
+        返回:
+            httpx.Response
+        '''
+        if method not in ['get', 'post']:
+            raise ValueError('Invalid Method')
+        client = cls.get_client(url)
+        stats = cls._stats[cls._get_host(url)]
+        trace_state = {'start': time.monotonic(), 'acquired': None, 'connected': False}
+
+        async def trace(event_name: str, info: dict):
+            # 第一个建立连接或者发送请求的事件说明已经从连接池拿到了连接
+            if trace_state['acquired'] is None and (
+                event_name == 'connection.connect_tcp.started' or
+                event_name.endswith('.send_request_headers.started')
+            ):
+                trace_state['acquired'] = time.monotonic()
+            if event_name == 'connection.connect_tcp.complete':
+                trace_state['connected'] = True
+
+        stats['requests'] += 1
+        stats['in_use'] += 1
+        try:
+            if method == 'get':
+                return await client.get(url=url, timeout=timeout, extensions={'trace': trace})
+            else:
+                return await client.post(url=url, json=data, timeout=timeout, extensions={'trace': trace})
+        finally:
+            stats['in_use'] -= 1
+            if trace_state['acquired'] is not None:
+                stats['wait_time'] += trace_state['acquired'] - trace_state['start']
+                if trace_state['connected']:
+                    stats['new_connections'] += 1
+                else:
+                    stats['reused'] += 1
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        "获取每个host连接池的统计数据"
+        result = {}
+        for host, stats in cls._stats.items():
+            acquired = stats['new_connections'] + stats['reused']
+            result[host] = {
+                **stats,
+                'wait_time': round(stats['wait_time'], 6),
+                'reuse_ratio': round(stats['reused'] / acquired, 4) if acquired else 0.0,
+                'avg_wait_time': round(stats['wait_time'] / acquired, 6) if acquired else 0.0
+            }
+        return result
+
+    @classmethod
+    async def close_client(cls) -> None:
+        "关闭所有连接池"
+        try:
+            for host, client in cls._clients.items():
+                await client.aclose()
+                api_logger.info(f'HTTP client for {host} is closed')
+            cls._clients.clear()
+        except Exception as e:
+            api_logger.error('Failed to close HTTP clients')
+            api_logger.error(e)
@@ -0,0 +1,147 @@
+import json
+import time
+import asyncio
+import hashlib
+from contextvars import ContextVar
+
+from .single_flight import SingleFlight
+from app.core import EnvConfig, api_logger
+from app.middlewares import RedisConnection
+
+
+# 当前请求是否跳过缓存(Cache-Control: no-cache)
+no_cache_context: ContextVar[bool] = ContextVar('no_cache', default=False)
+
+# 各类上游接口的缓存策略，按顺序匹配url
+# (url特征, 新鲜时间(s), 过期后仍可使用的时间(s))
+CACHE_POLICIES = [
+    ('/glossary/version/', 3600, 86400),
+    ('/encyclopedia/', 86400, 7 * 86400),
+    ('/api/clanbase/', 300, 1800),
+    ('/clans/', 120, 600),
+    ('/ships/', 60, 300),
+    ('/api/accounts/', 60, 300)
+]
+
+
+class ResponseCache:
+    '''上游接口的redis读穿缓存
+
+    缓存存储在独立的redis数据库(REDIS_CACHE_DB)中，只缓存成功的结果
+
+    数据超过新鲜时间但仍在可用时间内时，直接返回缓存数据并在后台刷新
+
+    请求头带有 Cache-Control: no-cache 时跳过读取缓存，结果仍然会写入缓存
+    '''
+    # 正在后台刷新的key，避免重复刷新
+    _refreshing: set[str] = set()
+    # 持有后台任务的引用，避免任务被回收
+    _tasks: set[asyncio.Task] = set()
+    _stats = {
+        'hit': 0,       # 命中新鲜数据
+        'stale': 0,     # 命中过期数据并触发后台刷新
+        'miss': 0,      # 未命中
+        'bypass': 0,    # 请求要求跳过缓存
+        'error': 0      # redis读写失败
+    }
+
+    def get_policy(url: str) -> tuple | None:
+        for pattern, ttl, stale in CACHE_POLICIES:
+            if pattern in url:
+                return ttl, stale
+        return None
+
+    def get_cache_key(namespace: str, url: str, method: str, data: dict | list) -> str:
+        # url中可能包含ac参数，key使用哈希值
+        raw = f'{method}:{SingleFlight.normalize_url(url)}:' + (json.dumps(data, sort_keys=True) if data is not None else '')
+        return f'upstream:{namespace}:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def cached(self, namespace: str):
+        '''读穿缓存的装饰器，用于fetch_data(url, method, data)
+
+        参数:
+            namespace: 区分不同的接口类
+        '''
+        def decorator(func):
+            async def wrapper(url, method: str = 'get', data: dict | list = None):
+                policy = self.get_policy(url)
+                if policy is None:
+                    return await self.__fetch(func, url, method, data)
+                key = self.get_cache_key(namespace, url, method, data)
+                ttl, stale = policy
+                if no_cache_context.get():
+                    self._stats['bypass'] += 1
+                else:
+                    cached = await self.__get(key)
+                    if cached is not None:
+                        age = time.time() - cached['t']
+                        if age <= ttl:
+                            self._stats['hit'] += 1
+                            return cached['r']
+                        if age <= ttl + stale:
+                            self._stats['stale'] += 1
+                            self.__refresh_in_background(key, ttl, stale, func, url, method, data)
+                            return cached['r']
+                    self._stats['miss'] += 1
+                result = await self.__fetch(func, url, method, data)
+                await self.__set(key, ttl, stale, result)
+                return result
+            return wrapper
+        return decorator
+
+    async def __fetch(func, url, method, data):
+        if method == 'get' and data is None:
+            return await func(url)
+        return await func(url, method, data)
+
+    @classmethod
+    async def __get(self, key: str) -> dict | None:
+        try:
+            redis = RedisConnection.get_connection(EnvConfig.get_config().REDIS_CACHE_DB)
+            value = await redis.get(key)
+            return json.loads(value) if value else None
+        except Exception as e:
+            # 缓存不可用时直接请求上游
+            self._stats['error'] += 1
+            api_logger.warning(f'Failed to read upstream cache: {e}')
+            return None
+
+    @classmethod
+    async def __set(self, key: str, ttl: int, stale: int, result: dict) -> None:
+        if not isinstance(result, dict) or result.get('code') != 1000:
+            return
+        try:
+            redis = RedisConnection.get_connection(EnvConfig.get_config().REDIS_CACHE_DB)
+            value = json.dumps({'t': time.time(), 'r': result}, ensure_ascii=False)
+            await redis.set(key, value, ex=ttl + stale)
+        except Exception as e:
+            self._stats['error'] += 1
+            api_logger.warning(f'Failed to write upstream cache: {e}')
+
+    @classmethod
+    def __refresh_in_background(self, key: str, ttl: int, stale: int, func, url, method, data) -> None:
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                result = await self.__fetch(func, url, method, data)
+                await self.__set(key, ttl, stale, result)
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @classmethod
+    def get_stats(self) -> dict:
+        "获取上游接口缓存的统计数据"
+        total = self._stats['hit'] + self._stats['stale'] + self._stats['miss']
+        return {
+            **self._stats,
+            'refreshing': len(self._refreshing),
+            'hit_ratio': round((self._stats['hit'] + self._stats['stale']) / total, 4) if total else 0.0
+        }
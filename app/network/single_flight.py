@@ -0,0 +1,112 @@
+import json
+import time
+import asyncio
+from copy import deepcopy
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from app.core import EnvConfig
+
+
+class SingleFlight:
+    '''合并相同的上游请求
+
+    同一时间内相同方法和url的请求只会有一个真正发送到上游，
+    其余调用方等待这个请求完成并共享解析后的结果
+
+    启用SINGLE_FLIGHT_TTL后，成功的结果会在进程内保留一小段时间
+    '''
+    # 正在进行的请求 {key: {'task', 'followers', 'shared'}}
+    _inflight: dict[tuple, dict] = {}
+    # 短时间缓存结果的最大数量
+    MAX_RESULTS = 4096
+    # 短时间缓存的结果 {key: (expire_at, result)}
+    _results: dict[tuple, tuple] = {}
+    _stats = {
+        'requests': 0,      # 调用总数
+        'upstream': 0,      # 实际发送到上游的请求数
+        'collapsed': 0,     # 合并到正在进行的请求的调用数
+        'cache_hit': 0      # 命中短时间缓存的调用数
+    }
+
+    def normalize_url(url: str) -> str:
+        "统一url的大小写和query参数顺序"
+        parts = urlsplit(url)
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+    @classmethod
+    def coalesce(self, namespace: str):
+        '''合并请求的装饰器，用于fetch_data(url, method, data)
+
+        参数:
+            namespace: 区分不同的接口类，不同的接口类对同一url的解析方式不同
+        '''
+        def decorator(func):
+            async def wrapper(url, method: str = 'get', data: dict | list = None):
+                key = (
+                    namespace,
+                    method,
+                    self.normalize_url(url),
+                    json.dumps(data, sort_keys=True) if data is not None else None
+                )
+                return await self.__do(key, func, url, method, data)
+            return wrapper
+        return decorator
+
+    @classmethod
+    async def __do(self, key: tuple, func, url, method, data):
+        self._stats['requests'] += 1
+        ttl = EnvConfig.get_config().SINGLE_FLIGHT_TTL
+        if ttl > 0:
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self._stats['cache_hit'] += 1
+                    return deepcopy(cached[1])
+                del self._results[key]
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self._stats['collapsed'] += 1
+            entry['followers'] += 1
+            await asyncio.shield(entry['task'])
+            # 共享的结果是副本，调用方修改结果不会影响其他调用方
+            return deepcopy(entry['shared'])
+        entry = {'task': None, 'followers': 0, 'shared': None}
+        # 请求在独立的task中执行，发起方被取消不会影响其他等待方
+        entry['task'] = asyncio.create_task(self.__run(key, entry, ttl, func, url, method, data))
+        self._inflight[key] = entry
+        self._stats['upstream'] += 1
+        return await asyncio.shield(entry['task'])
+
+    @classmethod
+    async def __run(self, key: tuple, entry: dict, ttl: float, func, url, method, data):
+        try:
+            if method == 'get' and data is None:
+                result = await func(url)
+            else:
+                result = await func(url, method, data)
+        finally:
+            self._inflight.pop(key, None)
+        cacheable = ttl > 0 and isinstance(result, dict) and result.get('code') == 1000
+        if entry['followers'] or cacheable:
+            entry['shared'] = deepcopy(result)
+        if cacheable:
+            now = time.monotonic()
+            if len(self._results) >= self.MAX_RESULTS:
+                # 清理已经过期的结果
+                for expired_key in [k for k, v in self._results.items() if v[0] <= now]:
+                    del self._results[expired_key]
+            if len(self._results) < self.MAX_RESULTS:
+                self._results[key] = (now + ttl, entry['shared'])
+        return result
+
+    @classmethod
+    def get_stats(self) -> dict:
+        "获取请求合并的统计数据"
+        requests = self._stats['requests']
+        saved = self._stats['collapsed'] + self._stats['cache_hit']
+        return {
+            **self._stats,
+            'inflight': len(self._inflight),
+            'saved_ratio': round(saved / requests, 4) if requests else 0.0
+        }
@@ -1,8 +1,11 @@
 from fastapi import APIRouter
 
 from app.response import ResponseDict, JSONResponse
-from app.core import ServiceStatus
+from app.core import ServiceStatus, GCManager
+from app.json import JsonData
+from app.network import HttpClient, SingleFlight, ResponseCache
 from app.apis.root import RootData
+from app.apis.rank.page_cache import LeaderboardPageCache
 from app.middlewares import record_api_call
 
 router = APIRouter()
@@ -120,4 +123,69 @@ async def getProcessList() -> ResponseDict:
     """
     result = await RootData.get_innodb_processlist()
     await record_api_call(result['status'])
-    return result
\ No newline at end of file
+    return result
+
+@router.get("/json/cache/", summary="查看json数据缓存状态")
+async def getJsonCacheStats() -> ResponseDict:
+    """获取进程内json数据缓存的状态
+
+    返回已缓存的文件以及命中和重新加载的次数
+
+    参数:
+    - None
+
+    返回:
+    - ResponseDict
+    """
+    result = JsonData.get_cache_stats()
+    return JSONResponse.get_success_response(result)
+
+@router.get("/network/stats/", summary="查看上游接口连接池状态")
+async def getNetworkStats() -> ResponseDict:
+    """获取上游接口连接池的统计数据
+
+    按host返回请求数、正在进行的请求数、连接复用率和等待连接的时间，
+    以及相同请求合并后节省的上游请求数和上游接口缓存的命中率
+
+    参数:
+    - None
+
+    返回:
+    - ResponseDict
+    """
+    result = {
+        'pool': HttpClient.get_stats(),
+        'single_flight': SingleFlight.get_stats(),
+        'cache': ResponseCache.get_stats()
+    }
+    return JSONResponse.get_success_response(result)
+
+@router.get("/leaderboard/cache/", summary="查看排行榜分页缓存状态")
+async def getLeaderboardCacheStats() -> ResponseDict:
+    """获取排行榜分页缓存的统计数据
+
+    返回命中、等待命中、未命中和读写失败的次数以及命中率
+
+    参数:
+    - None
+
+    返回:
+    - ResponseDict
+    """
+    result = LeaderboardPageCache.get_stats()
+    return JSONResponse.get_success_response(result)
+
+@router.get("/gc/stats/", summary="查看垃圾回收状态")
+async def getGCStats() -> ResponseDict:
+    """获取当前进程垃圾回收的统计数据
+
+    返回回收阈值、永久代对象数量以及每代的回收次数、停顿时间和回收的对象数量
+
+    参数:
+    - None
+
+    返回:
+    - ResponseDict
+    """
+    result = GCManager.get_stats()
+    return JSONResponse.get_success_response(result)
@@ -4,7 +4,7 @@ from .ship_utils import ShipName
 from .server_utils import ShipData
 from .algo_utils import Rating_Algorithm
 from .color_utils import ColorUtils
-from .binary_utils import BinaryGeneratorUtils, BinaryParserUtils
+from .binary_utils import BinaryGeneratorUtils, BinaryParserUtils, UserShipsView, UserShipsDiff
 
 __all__ = [
     'TimeFormat',
@@ -14,5 +14,7 @@ __all__ = [
     'Rating_Algorithm',
     'UtilityFunctions',
     'BinaryGeneratorUtils',
-    'BinaryParserUtils'
+    'BinaryParserUtils',
+    'UserShipsView',
+    'UserShipsDiff'
 ]
\ No newline at end of file
@@ -1,4 +1,6 @@
-from typing import List
+from typing import List, Callable
+
+import numpy as np
 from redis import Redis
 from .server_utils import ShipData
 from app.response import JSONResponse
@@ -6,7 +8,173 @@ from app.log import ExceptionLogger
 
 class Rating_Algorithm:
     # 评分算法
+    # 已注册的批量评分算法 {algo_type: {'func', 'thresholds', 'eggshell_thresholds', 'content_thresholds'}}
+    __algorithms: dict[str, dict] = {}
+
+    @classmethod
+    def register_algorithm(
+        self,
+        algo_type: str,
+        thresholds: List[int | float],
+        eggshell_thresholds: List[int | float],
+        content_thresholds: List[List[int | float]]
+    ):
+        '''注册批量评分算法的装饰器
+
+        被装饰的函数签名为 func(game_type, ship_data, server_data) -> dict
+
+        参数:
+            algo_type 评分算法
+            thresholds 评分等级的分界值
+            eggshell_thresholds 启用彩蛋时评分等级的分界值
+            content_thresholds 各项数据等级的分界值
+        '''
+        def decorator(func: Callable):
+            self.__algorithms[algo_type] = {
+                'func': func,
+                'thresholds': np.array(thresholds, dtype=np.float64),
+                'eggshell_thresholds': np.array(eggshell_thresholds, dtype=np.float64),
+                'content_thresholds': [np.array(x, dtype=np.float64) for x in content_thresholds]
+            }
+            return func
+        return decorator
+
+    @classmethod
+    def __get_algorithm(self, algo_type: str) -> dict:
+        if algo_type not in self.__algorithms:
+            raise ValueError('Invaild Algorithm Parameters')
+        return self.__algorithms[algo_type]
+
+    @classmethod
+    def get_rating_batch(
+        self,
+        algo_type: str,
+        game_type: str,
+        ship_data: np.ndarray,
+        server_data: np.ndarray
+    ) -> dict:
+        '''批量计算评分数据
+
+        get_rating_by_data同样通过此方法计算
+
+        参数:
+            algo_type 评分算法
+            game_type 数据对局类型 [pvp,rank,...]
+            ship_data 用户的数据 shape(n,4) [battles,wins,damage,frag]
+            server_data 服务器数据 shape(n,3) [win_rate,avg_damage,avg_frags]，缺失的数据为nan
+
+        返回:
+            Dict[str, np.ndarray] value_battles_count/personal_rating/n_damage_dealt/n_frags
+        '''
+        ship_data = np.asarray(ship_data, dtype=np.float64).reshape(-1, 4)
+        server_data = np.asarray(server_data, dtype=np.float64).reshape(-1, 3)
+        if len(ship_data) != len(server_data):
+            raise ValueError('Mismatched Data Length')
+        return self.__get_algorithm(algo_type)['func'](game_type, ship_data, server_data)
+
+    @classmethod
+    def get_rating_class_batch(
+        self,
+        algo_type: str,
+        ratings: np.ndarray,
+        show_eggshell: bool = False
+    ):
+        '''批量获取评分等级以及距离下一级的差值
+
+        未注册的算法返回等级0，差值2
+
+        返回:
+            Tuple[np.ndarray, np.ndarray]
+        '''
+        ratings = np.asarray(ratings, dtype=np.float64)
+        if algo_type not in self.__algorithms:
+            return np.zeros(len(ratings), dtype=np.int64), np.full(len(ratings), 2, dtype=np.int64)
+        algorithm = self.__algorithms[algo_type]
+        data = algorithm['eggshell_thresholds'] if show_eggshell else algorithm['thresholds']
+        index = np.searchsorted(data, ratings, side='right')
+        classes = index + 1
+        top = index == len(data)
+        diff = np.where(
+            top,
+            ratings - data[-1],
+            data[np.minimum(index, len(data) - 1)] - ratings
+        )
+        diff = np.trunc(diff).astype(np.int64)
+        invalid = (ratings == -1) | (ratings == -2)
+        classes[invalid] = 0
+        diff[ratings == -1] = 1
+        diff[ratings == -2] = 2
+        return classes, diff
+
+    @classmethod
+    def get_content_class_batch(
+        self,
+        algo_type: str,
+        index: int,
+        values: np.ndarray
+    ) -> np.ndarray:
+        "批量获取数据的等级，未注册的算法抛出ValueError"
+        values = np.asarray(values, dtype=np.float64)
+        data = self.__get_algorithm(algo_type)['content_thresholds'][index]
+        classes = np.searchsorted(data, values, side='right') + 1
+        classes[(values == -1) | (values == -2)] = 0
+        return classes
+
+    @classmethod
+    def get_pr_by_ships(
+        self,
+        region_id: int,
+        algo_type: str,
+        game_type: str,
+        ships_data: dict[int, List[int]]
+    ) -> dict[int, dict]:
+        '''批量计算多个船只数据的评分数据
+
+        服务器数据一次性读取，评分通过get_rating_batch对所有船只向量化计算
+
+        注意，此处计算的pr值是带服务器修正后的数据
+
+        参数:
+            region_id 服务器id
+            algo_type 评分算法
+            game_type 数据对局类型 [pvp,rank,...]
+            ships_data 用户的数据 {ship_id: [battles,wins,damage,frag]}
+
+        返回:
+            Dict {ship_id: {value_battles_count,personal_rating,n_damage_dealt,n_frags}}
+        '''
+        ship_ids = list(ships_data.keys())
+        if ship_ids == []:
+            return {}
+        ship_data = np.array([ships_data[ship_id][:4] for ship_id in ship_ids], dtype=np.float64)
+        server_data = ShipData.get_ship_data_array(region_id, ship_ids)
+        rating = self.get_rating_batch(algo_type, game_type, ship_data, server_data)
+        battles_count = rating['value_battles_count'].tolist()
+        personal_rating = rating['personal_rating'].tolist()
+        n_damage_dealt = rating['n_damage_dealt'].tolist()
+        n_frags = rating['n_frags'].tolist()
+        result = {}
+        for i, ship_id in enumerate(ship_ids):
+            # 无效数据和逐条计算一样返回整数的默认值
+            if battles_count[i] == 0:
+                result[ship_id] = {
+                    'value_battles_count': 0,
+                    'personal_rating': -1,
+                    'n_damage_dealt': -1,
+                    'n_frags': -1
+                }
+            else:
+                result[ship_id] = {
+                    'value_battles_count': ships_data[ship_id][0],
+                    'personal_rating': personal_rating[i],
+                    'n_damage_dealt': n_damage_dealt[i],
+                    'n_frags': n_frags[i]
+                }
+        return result
+
+    @classmethod
     def get_pr_by_sid_and_region(
+        self,
         ship_id: int,
         region_id: int,
         algo_type: str,
@@ -15,8 +183,7 @@ class Rating_Algorithm:
     ):
         '''计算单条船只数据的评分数据
 
-        一次只能计算一个船只的数据，每次计算都会从读取一次本地文件
-        所以不适合进行批量计算评分数据，如需请使用其他方法
+        需要计算多个船只时请直接使用get_pr_by_ships，服务器数据只会读取一次
 
         注意，此处计算的pr值是带服务器修正后的数据
 
@@ -30,96 +197,46 @@ class Rating_Algorithm:
         返回:
             Dict
         '''
-        if algo_type == 'pr':
-            result = {
-                'value_battles_count': 0,
-                'personal_rating': -1,
-                'n_damage_dealt': -1,
-                'n_frags': -1
-            }
-            battles_count = ship_data[0]
-            if battles_count <= 0:
-                return result
-            # 获取服务器数据
-            server_data = ShipData.get_ship_data_by_sid_and_rid(region_id,ship_id)
-            if server_data == {}:
-                return result
-            # 用户数据
-            actual_wins = ship_data[1] / battles_count * 100
-            actual_dmg = ship_data[2] / battles_count
-            actual_frags = ship_data[3] / battles_count
-            # 服务器数据
-            server_data = server_data[ship_id]
-            expected_wins = server_data['win_rate']
-            expected_dmg = server_data['avg_damage']
-            expected_frags = server_data['avg_frags']
-            # 计算PR
-            # Step 1 - ratios:
-            r_wins = actual_wins / expected_wins
-            r_dmg = actual_dmg / expected_dmg
-            r_frags = actual_frags / expected_frags
-            # Step 2 - normalization:
-            n_wins = max(0, (r_wins - 0.7) / (1 - 0.7))
-            n_dmg = max(0, (r_dmg - 0.4) / (1 - 0.4))
-            n_frags = max(0, (r_frags - 0.1) / (1 - 0.1))
-            # Step 3 - PR value:
-            if game_type in ['rank', 'rank_solo']:
-                personal_rating = 600 * n_dmg + 350 * n_frags + 400 * n_wins
-            else:
-                personal_rating = 700 * n_dmg + 300 * n_frags + 150 * n_wins
-            result['value_battles_count'] = battles_count
-            result['personal_rating'] = round(personal_rating * battles_count, 6)
-            result['n_damage_dealt'] = round((actual_dmg / expected_dmg) * battles_count, 6)
-            result['n_frags'] = round((actual_frags / expected_frags) * battles_count, 6)
-            return result
-        
+        return self.get_pr_by_ships(region_id, algo_type, game_type, {ship_id: ship_data})[ship_id]
+
+    @classmethod
     def get_rating_by_data(
+        self,
         algo_type: str,
         game_type: str,
         ship_data: List[int | float],
         server_data: List[int | float] | None
     ):
+        '''计算单条船只数据的评分数据
+
+        通过get_rating_batch计算，和批量计算使用同一个已注册的算法
+
+        返回:
+            List [battles_count,personal_rating,n_damage_dealt,n_frags]
+        '''
         if not algo_type:
             return [0,-1,-1,-1]
-        if algo_type == 'pr':
-            battles_count = ship_data[0]
-            if battles_count <= 0:
-                return [0,-1,-1,-1]
-            # 获取服务器数据
-            if server_data == {} or server_data is None:
-                return [0,-1,-1,-1]
-            # 用户数据
-            actual_wins = ship_data[1] / battles_count * 100
-            actual_dmg = ship_data[2] / battles_count
-            actual_frags = ship_data[3] / battles_count
-            # 服务器数据
-            expected_wins = server_data[0]
-            expected_dmg = server_data[1]
-            expected_frags = server_data[2]
-            # 计算PR
-            # Step 1 - ratios:
-            r_wins = actual_wins / expected_wins
-            r_dmg = actual_dmg / expected_dmg
-            r_frags = actual_frags / expected_frags
-            # Step 2 - normalization:
-            n_wins = max(0, (r_wins - 0.7) / (1 - 0.7))
-            n_dmg = max(0, (r_dmg - 0.4) / (1 - 0.4))
-            n_frags = max(0, (r_frags - 0.1) / (1 - 0.1))
-            # Step 3 - PR value:
-            if game_type in ['rank', 'rank_solo']:
-                personal_rating = 600 * n_dmg + 350 * n_frags + 400 * n_wins
-            else:
-                personal_rating = 700 * n_dmg + 300 * n_frags + 150 * n_wins
-            return [
-                battles_count,
-                round(personal_rating * battles_count, 6),
-                round((actual_dmg / expected_dmg) * battles_count, 6),
-                round((actual_frags / expected_frags) * battles_count, 6)
-            ]
-        else:
-            raise ValueError('Invaild Algorithm Parameters')
-        
+        # 未注册的算法抛出ValueError
+        self.__get_algorithm(algo_type)
+        battles_count = ship_data[0]
+        if battles_count <= 0:
+            return [0,-1,-1,-1]
+        # 获取服务器数据
+        if server_data == {} or server_data is None:
+            return [0,-1,-1,-1]
+        rating = self.get_rating_batch(algo_type, game_type, [ship_data[:4]], [server_data[:3]])
+        if rating['value_battles_count'][0] == 0:
+            return [0,-1,-1,-1]
+        return [
+            battles_count,
+            rating['personal_rating'].tolist()[0],
+            rating['n_damage_dealt'].tolist()[0],
+            rating['n_frags'].tolist()[0]
+        ]
+
+    @classmethod
     def get_rating_class(
+        self,
         algo_type: str, 
         rating: int | float, 
         show_eggshell: bool = False
@@ -127,67 +244,48 @@ class Rating_Algorithm:
         '''获取pr的等级以及距离下一级的差值
 
         其中启用彩蛋功能才会返回彩色评分
-        
+
+        分界值来自已注册的算法，未注册的算法返回 (0, 2)
         '''
-        if algo_type == 'pr':
-            if rating == -2:
-                return 0, 2
-            if rating == -1:
-                return 0, 1
-            if show_eggshell:
-                data = [750, 1100, 1350, 1550, 1750, 2100, 2450, 3250]
-                for i in range(len(data)):
-                    if rating < data[i]:
-                        return i + 1, int(data[i]-rating)
-                return 9, int(rating - 3250)
-            else:
-                data = [750, 1100, 1350, 1550, 1750, 2100, 2450]
-                for i in range(len(data)):
-                    if rating < data[i]:
-                        return i + 1, int(data[i]-rating)
-                return 8, int(rating - 2450)
-        else:
-            return 0, 2
-        
+        classes, diff = self.get_rating_class_batch(algo_type, [rating], show_eggshell)
+        return int(classes[0]), int(diff[0])
+
+    @classmethod
     def get_content_class(
+        self,
         algo_type: str, 
         index: int, 
         value: int | float
     ) -> int:
-        index_list = [
-            [45, 49, 51, 52.5, 55, 60, 70],
-            [0.8, 0.95, 1.0, 1.1, 1.2, 1.4, 1.7],
-            [0.2, 0.3, 0.6, 1.0, 1.3, 1.5, 2],
-            [750, 1100, 1350, 1550, 1750, 2100, 2450]
-        ]
-        if algo_type == 'pr':
-            if value == -2:
-                return 0
-            if value == -1:
-                return 0
-            data = index_list[index]
-            for i in range(len(data)):
-                if value < data[i]:
-                    return i + 1
-            return 8
-        else:
-            raise ValueError('Invaild Algorithm Parameters')
-       
+        "获取数据的等级，分界值来自已注册的算法"
+        return int(self.get_content_class_batch(algo_type, index, [value])[0])
+
     @ExceptionLogger.handle_database_exception_async
     async def batch_pr_by_data(
         ship_id: int,
         region_id: int,
         algo_type: str,
         redis: Redis,
+        chunk_size: int = 1000
     ):
+        '''计算单船单服务器的排行榜数据并写入redis
+
+        用户数据、名称和工会信息通过一次联表查询获取，评分对整批数据向量化计算，
+        结果按chunk_size分块通过pipeline写入
 
+        参数:
+            ship_id 船只id
+            region_id 服务器id
+            algo_type 评分算法
+            redis redis连接
+            chunk_size 每次pipeline提交的用户数量
+        '''
         from app.models.ship_rank import RankDataModel
-        data = await RankDataModel.get_ship_data(ship_id, region_id)
+        data = await RankDataModel.get_ship_rank_data(ship_id, region_id)
         if data['code'] != 1000:
             print(ship_id, region_id, '无服务器数据')
             return None
-        data = data['data']
-        x = len(data)
+        rows = data['data']
         if algo_type == 'pr':
             result = {}
             # 获取服务器数据
@@ -201,85 +299,160 @@ class Rating_Algorithm:
             expected_dmg = server_data[1]
             expected_frags = server_data[2]
             # excepted_exp = server_data[3]
-            final_user_ship_data = {}
-            final_pr = {}
-            final_user_data = {}
-            # 遍历用户数据
-            for i in range(x):
-                user_data = {}
-                battles_count = data[i][1]
-                actual_wins = data[i][2] / battles_count * 100
-                actual_dmg = data[i][3] / battles_count
-                actual_frags = data[i][4] / battles_count
-                actual_exp = data[i][5] / battles_count
-                lose_count = battles_count - data[i][2]
-                user_id = data[i][0]
-                # 计算PR
-                r_wins = actual_wins / expected_wins
-                r_dmg = actual_dmg / expected_dmg
-                r_frags = actual_frags / expected_frags
-                n_wins = max(0, (r_wins - 0.7) / (1 - 0.7))
-                n_dmg = max(0, (r_dmg - 0.4) / (1 - 0.4))
-                n_frags = max(0, (r_frags - 0.1) / (1 - 0.1))
-                personal_rating = 700 * n_dmg + 300 * n_frags + 150 * n_wins
-                cWins = (data[i][2] * 1.5 + lose_count) / battles_count
-                cExp = actual_exp / cWins
-                personal_rating = personal_rating + cExp * 0.2
-                user_data = {
-                    "Player": user_id,
-                    "battle_count": battles_count,
-                    "PR": round(personal_rating),
-                    "win_rate": round(actual_wins, 2),
-                    "avg_frag": round(actual_frags, 2),
-                    "max_frag": data[i][8],
-                    "avg_Dmg": round(actual_dmg),
-                    "max_Dmg": data[i][7],
-                    "avg_Exp": round(actual_exp),
-                    "max_Exp": data[i][6],
-                }
-                final_pr[f"{user_id}"] = personal_rating
-                final_user_ship_data[f"ship_data:{ship_id}:{user_id}"] = user_data
-                user_data_response = await RankDataModel.get_user(user_id, region_id)
-                if user_data_response['status'] == 'ok':
-                    username = user_data_response['data'][0][0]
-                    clan_id_response = await RankDataModel.get_clan_id(user_id)
-                    if clan_id_response['status'] == 'ok':
-                        clan_id = clan_id_response['data'][0][0]
-                        if not clan_id:
-                            clan = clan_id = league = 'NULL'
-                        else:
-                            clan_response = await RankDataModel.get_clan(clan_id, region_id)
-                            clan_data = clan_response['data']
-                            league = clan_data[0][1]
-                            clan = clan_data[0][0]
-                        user_data_dict = {
-                            "username": username,
-                            "clan_id": clan_id,
-                            "clan_tag": clan,
-                            "clan_rank": league
-                        }
-                        final_user_data[f"user_data:{user_id}"] = user_data_dict
-                    else:
-                        continue
-                else:
-                    continue
-            pipeline = redis.pipeline()
-            size = 100
+            # [battles_count, wins, damage_dealt, frags, exp]
+            array = np.array([row[1:6] for row in rows], dtype=np.float64)
+            battles_count = array[:, 0]
+            wins = array[:, 1]
+            actual_wins = wins / battles_count * 100
+            actual_dmg = array[:, 2] / battles_count
+            actual_frags = array[:, 3] / battles_count
+            actual_exp = array[:, 4] / battles_count
+            lose_count = battles_count - wins
+            # 计算PR
+            n_wins, n_dmg, n_frags = pr_normalization(
+                actual_wins, actual_dmg, actual_frags,
+                expected_wins, expected_dmg, expected_frags
+            )
+            personal_rating = 700 * n_dmg + 300 * n_frags + 150 * n_wins
+            # 排行榜在PR的基础上额外加上经验修正
+            c_wins = (wins * 1.5 + lose_count) / battles_count
+            c_exp = actual_exp / c_wins
+            personal_rating = personal_rating + c_exp * 0.2
+            personal_rating = personal_rating.tolist()
+            actual_wins = actual_wins.tolist()
+            actual_dmg = actual_dmg.tolist()
+            actual_frags = actual_frags.tolist()
+            actual_exp = actual_exp.tolist()
             key = f"region:{region_id}:ship:{ship_id}"
-            try:
-                for i in range(0, len(final_pr), size):
-                    batch = dict(list(final_pr.items())[i:i + size]) 
-                    pipeline.zadd(key, batch)
-                pipeline.expire(key, 3600)
-                for hash_name, userdata in final_user_ship_data.items():
-                    pipeline.hset(hash_name, mapping=userdata)
+            for start in range(0, len(rows), chunk_size):
+                pipeline = redis.pipeline(transaction=False)
+                final_pr = {}
+                for i in range(start, min(start + chunk_size, len(rows))):
+                    row = rows[i]
+                    user_id = row[0]
+                    final_pr[f"{user_id}"] = personal_rating[i]
+                    hash_name = f"ship_data:{ship_id}:{user_id}"
+                    pipeline.hset(hash_name, mapping={
+                        "Player": user_id,
+                        "battle_count": row[1],
+                        "PR": round(personal_rating[i]),
+                        "win_rate": round(actual_wins[i], 2),
+                        "avg_frag": round(actual_frags[i], 2),
+                        "max_frag": row[8],
+                        "avg_Dmg": round(actual_dmg[i]),
+                        "max_Dmg": row[7],
+                        "avg_Exp": round(actual_exp[i]),
+                        "max_Exp": row[6],
+                    })
                     pipeline.expire(hash_name, 3600)
-                for hash_name, userdata in final_user_data.items():
-                    pipeline.hset(hash_name, mapping=userdata)
+                    username, clan_id, clan_tag, league = row[9:13]
+                    # 没有用户信息的用户只写入评分
+                    if username is None:
+                        continue
+                    if not clan_id or clan_tag is None:
+                        clan_tag = clan_id = league = 'NULL'
+                    hash_name = f"user_data:{user_id}"
+                    pipeline.hset(hash_name, mapping={
+                        "username": username,
+                        "clan_id": clan_id,
+                        "clan_tag": clan_tag,
+                        "clan_rank": league
+                    })
                     pipeline.expire(hash_name, 3600)
+                pipeline.zadd(key, final_pr)
+                pipeline.expire(key, 3600)
                 pipeline.execute()
-            except Exception as e:
-                raise e
             return JSONResponse.get_success_response()
         else:
-            raise ValueError('Invalid Algorithm Parameters')
\ No newline at end of file
+            raise ValueError('Invalid Algorithm Parameters')
+
+def pr_normalization(
+    actual_wins: np.ndarray,
+    actual_dmg: np.ndarray,
+    actual_frags: np.ndarray,
+    expected_wins: np.ndarray | float,
+    expected_dmg: np.ndarray | float,
+    expected_frags: np.ndarray | float
+):
+    '''PR计算的前两步，计算和服务器数据的比值并归一化
+
+    返回:
+        Tuple[np.ndarray, np.ndarray, np.ndarray] n_wins/n_dmg/n_frags
+    '''
+    # Step 1 - ratios:
+    r_wins = actual_wins / expected_wins
+    r_dmg = actual_dmg / expected_dmg
+    r_frags = actual_frags / expected_frags
+    # Step 2 - normalization:
+    # 使用where而不是maximum，和max(0, x)一样在x为nan时取0
+    n_wins = (r_wins - 0.7) / (1 - 0.7)
+    n_wins = np.where(n_wins > 0, n_wins, 0)
+    n_dmg = (r_dmg - 0.4) / (1 - 0.4)
+    n_dmg = np.where(n_dmg > 0, n_dmg, 0)
+    n_frags = (r_frags - 0.1) / (1 - 0.1)
+    n_frags = np.where(n_frags > 0, n_frags, 0)
+    return n_wins, n_dmg, n_frags
+
+@Rating_Algorithm.register_algorithm(
+    algo_type='pr',
+    thresholds=[750, 1100, 1350, 1550, 1750, 2100, 2450],
+    eggshell_thresholds=[750, 1100, 1350, 1550, 1750, 2100, 2450, 3250],
+    content_thresholds=[
+        [45, 49, 51, 52.5, 55, 60, 70],
+        [0.8, 0.95, 1.0, 1.1, 1.2, 1.4, 1.7],
+        [0.2, 0.3, 0.6, 1.0, 1.3, 1.5, 2],
+        [750, 1100, 1350, 1550, 1750, 2100, 2450]
+    ]
+)
+def pr_rating_batch(
+    game_type: str,
+    ship_data: np.ndarray,
+    server_data: np.ndarray
+) -> dict:
+    '''PR的批量计算
+
+    运算顺序和单条计算保持一致，保证浮点结果相同
+
+    无效数据(场次<=0、没有服务器数据或者服务器数据不大于0)的结果为 [0,-1,-1,-1]
+    '''
+    battles_count = ship_data[:, 0]
+    # 服务器数据为nan时比较结果为False，同时排除了缺失的数据和除0
+    valid = (battles_count > 0) & (server_data > 0).all(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 用户数据
+        actual_wins = ship_data[:, 1] / battles_count * 100
+        actual_dmg = ship_data[:, 2] / battles_count
+        actual_frags = ship_data[:, 3] / battles_count
+        # 服务器数据
+        expected_wins = server_data[:, 0]
+        expected_dmg = server_data[:, 1]
+        expected_frags = server_data[:, 2]
+        # Step 1/2 - ratios and normalization:
+        n_wins, n_dmg, n_frags = pr_normalization(
+            actual_wins, actual_dmg, actual_frags,
+            expected_wins, expected_dmg, expected_frags
+        )
+        # Step 3 - PR value:
+        if game_type in ['rank', 'rank_solo']:
+            personal_rating = 600 * n_dmg + 350 * n_frags + 400 * n_wins
+        else:
+            personal_rating = 700 * n_dmg + 300 * n_frags + 150 * n_wins
+        personal_rating = personal_rating * battles_count
+        n_damage_dealt = (actual_dmg / expected_dmg) * battles_count
+        n_frags = (actual_frags / expected_frags) * battles_count
+    # np.round的实现和内置round不同，结果可能存在最后一位的差异，这里使用内置round
+    return {
+        'value_battles_count': np.where(valid, battles_count, 0).astype(np.int64),
+        'personal_rating': np.array(
+            [round(x, 6) if v else -1 for x, v in zip(personal_rating.tolist(), valid.tolist())],
+            dtype=np.float64
+        ),
+        'n_damage_dealt': np.array(
+            [round(x, 6) if v else -1 for x, v in zip(n_damage_dealt.tolist(), valid.tolist())],
+            dtype=np.float64
+        ),
+        'n_frags': np.array(
+            [round(x, 6) if v else -1 for x, v in zip(n_frags.tolist(), valid.tolist())],
+            dtype=np.float64
+        )
+    }
@@ -1,12 +1,30 @@
+import math
 from typing import List, Set
 
-from app.json import JsonData
+import numpy as np
+
+from app.json import JsonData, ShipDataIndex
 from app.utils import UtilityFunctions
 
 class ShipData:
     def get_ship_data_by_sid_and_rid(region_id: int, ship_id: int):
         "通过ship_id(int)获取船只的服务器数据"
         result = {}
+        index = ShipDataIndex.get_snapshot()
+        if index is not None:
+            offset = index.get_offset(region_id, ship_id)
+            if offset == -1:
+                return result
+            win_rate = index.get_value(offset, 0)
+            if math.isnan(win_rate):
+                return None
+            result[ship_id] = [
+                win_rate,
+                index.get_value(offset, 1),
+                index.get_value(offset, 2),
+                index.get_value(offset, 3)
+            ]
+            return result
         region = UtilityFunctions.get_region(region_id)
         ship_data = JsonData.read_json_data('ship_data')['ship_data']
         if str(ship_id) not in ship_data:
@@ -25,6 +43,18 @@ class ShipData:
     def get_ship_data_batch(region_id: int, ship_ids: List[int] | Set[int]) -> dict:
         "通过ship_id(int)列表批量获取船只的服务器数据"
         result = {}
+        index = ShipDataIndex.get_snapshot()
+        if index is not None:
+            for ship_id in ship_ids:
+                offset = index.get_offset(region_id, int(ship_id))
+                # nan和任何数比较都为False，缺失的数据会被过滤
+                if offset != -1 and index.get_value(offset, 4) >= 1000:
+                    result[ship_id] = [
+                        index.get_value(offset, 0),
+                        index.get_value(offset, 1),
+                        index.get_value(offset, 2)
+                    ]
+            return result
         region = UtilityFunctions.get_region(region_id)
         ship_data = JsonData.read_json_data('ship_data')['ship_data']
         for ship_id in ship_ids:
@@ -38,4 +68,29 @@ class ShipData:
                     ship_data[str(ship_id)][region]['avg_frags']
                 ]
         return result
-        
+
+    def get_ship_data_array(region_id: int, ship_ids: List[int]) -> np.ndarray:
+        '''批量获取船只的服务器数据，用于批量计算评分
+
+        返回:
+            np.ndarray shape(n,3) [win_rate,avg_damage,avg_frags]，缺失的数据为nan
+        '''
+        result = np.full((len(ship_ids), 3), np.nan, dtype=np.float64)
+        index = ShipDataIndex.get_snapshot()
+        if index is not None:
+            for i, ship_id in enumerate(ship_ids):
+                offset = index.get_offset(region_id, int(ship_id))
+                if offset != -1:
+                    result[i, 0] = index.get_value(offset, 0)
+                    result[i, 1] = index.get_value(offset, 1)
+                    result[i, 2] = index.get_value(offset, 2)
+            return result
+        region = UtilityFunctions.get_region(region_id)
+        ship_data = JsonData.read_json_data('ship_data')['ship_data']
+        for i, ship_id in enumerate(ship_ids):
+            data = ship_data.get(str(ship_id), {}).get(region, {})
+            if 'win_rate' in data:
+                result[i, 0] = data['win_rate']
+                result[i, 1] = data['avg_damage']
+                result[i, 2] = data['avg_frags']
+        return result
@@ -321,6 +321,53 @@ CREATE TABLE existing_ships (
     PRIMARY KEY (id) -- 主键
 );
 
+-- SHIP_STORAGE = partitioned 时使用，所有船只的数据保存在同一张表中
+-- ship_id的低位大多相同，使用KEY分区使数据均匀分布
+CREATE TABLE ship_stats (
+    -- 相关id
+    ship_id          BIGINT       NOT NULL,
+    account_id       BIGINT       NOT NULL,
+    region_id        TINYINT      NOT NULL,
+    -- 船只数据，字段和ship_{id}表一致
+    battles_count    INT          NOT NULL,
+    battle_type_1    INT          NOT NULL,
+    battle_type_2    INT          NOT NULL,
+    battle_type_3    INT          NOT NULL,
+    wins             INT          NOT NULL,
+    damage_dealt     BIGINT       NOT NULL,
+    frags            INT          NOT NULL,
+    exp              BIGINT       NOT NULL,
+    survived         INT          NOT NULL,
+    scouting_damage  BIGINT       NOT NULL,
+    art_agro         BIGINT       NOT NULL,
+    planes_killed    INT          NOT NULL,
+    max_exp          INT          NOT NULL,
+    max_damage_dealt INT          NOT NULL,
+    max_frags        INT          NOT NULL,
+    -- 记录数据创建的时间和更新时间
+    created_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (ship_id, region_id, account_id), -- 主键
+
+    INDEX idx_rid_aid (region_id, account_id) -- 用户的所有船只
+) PARTITION BY KEY (ship_id) PARTITIONS 64;
+
+-- 每个用户一行，保存用户所有船只的数据，和船只表在同一个事务中写入
+CREATE TABLE user_ship_stats (
+    -- 相关id
+    account_id       BIGINT       NOT NULL,
+    region_id        TINYINT      NOT NULL,
+    -- 船只数据
+    ships_count      SMALLINT     NOT NULL,     -- 船只数量
+    stats_data       MEDIUMBLOB   NOT NULL,     -- 每个船只为ship_id+15个字段的小端定长整数，按ship_id排序
+    -- 记录数据创建的时间和更新时间
+    created_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (region_id, account_id) -- 主键
+);
+
 CREATE DATABASE kokomi_bot;
 USE kokomi_bot;
 
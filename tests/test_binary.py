@@ -0,0 +1,48 @@
+import sys
+import random
+import timeit
+
+sys.path.append('.')
+from app.utils.binary_utils import BinaryParserUtils, BinaryGeneratorUtils, UserShipsView
+
+# 原有的基于二进制字符串的实现
+def old_to_binary(data_dict: dict) -> bytes:
+    result = bytearray()
+    for key, value in data_dict.items():
+        full_bin = f'{key:034b}' + f'{value:022b}'
+        for i in range(0, len(full_bin), 8):
+            result.append(int(full_bin[i:i+8], 2))
+    return bytes(result)
+
+def old_from_binary(binary_data: bytes) -> dict:
+    result = {}
+    for i in range(len(binary_data) // 7):
+        full_bin = ''.join(f'{byte:08b}' for byte in binary_data[i * 7:(i + 1) * 7])
+        result[int(full_bin[:34], 2)] = int(full_bin[34:], 2)
+    return result
+
+random.seed(0)
+data = {random.randrange(2**34): random.randrange(2**22) for _ in range(500)}
+old_bytes = old_to_binary(data)
+new_bytes = BinaryGeneratorUtils.to_user_binary_data_from_dict(data)
+assert old_bytes == new_bytes
+assert BinaryParserUtils.from_user_binary_data_to_dict(old_bytes) == old_from_binary(old_bytes) == data
+
+sorted_bytes = BinaryGeneratorUtils.to_user_binary_data_from_dict(data, sort_keys=True)
+view = UserShipsView(sorted_bytes)
+assert dict(view.items()) == data and len(view) == 500
+ship_id, ship_id_2 = random.sample(list(data.keys()), 2)
+assert view[ship_id] == data[ship_id] and (ship_id + 1 in view) == (ship_id + 1 in data)
+
+number = 200
+for name, func in [
+    ('old encode', lambda: old_to_binary(data)),
+    ('new encode', lambda: BinaryGeneratorUtils.to_user_binary_data_from_dict(data)),
+    ('old decode', lambda: old_from_binary(old_bytes)),
+    ('new decode', lambda: BinaryParserUtils.from_user_binary_data_to_dict(old_bytes)),
+    ('view get 2', lambda: (UserShipsView(sorted_bytes).get(ship_id), UserShipsView(sorted_bytes).get(ship_id_2))),
+    ('view miss', lambda: UserShipsView(sorted_bytes).get(1)),
+    ('view len', lambda: len(UserShipsView(sorted_bytes))),
+]:
+    t = timeit.timeit(func, number=number)
+    print(f'{name}: {t / number * 1e6:10.1f} us (500 ships)')
@@ -0,0 +1,38 @@
+import gc
+import sys
+
+sys.path.append('.')
+from app.core import EnvConfig, GCManager
+
+# 检查GCManager的阈值设置、freeze以及回收统计
+config = EnvConfig.get_config()
+old_threshold = gc.get_threshold()
+try:
+    GCManager.setup()
+    assert gc.get_threshold() == (config.GC_THRESHOLD_0, config.GC_THRESHOLD_1, config.GC_THRESHOLD_2)
+    assert GCManager._callback in gc.callbacks
+    # 重复调用不会重复注册回调
+    GCManager.setup()
+    assert gc.callbacks.count(GCManager._callback) == 1
+
+    # freeze之后已有的对象移入永久代
+    heap = [{'id': i} for i in range(1000)]
+    GCManager.freeze()
+    assert gc.get_freeze_count() >= len(heap)
+
+    # 每次回收都会记录到对应代的统计数据中
+    before = GCManager.get_stats()['generations'][2]['collections']
+    gc.collect(2)
+    stats = GCManager.get_stats()
+    assert stats['threshold'] == gc.get_threshold()
+    assert stats['frozen'] == gc.get_freeze_count()
+    generation = stats['generations'][2]
+    assert generation['collections'] == before + 1
+    assert generation['pause_max'] >= 0
+    assert generation['pause_total'] >= generation['pause_max']
+finally:
+    gc.unfreeze()
+    gc.set_threshold(*old_threshold)
+    if GCManager._callback in gc.callbacks:
+        gc.callbacks.remove(GCManager._callback)
+print('GCManager ok')
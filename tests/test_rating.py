@@ -0,0 +1,74 @@
+import sys
+import math
+import random
+import timeit
+
+import numpy as np
+
+sys.path.append('.')
+from app.utils.algo_utils import Rating_Algorithm
+
+# 批量计算和逐条计算的结果对比，包含场次为0以及没有服务器数据的情况
+random.seed(0)
+N = 20000
+ship_data = []
+server_data = []
+for i in range(N):
+    battles = random.choice([0, 0, random.randint(1, 20), random.randint(1, 5000)])
+    wins = random.randint(0, battles)
+    ship_data.append([battles, wins, random.randint(0, battles * 200000), random.randint(0, battles * 6)])
+    if i % 7 == 0:
+        server_data.append(None)
+    else:
+        server_data.append([random.uniform(40, 60), random.uniform(10000, 120000), random.uniform(0.2, 1.5)])
+server_array = np.array(
+    [x if x is not None else [np.nan] * 3 for x in server_data],
+    dtype=np.float64
+)
+
+for game_type in ['pvp', 'rank']:
+    batch = Rating_Algorithm.get_rating_batch('pr', game_type, ship_data, server_array)
+    mismatch = 0
+    for i in range(N):
+        single = Rating_Algorithm.get_rating_by_data('pr', game_type, ship_data[i], server_data[i])
+        batch_row = [
+            batch['value_battles_count'][i],
+            batch['personal_rating'][i],
+            batch['n_damage_dealt'][i],
+            batch['n_frags'][i]
+        ]
+        if single != batch_row:
+            mismatch += 1
+    assert mismatch == 0, f'{game_type}: {mismatch} mismatches'
+
+    ratings = batch['personal_rating'] / np.where(batch['value_battles_count'] > 0, batch['value_battles_count'], 1)
+    ratings[batch['value_battles_count'] == 0] = -1
+    for show_eggshell in [False, True]:
+        classes, diff = Rating_Algorithm.get_rating_class_batch('pr', ratings, show_eggshell)
+        for i, rating in enumerate(ratings.tolist()):
+            assert Rating_Algorithm.get_rating_class('pr', rating, show_eggshell) == (classes[i], diff[i])
+    win_rates = np.array([x[1] / x[0] * 100 if x[0] else -1 for x in ship_data])
+    classes = Rating_Algorithm.get_content_class_batch('pr', 0, win_rates)
+    for i, win_rate in enumerate(win_rates.tolist()):
+        assert not math.isnan(win_rate)
+        assert Rating_Algorithm.get_content_class('pr', 0, win_rate) == classes[i]
+# 服务器数据为0时两种计算方式都视为无效数据
+zero_server = [[0, 50000, 1.0], [50, 0, 1.0], [50, 50000, 0]]
+for row in zero_server:
+    assert Rating_Algorithm.get_rating_by_data('pr', 'pvp', [10, 5, 500000, 10], row) == [0, -1, -1, -1]
+batch = Rating_Algorithm.get_rating_batch('pr', 'pvp', [[10, 5, 500000, 10]] * 3, zero_server)
+assert batch['value_battles_count'].tolist() == [0, 0, 0]
+assert batch['personal_rating'].tolist() == [-1, -1, -1]
+print(f'{N} rows, batch result is identical')
+
+number = 5
+single_time = timeit.timeit(
+    lambda: [Rating_Algorithm.get_rating_by_data('pr', 'pvp', ship_data[i], server_data[i]) for i in range(N)],
+    number=number
+)
+batch_time = timeit.timeit(
+    lambda: Rating_Algorithm.get_rating_batch('pr', 'pvp', ship_data, server_array),
+    number=number
+)
+print(f'single: {single_time / number * 1000:8.1f} ms ({N} rows)')
+print(f'batch:  {batch_time / number * 1000:8.1f} ms ({N} rows)')
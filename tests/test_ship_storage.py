@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.append('.')
+from app.models.ship_storage import ShipStorage, get_ship_storage, encode_user_ship_stats, decode_user_ship_stats
+
+# app和tool中的ship_storage需要保持一致
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+with open(os.path.join(root, 'app', 'models', 'ship_storage.py'), 'rb') as f:
+    app_source = f.read()
+with open(os.path.join(root, 'tool', 'common', 'ship_storage.py'), 'rb') as f:
+    tool_source = f.read()
+assert app_source == tool_source, 'app/models/ship_storage.py and tool/common/ship_storage.py are out of sync'
+
+# 基类不能直接使用，所有存储方式都实现了全部接口
+try:
+    ShipStorage('db')
+except TypeError:
+    pass
+else:
+    raise AssertionError('ShipStorage should be abstract')
+for name in ['tables', 'partitioned']:
+    storage = get_ship_storage(name, 'db')
+    assert storage.name == name
+    assert storage.get_write_batches([]) == []
+
+# user_ship_stats的二进制数据
+ship_dict = {20: list(range(15)), 10: [7] * 5 + [2**40] + [7] * 9}
+ship_ids, stats = decode_user_ship_stats(encode_user_ship_stats(ship_dict))
+assert ship_ids.tolist() == [10, 20]
+assert stats[0, 5] == 2**40 and stats[0, 0] == 7 and stats[1].tolist() == list(range(15))
+print('ship_storage ok')
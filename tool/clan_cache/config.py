@@ -9,6 +9,8 @@ class LoadConfig(BaseSettings):
     MYSQL_PORT: int
     MYSQL_USERNAME: str
     MYSQL_PASSWORD: str
+    MYSQL_POOL_SIZE: int = 4            # 连接池的最大连接数
+    SLOW_QUERY_TIME: float = 1.0        # 超过该耗时(s)的语句会记录为慢查询
 
     DB_NAME_MAIN: str
     DB_NAME_BOT: str
@@ -35,6 +35,8 @@ class ContinuousUserCacheUpdater:
         self.stop_event.set()  # 设置停止事件
 
 async def main():
+    # 连接池需要在事件循环中创建
+    await DatabaseConnection.init_pool()
     updater = ContinuousUserCacheUpdater()
 
     # 创建并启动异步更新任务
@@ -43,17 +45,17 @@ async def main():
         await update_task
     except asyncio.CancelledError:
         updater.stop()
+    finally:
+        # 退出并释放资源
+        await DatabaseConnection.close_pool()
 
 if __name__ == "__main__":
     logger.info('开始运行ClanCache更新进程')
-    DatabaseConnection.init_pool()
     # 开始不间断更新
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info('收到进程关闭信号')
-    # 退出并释放资源
-    DatabaseConnection.close_pool()
     wait_second = 3
     while wait_second > 0:
         logger.info(f'进程将在 {wait_second} s后关闭')
@@ -30,7 +30,7 @@ class Update:
         if season_number == None or len(clan_data_list) == 0:
             return
         need_update_list = []
-        update_result = update_clan_info_batch(region_id, season_number, clan_data_list)
+        update_result = await update_clan_info_batch(region_id, season_number, clan_data_list)
         if update_result.get('code', None) != 1000:
             return
         need_update_list = update_result['data']
@@ -45,27 +45,27 @@ class Update:
                     'region_id': region_id,
                     'is_active': 0
                 }
-                self.update_clan_info(clan_id, region_id, clan_basic)
+                await self.update_clan_info(clan_id, region_id, clan_basic)
                 logger.debug(f"{region_id} - {clan_id} | ├── 工会不存在，更新数据")
                 continue
             if clan_cvc_data.get('code', None) != 1000:
                 logger.error(f"{region_id} - {clan_id} | ├── 网络请求失败，Error: {clan_cvc_data.get('message')}")
                 continue
-            self.update_clan_season(clan_id, region_id, clan_cvc_data['data'])
+            await self.update_clan_season(clan_id, region_id, clan_cvc_data['data'])
         return
 
-    def update_clan_info(clan_id: int, region_id: int, clan_data: dict):
+    async def update_clan_info(clan_id: int, region_id: int, clan_data: dict):
         # 更新clan_basic和clan_info表的信息
-        result = update_clan_basic_and_info(clan_data)
+        result = await update_clan_basic_and_info(clan_data)
         if result.get('code', None) != 1000:
             logger.error(f"{region_id} - {clan_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
             return
         logger.debug(f"{region_id} - {clan_id} | ├── 工会info数据更新完成")
         return
 
-    def update_clan_season(clan_id: int, region_id: int, clan_data: dict):
+    async def update_clan_season(clan_id: int, region_id: int, clan_data: dict):
         # 更新clan_basic和clan_info表的信息
-        result = update_clan_season(clan_data)
+        result = await update_clan_season(clan_data)
         if result.get('code', None) != 1000:
             logger.error(f"{region_id} - {clan_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
             return
@@ -40,11 +40,11 @@ class Update:
                     'is_active': 0
                 }
                 logger.debug(f"{region_id} - {clan_id} | ├── 工会不存在，更新数据")
-                self.update_clan_info(clan_id, region_id, clan_basic)
+                await self.update_clan_info(clan_id, region_id, clan_basic)
                 return
             elif result.get('code', None) != 1000:
                 return
-            self.update_clan_users(clan_id, region_id, result['data']['clan_users']['clan_users'])
+            await self.update_clan_users(clan_id, region_id, result['data']['clan_users']['clan_users'])
             return
         else:
             result = await Network.get_cache_data(clan_id, region_id)
@@ -55,17 +55,17 @@ class Update:
                     'is_active': 0
                 }
                 logger.debug(f"{region_id} - {clan_id} | ├── 工会不存在，更新数据")
-                self.update_clan_info(clan_id, region_id, clan_basic)
+                await self.update_clan_info(clan_id, region_id, clan_basic)
                 return
             elif result.get('code', None) != 1000:
                 return
-            self.update_clan_info(clan_id, region_id, result['data']['clan_basic'])
-            self.update_clan_users(clan_id, region_id, result['data']['clan_users']['clan_users'])
+            await self.update_clan_info(clan_id, region_id, result['data']['clan_basic'])
+            await self.update_clan_users(clan_id, region_id, result['data']['clan_users']['clan_users'])
             return
     
-    def update_clan_users(clan_id: int, region_id: int, clan_users: list):
+    async def update_clan_users(clan_id: int, region_id: int, clan_users: list):
         # 首先检查传入的用户是否都在数据库中存在
-        result = check_and_insert_missing_users(clan_users)
+        result = await check_and_insert_missing_users(clan_users)
         if result.get('code', None) != 1000:
             logger.error(f"{region_id} - {clan_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
             return
@@ -74,23 +74,23 @@ class Update:
         for user in clan_users:
             user_data.append(user[0])
         if len(user_data) != 0:
-            result = update_users_clan(clan_id, user_data)
+            result = await update_users_clan(clan_id, user_data)
             if result.get('code', None) != 1000:
                 logger.error(f"{region_id} - {clan_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
                 return
         # 最后更新工会内所有用户的数据
         user_data.sort()
         hash_value = HashUtils.get_clan_users_hash(user_data)
-        result = update_clan_users(clan_id, hash_value, user_data)
+        result = await update_clan_users(clan_id, hash_value, user_data)
         if result.get('code', None) != 1000:
             logger.error(f"{region_id} - {clan_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
             return
         logger.debug(f"{region_id} - {clan_id} | ├── 工会User数据更新完成")
         return
 
-    def update_clan_info(clan_id: int, region_id: int, clan_data: dict):
+    async def update_clan_info(clan_id: int, region_id: int, clan_data: dict):
         # 更新clan_basic和clan_info表的信息
-        result = update_clan_basic_and_info(clan_data)
+        result = await update_clan_basic_and_info(clan_data)
         if result.get('code', None) != 1000:
             logger.error(f"{region_id} - {clan_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
             return
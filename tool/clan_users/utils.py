@@ -1,4 +1,6 @@
+import struct
 import hashlib
+from collections.abc import Mapping
 
 class HashUtils:
     def get_clan_users_hash(user_list: list):
@@ -7,24 +9,25 @@ class HashUtils:
         hash_value = hashlib.sha256(str(user_list).encode('utf-8')).hexdigest()
         return hash_value
 
+# user数据每条记录为7字节，前34位是ship_id，后22位是场次
+USER_RECORD = struct.Struct('>BHI')
+USER_VALUE_MASK = (1 << 22) - 1
+USER_EMPTY_DATA = b'\x00\x00\x00\x00\x00\x00\x00'
+
 class BinaryParserUtils:
     @classmethod
     def from_user_binary_data_to_dict(self, binary_data: bytes):
         '''从user的二进制数据中解析为dict数据'''
         # 存储转换后的字典
         result = {}
-        if binary_data is None or binary_data == b'\x00\x00\x00\x00\x00\x00\x00':
+        if binary_data is None or binary_data == USER_EMPTY_DATA:
             return result
-        # 每个数据项的字节数是 7 字节
-        # 根据字节流的长度，计算出有多少个数据项
-        num_items = len(binary_data) // 7
-        for i in range(num_items):
-            # 提取 7 字节的数据
-            item_data = binary_data[i * 7:(i + 1) * 7]
-            # 将字节数据转换为 key 和 value
-            key, value = self.__from_user_binary_data(item_data)
-            # 将 key 和 value 存入字典
-            result[key] = value
+        # 每个数据项的字节数是 7 字节，多余的字节忽略
+        size = len(binary_data) // 7 * 7
+        # 7字节按 1+2+4 字节整体解析，再通过移位拆分出 key(34位) 和 value(22位)
+        for high, middle, low in USER_RECORD.iter_unpack(memoryview(binary_data)[:size]):
+            item = (high << 48) | (middle << 32) | low
+            result[item >> 22] = item & USER_VALUE_MASK
         return result
     
     def from_clan_binary_data_to_list(binary_data: bytes) -> list[int]:
@@ -40,35 +43,31 @@ class BinaryParserUtils:
             result.append(number)
         return result
 
-    def __from_user_binary_data(byte_data):
-        # 确保字节数据的长度是7字节
-        if len(byte_data) != 7:
-            raise ValueError("Byte data must be exactly 7 bytes.")
-        # 将字节数据转换为二进制字符串
-        full_bin = ''.join(f'{byte:08b}' for byte in byte_data)
-        # 提取前 34 位作为 key 和后 22 位作为 value
-        key_bin = full_bin[:34]
-        value_bin = full_bin[34:]
-        # 将二进制字符串转换为整数
-        key = int(key_bin, 2)
-        value = int(value_bin, 2)
-        return key, value
-
 class BinaryGeneratorUtils:
     @classmethod
-    def to_user_binary_data_from_dict(self, data_dict: dict) -> bytes:
-        '''从user的dict数据生成为存储的二进制数据'''
+    def to_user_binary_data_from_dict(self, data_dict: dict, sort_keys: bool = False) -> bytes:
+        '''从user的dict数据生成为存储的二进制数据
+
+        参数:
+            data_dict: {ship_id: battles_count}
+            sort_keys: 是否按ship_id排序写入，排序后的数据可以通过UserShipsView二分查找
+        '''
         if data_dict == {}:
-            return b'\x00\x00\x00\x00\x00\x00\x00'
-        # 存储合并后的二进制数据
-        result = bytearray()
+            return USER_EMPTY_DATA
+        items = []
         for key, value in data_dict.items():
             if type(key) == str:
                 key = int(key)
-            # 获取每个键值对的二进制数据并合并
-            result.extend(self.__to_user_binary_data(key, value))
-        # 返回合并后的二进制数据
-        return bytes(result)
+            # 确保 key 和 value 都在允许的范围内
+            if not (0 <= key < 2**34):
+                raise ValueError("key must be a non-negative integer less than 2^34.")
+            if not (0 <= value < 2**22):
+                raise ValueError("value must be a non-negative integer less than 2^22.")
+            items.append((key, value))
+        if sort_keys:
+            items.sort()
+        # 每个键值对拼接为 56 位整数后写入 7 字节
+        return b''.join([((key << 22) | value).to_bytes(7, 'big') for key, value in items])
     
     def to_clan_binary_data_from_list(data_list: list[int]) -> bytes:
         if data_list == []:
@@ -80,22 +79,72 @@ class BinaryGeneratorUtils:
             # 将数字转为5字节二进制数据（固定大小）
             binary_data.extend(number.to_bytes(5, byteorder='big'))
         return bytes(binary_data)
-    
-    def __to_user_binary_data(key, value) -> bytes:
-        # 确保 key 和 value 都在允许的范围内
-        if not (0 <= key < 2**34):
-            raise ValueError("key must be a non-negative integer less than 2^34.")
-        if not (0 <= value < 2**22):
-            raise ValueError("value must be a non-negative integer less than 2^22.")
-        # 将 key 和 value 转换为二进制字符串，确保它们有足够的位数
-        key_bin = f'{key:034b}'  # 34 位二进制，确保 key 为 34 位
-        value_bin = f'{value:022b}'  # 22 位二进制，确保 value 为 22 位
-        # 将二进制字符串拼接成一个 56 位的字符串
-        full_bin = key_bin + value_bin
-        # 将 56 位二进制字符串按 8 位分割，并转换为字节
-        byte_data = bytearray()
-        for i in range(0, len(full_bin), 8):
-            byte_data.append(int(full_bin[i:i+8], 2))  # 每 8 位转换为一个字节
-        # 返回字节数据，应该是 7 字节大小
-        return bytes(byte_data)
-    
\ No newline at end of file
+
+
+class UserShipsView(Mapping):
+    '''user二进制数据的只读映射
+
+    基于memoryview按需解析，不会预先构建dict，适合只需要少量ship_id或者数量的场景
+
+    数据按ship_id排序时使用二分查找，未排序的旧数据在查找不到时回退为顺序查找
+    '''
+    def __init__(self, binary_data: bytes):
+        if binary_data is None or binary_data == USER_EMPTY_DATA:
+            binary_data = b''
+        self.__data = memoryview(binary_data)
+        self.__size = len(binary_data) // 7
+        self.__sorted = None
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def __record(self, index: int) -> int:
+        return int.from_bytes(self.__data[index * 7:index * 7 + 7], 'big')
+
+    def __is_sorted(self) -> bool:
+        if self.__sorted is None:
+            records = [
+                (high << 48) | (middle << 32) | low
+                for high, middle, low in USER_RECORD.iter_unpack(self.__data[:self.__size * 7])
+            ]
+            # key位于高位，记录整体有序即key有序
+            self.__sorted = all(a < b for a, b in zip(records, records[1:]))
+        return self.__sorted
+
+    def __find(self, key: int) -> int:
+        "返回记录的位置，不存在时返回-1"
+        # 先按有序数据二分查找，找到即可直接返回
+        lo, hi = 0, self.__size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__record(mid) >> 22 < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.__size and self.__record(lo) >> 22 == key:
+            return lo
+        if self.__is_sorted():
+            return -1
+        # 旧数据可能没有排序，回退为顺序查找
+        for index in range(self.__size):
+            if self.__record(index) >> 22 == key:
+                return index
+        return -1
+
+    def __getitem__(self, key: int) -> int:
+        index = self.__find(int(key))
+        if index == -1:
+            raise KeyError(key)
+        return self.__record(index) & USER_VALUE_MASK
+
+    def __contains__(self, key) -> bool:
+        return self.__find(int(key)) != -1
+
+    def __iter__(self):
+        for index in range(self.__size):
+            yield self.__record(index) >> 22
+
+    def items(self):
+        for index in range(self.__size):
+            item = self.__record(index)
+            yield item >> 22, item & USER_VALUE_MASK
@@ -0,0 +1,37 @@
+from .aiodb import (
+    DatabaseConnection,
+    TimedCursor,
+    transaction,
+    execute,
+    executemany,
+    fetchone,
+    fetchall,
+    stream_rows
+)
+from .ship_storage import (
+    SHIP_CACHE_KEYS,
+    encode_user_ship_stats,
+    decode_user_ship_stats,
+    ShipStorage,
+    ShipTableStorage,
+    PartitionedShipStorage,
+    get_ship_storage
+)
+
+__all__ = [
+    'DatabaseConnection',
+    'TimedCursor',
+    'transaction',
+    'execute',
+    'executemany',
+    'fetchone',
+    'fetchall',
+    'stream_rows',
+    'SHIP_CACHE_KEYS',
+    'encode_user_ship_stats',
+    'decode_user_ship_stats',
+    'ShipStorage',
+    'ShipTableStorage',
+    'PartitionedShipStorage',
+    'get_ship_storage'
+]
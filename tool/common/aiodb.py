@@ -0,0 +1,293 @@
+import time
+import traceback
+from contextlib import asynccontextmanager
+
+import aiomysql
+
+
+class DatabaseConnection:
+    '''tool中各个更新进程共用的异步MySQL连接池
+
+    使用前通过configure传入当前进程的配置和日志，连接池在init_pool或第一次使用时创建
+
+    连接池只能在创建它的事件循环中使用，多进程模式下每个子进程需要独立创建
+    '''
+    _pool = None
+    _settings = None
+    _logger = None
+    # 查询耗时统计
+    _stats = {
+        'queries': 0,       # 执行的语句数量
+        'total_time': 0.0,  # 执行语句的总耗时(s)
+        'slow_queries': 0   # 耗时超过SLOW_QUERY_TIME的语句数量
+    }
+
+    @classmethod
+    def configure(cls, settings, logger) -> None:
+        "设置连接池使用的配置和日志"
+        cls._settings = settings
+        cls._logger = logger
+
+    @classmethod
+    async def init_pool(cls) -> None:
+        settings = cls._settings
+        try:
+            cls._pool = await aiomysql.create_pool(
+                minsize=1,
+                maxsize=settings.MYSQL_POOL_SIZE,  # 最大连接数
+                host=settings.MYSQL_HOST,
+                port=settings.MYSQL_PORT,
+                user=settings.MYSQL_USERNAME,
+                password=settings.MYSQL_PASSWORD,
+                charset='utf8mb4',
+                connect_timeout=10,
+                pool_recycle=3600,  # 设置连接的回收时间
+                autocommit=False    # 禁用隐式事务，事务通过transaction提交或者回滚
+            )
+            cls._logger.info(f'数据库连接成功')
+        except Exception:
+            cls._logger.error(f'数据库连接失败')
+            cls._logger.error(traceback.format_exc())
+
+    @classmethod
+    async def close_pool(cls) -> None:
+        if cls._pool:
+            cls._pool.close()
+            await cls._pool.wait_closed()
+            cls._pool = None
+            stats = cls.get_stats()
+            cls._logger.info(
+                f"数据库连接关闭, 执行语句 {stats['queries']} 次, 总耗时 {stats['total_time']} s, "
+                f"慢查询 {stats['slow_queries']} 次"
+            )
+
+    @classmethod
+    async def get_pool(cls):
+        if cls._pool:
+            return cls._pool
+        else:
+            cls._logger.info(f'数据库重新连接中')
+            await cls.init_pool()
+            return cls._pool
+
+    @classmethod
+    def record_query(cls, query: str, cost_time: float) -> None:
+        "记录单条语句的耗时，超过SLOW_QUERY_TIME时输出警告"
+        cls._stats['queries'] += 1
+        cls._stats['total_time'] += cost_time
+        if cost_time >= cls._settings.SLOW_QUERY_TIME:
+            cls._stats['slow_queries'] += 1
+            cls._logger.warning(f'慢查询 {round(cost_time, 3)} s | {" ".join(query.split())[:200]}')
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        "获取查询耗时的统计数据"
+        queries = cls._stats['queries']
+        return {
+            'queries': queries,
+            'total_time': round(cls._stats['total_time'], 3),
+            'avg_time': round(cls._stats['total_time'] / queries, 6) if queries else 0.0,
+            'slow_queries': cls._stats['slow_queries']
+        }
+
+
+class TimedCursor:
+    '''记录每条语句耗时的游标
+
+    接口和aiomysql的游标一致，只是所有方法都需要await
+    '''
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    @property
+    def rowcount(self) -> int:
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self) -> int:
+        return self.cursor.lastrowid
+
+    async def execute(self, query: str, args=None) -> int:
+        start_time = time.perf_counter()
+        try:
+            return await self.cursor.execute(query, args)
+        finally:
+            DatabaseConnection.record_query(query, time.perf_counter() - start_time)
+
+    async def executemany(self, query: str, args: list, batch_size: int = 1000) -> int:
+        '''批量执行同一条语句
+
+        INSERT ... VALUES 语句会被aiomysql合并为一条多行插入，按batch_size分批发送，避免单条语句超过max_allowed_packet
+
+        返回:
+            int 受影响的行数
+        '''
+        args = list(args)
+        rowcount = 0
+        for i in range(0, len(args), batch_size):
+            start_time = time.perf_counter()
+            try:
+                rowcount += await self.cursor.executemany(query, args[i: i + batch_size]) or 0
+            finally:
+                DatabaseConnection.record_query(query, time.perf_counter() - start_time)
+        return rowcount
+
+    async def fetchone(self):
+        return await self.cursor.fetchone()
+
+    async def fetchmany(self, size: int) -> list:
+        return await self.cursor.fetchmany(size)
+
+    async def fetchall(self) -> list:
+        return await self.cursor.fetchall()
+
+
+@asynccontextmanager
+async def transaction(cursor_class=aiomysql.DictCursor):
+    '''从连接池获取一条连接并开启事务
+
+    正常退出时提交，发生异常时回滚并继续抛出异常
+
+    用法:
+        async with transaction() as cur:
+            await cur.execute(...)
+            row = await cur.fetchone()
+
+    参数:
+        cursor_class: 游标类型，默认返回dict
+
+    返回:
+        TimedCursor
+    '''
+    pool = await DatabaseConnection.get_pool()
+    async with pool.acquire() as conn:
+        await conn.begin()
+        cur = await conn.cursor(cursor_class)
+        try:
+            yield TimedCursor(cur)
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+        finally:
+            await cur.close()
+
+
+async def execute(query: str, args=None) -> int:
+    "在单独的事务中执行一条语句"
+    async with transaction() as cur:
+        return await cur.execute(query, args)
+
+async def executemany(query: str, args: list, batch_size: int = 1000) -> int:
+    "在单独的事务中批量执行一条语句"
+    async with transaction() as cur:
+        return await cur.executemany(query, args, batch_size)
+
+async def fetchone(query: str, args=None):
+    "在单独的事务中查询一行数据"
+    async with transaction() as cur:
+        await cur.execute(query, args)
+        return await cur.fetchone()
+
+async def fetchall(query: str, args=None) -> list:
+    "在单独的事务中查询所有数据"
+    async with transaction() as cur:
+        await cur.execute(query, args)
+        return await cur.fetchall()
+
+
+def get_keyset_sql(select_sql: str, key_column: str, where: str = None) -> str:
+    "在查询语句后拼接过滤条件和按主键分页的条件"
+    conditions = [f'({where})'] if where else []
+    conditions.append(f'{key_column} > %s')
+    return f"{select_sql} WHERE {' AND '.join(conditions)} ORDER BY {key_column} LIMIT %s;"
+
+async def fetch_keyset_page(
+    select_sql: str,
+    key_column: str,
+    last_key,
+    limit: int,
+    where: str = None,
+    params: list = None
+) -> list:
+    '''按主键读取一页数据
+
+    整页读取到内存后立即释放连接，适用于处理每一行都比较耗时(例如需要请求接口)的调用方
+    '''
+    async with transaction() as cur:
+        await cur.execute(get_keyset_sql(select_sql, key_column, where), list(params or []) + [last_key, limit])
+        return await cur.fetchall()
+
+async def stream_keyset_page(
+    select_sql: str,
+    key_column: str,
+    last_key,
+    limit: int,
+    where: str = None,
+    params: list = None,
+    fetch_size: int = 1000
+):
+    '''按主键流式读取一页数据
+
+    使用无缓冲的服务端游标(SSDictCursor)，每次通过fetchmany读取fetch_size行，内存中最多只保留fetch_size行
+
+    读取过程中会一直占用连接，只适用于处理每一行都很快的调用方
+    '''
+    async with transaction(aiomysql.SSDictCursor) as cur:
+        await cur.execute(get_keyset_sql(select_sql, key_column, where), list(params or []) + [last_key, limit])
+        while True:
+            rows = await cur.fetchmany(fetch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+async def stream_rows(
+    select_sql: str,
+    key_column: str,
+    key_name: str,
+    where: str = None,
+    params: list = None,
+    limit: int = 1000,
+    fetch_size: int = 0
+):
+    '''按主键分页遍历整张表
+
+    通过 key > last_key ORDER BY key LIMIT n 分页，不受主键不连续的影响，
+    无论表有多大，内存中最多只保留一页的数据
+
+    参数:
+        select_sql: 不包含WHERE、排序和分页的查询语句
+        key_column: 分页使用的主键列，例如 b.id
+        key_name: 查询结果中主键的字段名
+        where: 额外的过滤条件，不包含WHERE关键字，例如 ship_id = %s
+        params: 过滤条件中的参数
+        limit: 每页读取的行数
+        fetch_size: 大于0时通过服务端游标流式读取每一页，每次读取fetch_size行；
+            为0时每一页整页读取后再返回，读取过程中不占用连接
+
+    返回:
+        异步生成器，逐行返回查询结果，读取失败时抛出异常
+    '''
+    last_key = 0
+    while True:
+        count = 0
+        try:
+            if fetch_size > 0:
+                async for row in stream_keyset_page(
+                    select_sql, key_column, last_key, limit, where, params, fetch_size
+                ):
+                    count += 1
+                    last_key = row[key_name]
+                    yield row
+            else:
+                rows = await fetch_keyset_page(select_sql, key_column, last_key, limit, where, params)
+                for row in rows:
+                    count += 1
+                    last_key = row[key_name]
+                    yield row
+        except Exception:
+            DatabaseConnection._logger.error(traceback.format_exc())
+            raise
+        if count < limit:
+            return
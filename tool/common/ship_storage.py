@@ -0,0 +1,360 @@
+# app/models/ship_storage.py和tool/common/ship_storage.py是同一份代码，app和tool分开部署，
+# 修改时需要同步两个文件，tests/test_ship_storage.py会检查两者是否一致
+import struct
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# ship表中每个用户的数据字段，和上游返回的details数据顺序一致
+SHIP_CACHE_KEYS = [
+    'battles_count', 'battle_type_1', 'battle_type_2', 'battle_type_3', 'wins', 'damage_dealt',
+    'frags', 'exp', 'survived', 'scouting_damage', 'art_agro', 'planes_killed', 'max_exp',
+    'max_damage_dealt', 'max_frags'
+]
+# 船只表中为BIGINT的字段，其余为INT
+SHIP_CACHE_BIGINT_KEYS = {'damage_dealt', 'exp', 'scouting_damage', 'art_agro'}
+
+# user_ship_stats中每个船只的记录: ship_id + 15个字段，小端定长整数，类型和船只表的列一致
+USER_SHIP_STATS_RECORD = struct.Struct(
+    '<q' + ''.join(['q' if key in SHIP_CACHE_BIGINT_KEYS else 'i' for key in SHIP_CACHE_KEYS])
+)
+USER_SHIP_STATS_DTYPE = np.dtype(
+    [('ship_id', '<i8')] +
+    [(key, '<i8' if key in SHIP_CACHE_BIGINT_KEYS else '<i4') for key in SHIP_CACHE_KEYS]
+)
+
+SHIP_CACHE_COLUMNS_SQL = '''
+        battles_count    INT          NOT NULL,
+        battle_type_1    INT          NOT NULL,
+        battle_type_2    INT          NOT NULL,
+        battle_type_3    INT          NOT NULL,
+        wins             INT          NOT NULL,
+        damage_dealt     BIGINT       NOT NULL,
+        frags            INT          NOT NULL,
+        exp              BIGINT       NOT NULL,
+        survived         INT          NOT NULL,
+        scouting_damage  BIGINT       NOT NULL,
+        art_agro         BIGINT       NOT NULL,
+        planes_killed    INT          NOT NULL,
+        max_exp          INT          NOT NULL,
+        max_damage_dealt INT          NOT NULL,
+        max_frags        INT          NOT NULL,
+        created_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,'''
+
+
+def get_upsert_sql(table: str, key_columns: list) -> str:
+    "通过唯一索引判断插入或者更新的写入语句，executemany时会被合并为一条多行的INSERT"
+    columns = key_columns + SHIP_CACHE_KEYS
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON DUPLICATE KEY UPDATE {', '.join([f'{key} = VALUES({key})' for key in SHIP_CACHE_KEYS])};"
+    )
+
+
+def encode_user_ship_stats(ship_dict: dict) -> bytes:
+    '''将用户所有船只的数据转换为user_ship_stats中的二进制数据
+
+    参数:
+        ship_dict: {ship_id: [15个字段]}
+
+    返回:
+        bytes 按ship_id排序的定长记录
+    '''
+    items = sorted([(int(ship_id), values) for ship_id, values in ship_dict.items()])
+    return b''.join([USER_SHIP_STATS_RECORD.pack(ship_id, *values) for ship_id, values in items])
+
+def decode_user_ship_stats(binary_data: bytes) -> tuple:
+    '''解析user_ship_stats中的二进制数据
+
+    直接按USER_SHIP_STATS_DTYPE读取整个buffer，不会逐条解析
+
+    返回:
+        (ship_ids, stats)
+        ship_ids: int64数组，按ship_id排序，可以通过np.searchsorted查找
+        stats: int64数组，shape为(船只数量, 15)，列顺序和SHIP_CACHE_KEYS一致
+    '''
+    if not binary_data:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(SHIP_CACHE_KEYS)), dtype=np.int64)
+    records = np.frombuffer(binary_data, dtype=USER_SHIP_STATS_DTYPE)
+    stats = np.empty((len(records), len(SHIP_CACHE_KEYS)), dtype=np.int64)
+    for index, key in enumerate(SHIP_CACHE_KEYS):
+        stats[:, index] = records[key]
+    return records['ship_id'].astype(np.int64), stats
+
+
+class ShipStorage(ABC):
+    '''船只缓存数据的存储方式
+
+    ShipsCacheModel以及tool中的user_cache、user_status只通过这里生成的语句读写船只数据，
+    不需要知道数据保存在哪张表中
+
+    参数:
+        db_name: 船只缓存数据所在的数据库
+    '''
+    name = None
+    # 每个用户一行的船只数据，两种存储方式共用
+    USER_TABLE_NAME = 'user_ship_stats'
+
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+
+    def get_user_schema_sql(self) -> str:
+        "user_ship_stats表的建表语句，可以重复执行，启动时执行，已有的部署不需要手动建表"
+        return f'''CREATE TABLE IF NOT EXISTS {self.db_name}.{self.USER_TABLE_NAME} (
+        account_id       BIGINT       NOT NULL,
+        region_id        TINYINT      NOT NULL,
+        ships_count      SMALLINT     NOT NULL,
+        stats_data       MEDIUMBLOB   NOT NULL,
+        created_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (region_id, account_id)
+    );'''
+
+    @abstractmethod
+    def get_provision_sql(self, ship_id: int) -> list:
+        "写入新船只的数据之前需要执行的建表语句，可以重复执行"
+
+    def get_write_batches(self, ship_data_list: list) -> list:
+        '''将多个用户的船只数据转换为批量写入，船只表和user_ship_stats在同一个事务中写入
+
+        参数:
+            ship_data_list: [{'account_id', 'region_id', 'ship_dict', 'delete_ship_list', 'ships_stats'}]
+                ship_dict: 新增或者变化的船只数据 {ship_id: [...]}
+                delete_ship_list: 用户已经没有的船只 [ship_id]
+                ships_stats: 用户所有船只的数据 {ship_id: [...]}，不存在时不更新user_ship_stats
+
+        返回:
+            [(sql, rows)]，每一项通过一次executemany写入，行按索引顺序排列，多个写入同时执行时加锁顺序一致
+        '''
+        return (
+            self.get_ship_delete_batches(ship_data_list) + 
+            self.get_ship_upsert_batches(ship_data_list) + 
+            self.get_user_upsert_batches(ship_data_list)
+        )
+
+    @abstractmethod
+    def get_ship_upsert_batches(self, ship_data_list: list) -> list:
+        "船只表的批量写入"
+
+    @abstractmethod
+    def get_ship_delete_batches(self, ship_data_list: list) -> list:
+        "船只表的批量删除"
+
+    def get_user_upsert_batches(self, ship_data_list: list) -> list:
+        "user_ship_stats的批量写入，每个用户一行"
+        rows = []
+        for ship_data in ship_data_list:
+            if ship_data.get('ships_stats') is None:
+                continue
+            rows.append([
+                ship_data['account_id'],
+                ship_data['region_id'],
+                len(ship_data['ships_stats']),
+                encode_user_ship_stats(ship_data['ships_stats'])
+            ])
+        if not rows:
+            return []
+        rows.sort(key=lambda row: (row[1], row[0]))
+        return [(
+            f"INSERT INTO {self.db_name}.{self.USER_TABLE_NAME} (account_id, region_id, ships_count, stats_data) "
+            "VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE ships_count = VALUES(ships_count), stats_data = VALUES(stats_data);",
+            rows
+        )]
+
+    def get_user_stats_sql(self, account_id: int, region_id: int) -> tuple:
+        "通过主键读取单个用户所有船只数据的语句，返回(sql, params)"
+        return (
+            f"SELECT ships_count, stats_data FROM {self.db_name}.{self.USER_TABLE_NAME} "
+            "WHERE region_id = %s AND account_id = %s;",
+            [region_id, account_id]
+        )
+
+    @abstractmethod
+    def get_region_total_sql(self, ship_id: int, keys: list) -> tuple:
+        "按服务器汇总船只数据的语句，返回(sql, params)"
+
+    @abstractmethod
+    def get_leader_sql(self, ship_id: int, keys: list, battles_limit: int) -> tuple:
+        "读取场次达到要求的用户数据的语句，顺序和get_stream_queries一致，返回(sql, params)"
+
+    @abstractmethod
+    def get_stream_queries(self, ship_id: int, keys: list) -> list:
+        "按主键分页遍历船只所有用户数据的查询，返回[(select_sql, key_column, key_name, where, params)]"
+
+    def iter_ship_rows(self, ship_data_list: list):
+        "逐行返回(ship_id, account_id, region_id, values)"
+        for ship_data in ship_data_list:
+            if not ship_data.get('ship_dict'):
+                continue
+            account_id = ship_data['account_id']
+            region_id = ship_data['region_id']
+            for ship_id, values in ship_data['ship_dict'].items():
+                yield int(ship_id), account_id, region_id, list(values)
+
+    def iter_delete_rows(self, ship_data_list: list):
+        "逐行返回需要删除的(ship_id, account_id, region_id)"
+        for ship_data in ship_data_list:
+            if not ship_data.get('delete_ship_list'):
+                continue
+            for ship_id in ship_data['delete_ship_list']:
+                yield int(ship_id), ship_data['account_id'], ship_data['region_id']
+
+
+class ShipTableStorage(ShipStorage):
+    '''每个船只一张ship_{id}表
+
+    按id顺序遍历，(region_id, account_id)唯一索引
+    '''
+    name = 'tables'
+
+    def get_table_name(self, ship_id: int) -> str:
+        return f'{self.db_name}.ship_{int(ship_id)}'
+
+    def get_provision_sql(self, ship_id: int) -> list:
+        return [
+            f'''CREATE TABLE IF NOT EXISTS {self.get_table_name(ship_id)} (
+        id               INT          AUTO_INCREMENT,
+        account_id       BIGINT       NOT NULL,
+        region_id        TINYINT      NOT NULL,{SHIP_CACHE_COLUMNS_SQL}
+        PRIMARY KEY (id),
+        UNIQUE INDEX idx_sid_rid_aid (region_id, account_id)
+    );'''
+        ]
+
+    def get_ship_upsert_batches(self, ship_data_list: list) -> list:
+        ship_rows = {}
+        for ship_id, account_id, region_id, values in self.iter_ship_rows(ship_data_list):
+            if ship_id not in ship_rows:
+                ship_rows[ship_id] = []
+            ship_rows[ship_id].append([account_id, region_id] + values)
+        return [
+            (
+                get_upsert_sql(self.get_table_name(ship_id), ['account_id', 'region_id']),
+                sorted(ship_rows[ship_id], key=lambda row: (row[1], row[0]))
+            )
+            for ship_id in sorted(ship_rows)
+        ]
+
+    def get_ship_delete_batches(self, ship_data_list: list) -> list:
+        ship_rows = {}
+        for ship_id, account_id, region_id in self.iter_delete_rows(ship_data_list):
+            if ship_id not in ship_rows:
+                ship_rows[ship_id] = []
+            ship_rows[ship_id].append([region_id, account_id])
+        return [
+            (
+                f"DELETE FROM {self.get_table_name(ship_id)} WHERE region_id = %s AND account_id = %s;",
+                sorted(ship_rows[ship_id])
+            )
+            for ship_id in sorted(ship_rows)
+        ]
+
+    def get_region_total_sql(self, ship_id: int, keys: list) -> tuple:
+        sum_sql = ', '.join([f'SUM({key}) AS {key}' for key in keys])
+        return (
+            f"SELECT region_id, COUNT(*) AS user_count, {sum_sql} "
+            f"FROM {self.get_table_name(ship_id)} GROUP BY region_id;",
+            []
+        )
+
+    def get_leader_sql(self, ship_id: int, keys: list, battles_limit: int) -> tuple:
+        return (
+            f"SELECT {', '.join(keys)} FROM {self.get_table_name(ship_id)} "
+            "WHERE battles_count >= %s ORDER BY id;",
+            [battles_limit]
+        )
+
+    def get_stream_queries(self, ship_id: int, keys: list) -> list:
+        return [
+            (f"SELECT id, {', '.join(keys)} FROM {self.get_table_name(ship_id)}", 'id', 'id', None, [])
+        ]
+
+
+class PartitionedShipStorage(ShipStorage):
+    '''所有船只的数据保存在同一张ship_stats表中
+
+    主键为(ship_id, region_id, account_id)，按ship_id分区，单个船只的查询只会读取一个分区，
+    跨船只的查询(例如某个用户的所有船只)通过(region_id, account_id)索引一次完成
+
+    ship_id的低位大多相同，HASH分区会集中在少数分区中，所以使用KEY分区
+    '''
+    name = 'partitioned'
+    TABLE_NAME = 'ship_stats'
+    PARTITIONS = 64
+
+    def get_table_name(self, ship_id: int = None) -> str:
+        return f'{self.db_name}.{self.TABLE_NAME}'
+
+    def get_schema_sql(self) -> str:
+        "ship_stats表的建表语句，由迁移工具执行"
+        return f'''CREATE TABLE IF NOT EXISTS {self.get_table_name()} (
+        ship_id          BIGINT       NOT NULL,
+        account_id       BIGINT       NOT NULL,
+        region_id        TINYINT      NOT NULL,{SHIP_CACHE_COLUMNS_SQL}
+        PRIMARY KEY (ship_id, region_id, account_id),
+        INDEX idx_rid_aid (region_id, account_id)
+    ) PARTITION BY KEY (ship_id) PARTITIONS {self.PARTITIONS};'''
+
+    def get_provision_sql(self, ship_id: int) -> list:
+        # 新船只不需要建表
+        return []
+
+    def get_ship_upsert_batches(self, ship_data_list: list) -> list:
+        rows = [
+            [ship_id, account_id, region_id] + values
+            for ship_id, account_id, region_id, values in self.iter_ship_rows(ship_data_list)
+        ]
+        if not rows:
+            return []
+        rows.sort(key=lambda row: (row[0], row[2], row[1]))
+        return [(get_upsert_sql(self.get_table_name(), ['ship_id', 'account_id', 'region_id']), rows)]
+
+    def get_ship_delete_batches(self, ship_data_list: list) -> list:
+        rows = sorted([
+            [ship_id, region_id, account_id]
+            for ship_id, account_id, region_id in self.iter_delete_rows(ship_data_list)
+        ])
+        if not rows:
+            return []
+        return [(
+            f"DELETE FROM {self.get_table_name()} WHERE ship_id = %s AND region_id = %s AND account_id = %s;",
+            rows
+        )]
+
+    def get_region_total_sql(self, ship_id: int, keys: list) -> tuple:
+        sum_sql = ', '.join([f'SUM({key}) AS {key}' for key in keys])
+        return (
+            f"SELECT region_id, COUNT(*) AS user_count, {sum_sql} "
+            f"FROM {self.get_table_name()} WHERE ship_id = %s GROUP BY region_id;",
+            [int(ship_id)]
+        )
+
+    def get_leader_sql(self, ship_id: int, keys: list, battles_limit: int) -> tuple:
+        return (
+            f"SELECT {', '.join(keys)} FROM {self.get_table_name()} "
+            "WHERE ship_id = %s AND battles_count >= %s ORDER BY region_id, account_id;",
+            [int(ship_id), battles_limit]
+        )
+
+    def get_stream_queries(self, ship_id: int, keys: list) -> list:
+        # 每个服务器按主键(ship_id, region_id, account_id)的顺序分页
+        select_sql = f"SELECT {', '.join(keys)} FROM {self.get_table_name()}"
+        return [
+            (select_sql, 'account_id', 'account_id', 'ship_id = %s AND region_id = %s', [int(ship_id), region_id])
+            for region_id in [1, 2, 3, 4, 5]
+        ]
+
+
+SHIP_STORAGES = {
+    ShipTableStorage.name: ShipTableStorage,
+    PartitionedShipStorage.name: PartitionedShipStorage
+}
+
+def get_ship_storage(name: str, db_name: str) -> ShipStorage:
+    "根据配置获取船只数据的存储方式"
+    if name not in SHIP_STORAGES:
+        raise ValueError(f'Unknown ship storage: {name}')
+    return SHIP_STORAGES[name](db_name)
@@ -1,32 +1,73 @@
 import os
-import time
+import re
 import sqlite3
 from sqlite3 import Connection
-from datetime import datetime, timezone, timedelta
 
 import brotli
 
-from config import MASTER_DB_PATH, REGION_UTC_LIST
-from network import Network
+from config import MASTER_DB_PATH
 
+# recent数据表的名称，date为YYYYMMDD
+TABLE_NAME_PATTERN = re.compile(r'^day_\d{8}$')
 
-class Recent_DB:
-    def get_recent_db_path(account_id: int,region_id: int) -> str:
-        "获取db文件path"
-        return os.path.join(MASTER_DB_PATH, f'{region_id}', f'{account_id}.db')
 
-    def get_db_connection(db_path: str) -> Connection:
-        "获取数据库连接"
-        connection = sqlite3.connect(db_path)
-        return connection
-    
-    @classmethod
-    def create_user_db(self, db_path: str):
-        "创建数据库"
-        conn: Connection = self.get_db_connection(db_path)
-        cursor = conn.cursor()
-        table_create_query = f'''
-        CREATE TABLE user_info (
+class RecentSession:
+    '''单个用户recent数据库的会话
+
+    一次更新中只打开一次数据库，所有读写在同一个事务中完成，正常退出时提交，发生异常时回滚
+
+    数据库使用WAL模式，写入时不会阻塞读取，synchronous=NORMAL在WAL模式下只在checkpoint时fsync
+
+    用法:
+        with Recent_DB.session(db_path) as recent_db:
+            rows = recent_db.get_user_info()
+            recent_db.insert_database(...)
+    '''
+    PRAGMAS = [
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA temp_store = MEMORY',
+        'PRAGMA busy_timeout = 5000'
+    ]
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn: Connection = None
+
+    def __enter__(self):
+        # isolation_level=None关闭sqlite3模块的隐式事务，事务由BEGIN/COMMIT控制
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            for pragma in self.PRAGMAS:
+                self.conn.execute(pragma)
+            self.conn.execute('BEGIN')
+            self.create_user_db()
+        except BaseException:
+            self.conn.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        try:
+            if exc_type is None:
+                self.conn.execute('COMMIT')
+            else:
+                self.conn.execute('ROLLBACK')
+        finally:
+            self.conn.close()
+            self.conn = None
+        return False
+
+    def get_table_name(self, table_name: str) -> str:
+        "表名无法作为参数传入，只允许day_YYYYMMDD格式的表名"
+        if not TABLE_NAME_PATTERN.match(str(table_name)):
+            raise ValueError(f'Invalid table name: {table_name}')
+        return table_name
+
+    def create_user_db(self):
+        "创建user_info表，表已经存在时不做任何操作"
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_info (
             date str PRIMARY KEY,
             valid bool,
             update_time int,
@@ -34,130 +75,46 @@ class Recent_DB:
             karma int,
             table_name str
         );
-        '''
-        cursor.execute(table_create_query)
-        conn.commit()
-        cursor.close()
-        conn.close()
+        ''')
 
-    @classmethod
-    def get_user_info(self,db_path: str):
+    def get_user_info(self) -> list:
         "获取user_info表中的数据"
-        conn: Connection = self.get_db_connection(db_path)
-        cursor = conn.cursor()
-        query = f"SELECT date, table_name FROM user_info"
-        cursor.execute(query)
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return data
+        return self.conn.execute("SELECT date, table_name FROM user_info").fetchall()
 
-    @classmethod
-    def get_user_info_by_date(self, db_path: str, date: str):
+    def get_user_info_by_date(self, date: str):
         "获取user_info表中的数据"
-        conn: Connection = self.get_db_connection(db_path)
-        cursor = conn.cursor()
-        query = f"SELECT * FROM user_info WHERE date = '{date}'"
-        cursor.execute(query)
-        data = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return data
-    
-    @classmethod
-    def delete_date_and_table(
-        self,
-        db_path: str,
-        del_date_list: list = None,
-        del_table_list: list = None
-    ):
-        "删除数据"
-        conn: Connection = self.get_db_connection(db_path)
-        cursor = conn.cursor()
-        del_num = 0
-        for del_date in del_date_list:
-            query = f"DELETE FROM user_info WHERE date = '{del_date}'"
-            cursor.execute(query)
-            del_num += 1
-        for del_table in del_table_list:
-            query = f"DROP TABLE {del_table}"
-            cursor.execute(query)
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return del_num
-    
-    @classmethod
-    def copy_user_info(self, db_path: str, date_1: str, date_2: str):
-        conn: Connection = self.get_db_connection(db_path)
-        cursor = conn.cursor()
-        query = f"SELECT * FROM user_info WHERE date = '{date_2}'"
-        cursor.execute(query)
-        data = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        if data is None:
-            return False
-        else:
-            self.insert_database(
-                db_path=db_path,
-                date=date_1,
-                valid=data[1],
-                update_time=data[2],
-                level_point=data[3],
-                karma=data[4],
-                battles_count=None,
-                table_name=data[5],
-                ship_info_data=None
-            )
-            return True
-        
+        return self.conn.execute("SELECT * FROM user_info WHERE date = ?", [date]).fetchone()
 
-    def get_user_start_date(self,account_id: int,region_id: int):
-        db_path = self.get_recent_db_path(account_id,region_id)
-        if os.path.exists(db_path) == False:
-            return (0,'-')
-        rows = self.get_user_info(db_path)
-        if rows == []:
-            return (0,'-')
-        min_date = 0
-        date_num = 0
-        for row in rows:
-            if min_date == 0:
-                min_date = row[0]
-            else:
-                if min_date < row[0]:
-                    pass
-                else:
-                    min_date = row[0]
-            date_num += 1
-        return (date_num,str(min_date))
+    def delete_date_and_table(self, del_date_list: list = None, del_table_list: list = None) -> int:
+        "删除数据"
+        del_date_list = del_date_list or []
+        self.conn.executemany("DELETE FROM user_info WHERE date = ?", [[del_date] for del_date in del_date_list])
+        for del_table in del_table_list or []:
+            if del_table is None:
+                # 隐藏战绩的日期没有数据表
+                continue
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.get_table_name(del_table)}")
+        return len(del_date_list)
 
-    def check_database_exists(self,db_path:str,date_1:str,date_2:str):
-        date_1_data = None
-        data = None
-        if os.path.exists(db_path) is False:
-            return None
-        conn: Connection = self.get_recent_db_path(db_path)
-        cursor = conn.cursor()
-        query = f"SELECT * FROM user_info"
-        cursor.execute(query)
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
+    def copy_user_info(self, date_1: str, date_2: str) -> bool:
+        "将date_2的user_info复制为date_1，两者使用同一个数据表"
+        data = self.get_user_info_by_date(date_2)
         if data is None:
-            return None
-        for index in data:
-            if str(index[0]) == date_1:
-                date_1_data = index
-            if str(index[0]) == date_2:
-                data = index
-        return [date_1_data,data]
+            return False
+        self.insert_database(
+            date=date_1,
+            valid=data[1],
+            update_time=data[2],
+            level_point=data[3],
+            karma=data[4],
+            battles_count=None,
+            table_name=data[5],
+            ship_info_data=None
+        )
+        return True
 
-    @classmethod
     def insert_database(
         self,
-        db_path: str,
         date: str,
         valid: bool,
         update_time: int,
@@ -167,52 +124,69 @@ class Recent_DB:
         battles_count: dict,
         ship_info_data: dict
     ):
-        conn: Connection = self.get_db_connection(db_path)
-        cursor = conn.cursor()
-        insert_data = (date,valid,update_time,level_point,karma,table_name)
-        insert_or_replace_query = f'''
-        INSERT OR REPLACE INTO user_info (
-            date,
-            valid,
-            update_time,
-            leveling_points,
-            karma,
-            table_name
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?
-        )'''
-        cursor.execute(insert_or_replace_query, insert_data)
-        conn.commit()
+        self.conn.execute(
+            '''
+            INSERT OR REPLACE INTO user_info (
+                date,
+                valid,
+                update_time,
+                leveling_points,
+                karma,
+                table_name
+            ) VALUES (
+                ?, ?, ?, ?, ?, ?
+            )''',
+            [date, valid, update_time, level_point, karma, table_name]
+        )
         if ship_info_data != None:
-            table_create_query = f'''
+            table_name = self.get_table_name(table_name)
+            self.conn.execute(f'''
             CREATE TABLE IF NOT EXISTS {table_name} (
                 ship_id str PRIMARY KEY,
                 battles_count int,
                 ship_data bytes
             );
-            '''
-            cursor.execute(table_create_query)
-            conn.commit()
-            table_delete_query = f'''
-            DELETE FROM {table_name}
-            '''
-            cursor.execute(table_delete_query)
-            conn.commit()
-            for ship_id,ship_data in ship_info_data.items():
-                insert_data = (
-                    ship_id,
-                    battles_count[ship_id],
-                    brotli.compress(bytes(str(ship_data), encoding='utf-8')) if ship_data != {} else None
-                )
-                insert_or_replace_query = f'''
-                INSERT OR REPLACE INTO day_{date} (
-                    ship_id,
-                    battles_count,
-                    ship_data
-                ) VALUES (
-                    ?, ?, ?
-                )'''
-                cursor.execute(insert_or_replace_query, insert_data)
-            conn.commit()
-        cursor.close()
-        conn.close()
\ No newline at end of file
+            ''')
+            self.conn.execute(f"DELETE FROM {table_name}")
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {table_name} (ship_id, battles_count, ship_data) VALUES (?, ?, ?)",
+                [
+                    [
+                        ship_id,
+                        battles_count[ship_id],
+                        brotli.compress(bytes(str(ship_data), encoding='utf-8')) if ship_data != {} else None
+                    ]
+                    for ship_id, ship_data in ship_info_data.items()
+                ]
+            )
+
+
+class Recent_DB:
+    def get_recent_db_path(account_id: int,region_id: int) -> str:
+        "获取db文件path"
+        return os.path.join(MASTER_DB_PATH, f'{region_id}', f'{account_id}.db')
+
+    def session(db_path: str) -> RecentSession:
+        "打开用户的recent数据库，数据库不存在时自动创建"
+        return RecentSession(db_path)
+
+    @classmethod
+    def get_user_start_date(self,account_id: int,region_id: int):
+        db_path = self.get_recent_db_path(account_id,region_id)
+        if os.path.exists(db_path) == False:
+            return (0,'-')
+        with self.session(db_path) as recent_db:
+            rows = recent_db.get_user_info()
+        if rows == []:
+            return (0,'-')
+        min_date = min([row[0] for row in rows])
+        return (len(rows),str(min_date))
+
+    @classmethod
+    def check_database_exists(self,db_path:str,date_1:str,date_2:str):
+        if os.path.exists(db_path) is False:
+            return None
+        with self.session(db_path) as recent_db:
+            date_1_data = recent_db.get_user_info_by_date(date_1)
+            date_2_data = recent_db.get_user_info_by_date(date_2)
+        return [date_1_data,date_2_data]
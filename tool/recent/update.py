@@ -160,53 +160,54 @@ class Update:
             new_user = True
         recent_db_path = Recent_DB.get_recent_db_path(account_id,region_id)
         if os.path.exists(recent_db_path) == False:
-            Recent_DB.create_user_db(recent_db_path)
             new_user = True
         # 用于搜索recent数据库的主键
         time_zone = REGION_UTC_LIST[region_id]
         date_1 = time.strftime("%Y%m%d", time.gmtime(current_timestamp + time_zone * 3600))
         date_2 = time.strftime("%Y%m%d", time.gmtime(current_timestamp + time_zone * 3600 - 24*60*60))
         date_3 = time.strftime("%Y%m%d", time.gmtime(current_timestamp + time_zone * 3600 - user_recent_result['recent_class']*24*60*60))
+        # 数据库只在读取/清理和写入时打开，网络请求期间不持有事务
+        # 第一阶段: 读取并清理过期数据
+        with Recent_DB.session(recent_db_path) as recent_db:
+            # 从数据库中读取数据
+            user_info_data = recent_db.get_user_info()
+            if user_info_data == None or user_info_data == []:
+                new_user = True
+            else:
+                # 检查存储的数据是否超过允许的储存的上限
+                # 如果超过则删除超过部分的数据
+                if len(user_info_data) > user_recent_result['recent_class'] + 1:
+                    del_table_set = set()
+                    del_date_set = set()
+                    # 获取需要删除date下的table_name
+                    for user_info in user_info_data:
+                        if int(user_info[0]) < int(date_3):
+                            del_table_set.add(user_info[1])
+                            del_date_set.add(user_info[0])
+                    # 检查table_name是否在其他date中需要
+                    for user_info in user_info_data:
+                        if int(user_info[0]) >= int(date_3) and user_info[1] in del_table_set:
+                                del_table_set.discard(user_info[1])
+                    # 删除date和table
+                    del_date_number = recent_db.delete_date_and_table(list(del_date_set), list(del_table_set))
+                    logger.debug(f'{region_id} - {account_id} | ├── 删除 {del_date_number} 天数据')
+            # 判断是否是同一天，反之copy昨天的数据
+            # 主要是确保每天都有数据，即使没有更新
+            date_1_data = 0
+            date_2_data = 0
+            for user_info in user_info_data:
+                if user_info[0] == int(date_1):
+                    date_1_data = 1
+                if user_info[0] == int(date_2):
+                    date_2_data = 1
+            if not date_1_data and date_2_data:
+                if recent_db.copy_user_info(date_1,date_2):
+                    logger.debug(f'{region_id} - {account_id} | ├── 用户跨日数据复制')
+                    return
+            elif not date_1_data and not date_2_data:
+                new_user = True
+            user_db_info = recent_db.get_user_info_by_date(date_1)
 
-        # 从数据库中读取数据
-        user_db_path = Recent_DB.get_recent_db_path(account_id,region_id)
-        user_info_data = Recent_DB.get_user_info(user_db_path)
-        if user_info_data == None or user_info_data == []:
-            new_user = True
-        else:
-            # 检查存储的数据是否超过允许的储存的上限
-            # 如果超过则删除超过部分的数据
-            if len(user_info_data) > user_recent_result['recent_class'] + 1:
-                del_table_set = set()
-                del_date_set = set()
-                # 获取需要删除date下的table_name
-                for user_info in user_info_data:
-                    if int(user_info[0]) < int(date_3):
-                        del_table_set.add(user_info[1])
-                        del_date_set.add(user_info[0])
-                # 检查table_name是否在其他date中需要
-                for user_info in user_info_data:
-                    if int(user_info[0]) >= int(date_3) and user_info[1] in del_table_set:
-                            del_table_set.discard(user_info[1])
-                # 删除date和table
-                del_date_number = Recent_DB.delete_date_and_table(user_db_path, list(del_date_set), list(del_table_set))
-                logger.debug(f'{region_id} - {account_id} | ├── 删除 {del_date_number} 天数据')
-        # 判断是否是同一天，反之copy昨天的数据
-        # 主要是确保每天都有数据，即使没有更新
-        date_1_data = 0
-        date_2_data = 0
-        for user_info in user_info_data:
-            if user_info[0] == int(date_1):
-                date_1_data = 1
-            if user_info[0] == int(date_2):
-                date_2_data = 1
-        if not date_1_data and date_2_data:
-            if Recent_DB.copy_user_info(recent_db_path,date_1,date_2):
-                logger.debug(f'{region_id} - {account_id} | ├── 用户跨日数据复制')
-                return
-        elif not date_1_data and not date_2_data:
-            new_user = True
-        
         user_update_time = user_info_result['update_time']
         user_active_level = user_info_result['active_level']
         update_interval_seconds = self.get_update_interval_time(region_id,user_active_level)
@@ -218,14 +219,13 @@ class Update:
             # 请求并更新usr_info
             logger.debug(f'{region_id} - {account_id} | ├── 用户数据需要更新')
         else:
-            user_db_info = Recent_DB.get_user_info_by_date(recent_db_path,date_1)
             if not user_db_info or user_info_result['total_battles'] != user_db_info[3]:
                 # 请求并更新user_info
                 logger.debug(f'{region_id} - {account_id} | ├── 用户数据需要更新')
             else:
                 logger.debug(f'{region_id} - {account_id} | ├── 用户不需要更新')
                 return
-        # 更新用户数据库
+        # 第二阶段: 请求上游数据，不打开数据库
         user_basic = {
             'account_id': account_id,
             'region_id': region_id,
@@ -241,9 +241,6 @@ class Update:
             'total_battles': 0,
             'last_battle_time': 0
         }
-        current_timestamp = int(time.time())
-        date_1 = time.strftime("%Y%m%d", time.gmtime(current_timestamp + time_zone * 3600))
-        date_2 = time.strftime("%Y%m%d", time.gmtime(current_timestamp + time_zone * 3600 - 24*60*60))
         basic_data = await Network.get_basic_data(account_id,region_id,ac_value)
         for response in basic_data:
             if response['code'] != 1000 and response['code'] != 1001:
@@ -266,17 +263,18 @@ class Update:
             # 隐藏战绩
             user_info['is_public'] = 0
             user_info['active_level'] = self.get_active_level(user_info)
-            Recent_DB.insert_database(
-                db_path=recent_db_path,
-                date=date_1,
-                valid=True,
-                update_time=int(time.time()),
-                level_point=0,
-                karma=0,
-                battles_count=None,
-                table_name=None,
-                ship_info_data=None
-            )
+            current_timestamp = int(time.time())
+            with Recent_DB.session(recent_db_path) as recent_db:
+                recent_db.insert_database(
+                    date=date_1,
+                    valid=True,
+                    update_time=current_timestamp,
+                    level_point=0,
+                    karma=0,
+                    battles_count=None,
+                    table_name=None,
+                    ship_info_data=None
+                )
             logger.debug(f'{region_id} - {account_id} | ├── Recent数据写入成功')
             user_recent = {
                 'account_id': account_id,
@@ -307,62 +305,63 @@ class Update:
         user_info['total_battles'] = user_basic_data['basic']['leveling_points']
         user_info['last_battle_time'] = user_basic_data['basic']['last_battle_time']
         user_info['active_level'] = self.get_active_level(user_info)
-        await self.update_user_data(account_id,region_id,user_basic,user_info,None)
         if not new_user:
-            user_db_info = Recent_DB.get_user_info_by_date(recent_db_path,date_1)
-            if not user_db_info and user_info['total_battles'] == user_db_info[3]:
+            if user_db_info and user_info['total_battles'] == user_db_info[3]:
                 logger.debug(f'{region_id} - {account_id} | ├── 未有数据，暂不需要更新')
+                await self.update_user_data(account_id,region_id,user_basic,user_info,None)
                 return
         user_details_data = await Network.get_recent_data(account_id,region_id,ac_value)
         if user_details_data.get('code', None) != 1000:
+            await self.update_user_data(account_id,region_id,user_basic,user_info,None)
             return
         details_data = user_details_data['data']
         current_timestamp = int(time.time())
+        # 第三阶段: 写入数据，提交之后再上传更新数据
+        with Recent_DB.session(recent_db_path) as recent_db:
+            if new_user:
+                recent_db.insert_database(
+                    date=date_2,
+                    valid=False,
+                    update_time=current_timestamp,
+                    level_point=user_basic_data['basic']['leveling_points'],
+                    karma=user_basic_data['basic']['karma'],
+                    battles_count=details_data['battles_count'],
+                    table_name=f'day_{date_2}',
+                    ship_info_data=details_data['ships']
+                )
+                recent_db.insert_database(
+                    date=date_1,
+                    valid=False,
+                    update_time=current_timestamp,
+                    level_point=user_basic_data['basic']['leveling_points'],
+                    karma=user_basic_data['basic']['karma'],
+                    battles_count=details_data['battles_count'],
+                    table_name=f'day_{date_2}',
+                    ship_info_data=None
+                )
+            else:
+                recent_db.insert_database(
+                    date=date_1,
+                    valid=False,
+                    update_time=current_timestamp,
+                    level_point=user_basic_data['basic']['leveling_points'],
+                    karma=user_basic_data['basic']['karma'],
+                    battles_count=details_data['battles_count'],
+                    table_name=f'day_{date_1}',
+                    ship_info_data=details_data['ships']
+                )
         if new_user:
-            Recent_DB.insert_database(
-                db_path=recent_db_path,
-                date=date_2,
-                valid=False,
-                update_time=current_timestamp,
-                level_point=user_basic_data['basic']['leveling_points'],
-                karma=user_basic_data['basic']['karma'],
-                battles_count=details_data['battles_count'],
-                table_name=f'day_{date_2}',
-                ship_info_data=details_data['ships']
-            )
-            Recent_DB.insert_database(
-                db_path=recent_db_path,
-                date=date_1,
-                valid=False,
-                update_time=current_timestamp,
-                level_point=user_basic_data['basic']['leveling_points'],
-                karma=user_basic_data['basic']['karma'],
-                battles_count=details_data['battles_count'],
-                table_name=f'day_{date_2}',
-                ship_info_data=None
-            )
             logger.debug(f'{region_id} - {account_id} | ├── 新用户Recent数据写入成功')
         else:
-            Recent_DB.insert_database(
-                db_path=recent_db_path,
-                date=date_1,
-                valid=False,
-                update_time=current_timestamp,
-                level_point=user_basic_data['basic']['leveling_points'],
-                karma=user_basic_data['basic']['karma'],
-                battles_count=details_data['battles_count'],
-                table_name=f'day_{date_1}',
-                ship_info_data=details_data['ships']
-            )
             logger.debug(f'{region_id} - {account_id} | ├── Recent数据写入成功')
         user_recent = {
             'account_id': account_id,
             'region_id': region_id,
             'last_update_time': current_timestamp
         }
-        await self.update_user_data(account_id,region_id,None,None,user_recent)
+        await self.update_user_data(account_id,region_id,user_basic,user_info,user_recent)
         return
-    
+
     async def update_user_data(
         account_id: int, 
         region_id: int, 
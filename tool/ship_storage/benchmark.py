@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''对比ship_{id}表和ship_stats表的查询耗时，只执行读取
+
+测试的查询:
+    region_total: 单个船只按服务器汇总(user_status)
+    leader: 单个船只场次达到要求的用户数据(user_status)
+    user_ships: 单个用户的所有船只数据(ShipsCacheModel)，另外测试从user_ship_stats读取
+
+用法:
+    python benchmark.py --ships 20 --users 20
+'''
+import asyncio
+import argparse
+import statistics
+
+from log import log as logger
+from db import DatabaseConnection, SHIP_CACHE_KEYS
+from model import (
+    TABLE_STORAGE,
+    PARTITIONED_STORAGE,
+    get_ship_list,
+    get_sample_users,
+    time_query
+)
+
+LEADER_KEYS = ['account_id', 'region_id'] + SHIP_CACHE_KEYS[:8]
+LEADER_BATTLES_LIMIT = 80
+
+
+def get_user_ships_sql(storage, ship_list: list, region_id: int, account_id: int) -> list:
+    "读取用户所有船只数据需要执行的语句"
+    if storage is PARTITIONED_STORAGE:
+        # 通过(region_id, account_id)索引一次读取
+        return [(
+            f"SELECT ship_id, {', '.join(SHIP_CACHE_KEYS)} FROM {storage.get_table_name()} "
+            "WHERE region_id = %s AND account_id = %s;",
+            [region_id, account_id]
+        )]
+    return [
+        (
+            f"SELECT {', '.join(SHIP_CACHE_KEYS)} FROM {storage.get_table_name(ship_id)} "
+            "WHERE region_id = %s AND account_id = %s;",
+            [region_id, account_id]
+        )
+        for ship_id in ship_list
+    ]
+
+async def run_queries(queries: list) -> float:
+    "依次执行多条语句，返回总耗时(s)"
+    total_time = 0.0
+    for sql, params in queries:
+        result = await time_query(sql, params)
+        if result.get('code', None) != 1000:
+            raise RuntimeError('查询失败')
+        total_time += result['data'][0]
+    return total_time
+
+def log_result(name: str, storage_name: str, cost_times: list) -> None:
+    cost_times = [cost_time * 1000 for cost_time in cost_times]
+    logger.info(
+        f'{name:<12} | {storage_name:<11} | 次数 {len(cost_times)}, '
+        f'平均 {round(statistics.mean(cost_times), 2)} ms, '
+        f'中位数 {round(statistics.median(cost_times), 2)} ms, '
+        f'最大 {round(max(cost_times), 2)} ms'
+    )
+
+async def main(ships_count: int, users_count: int):
+    await DatabaseConnection.init_pool()
+    try:
+        result = await get_ship_list()
+        if result.get('code', None) != 1000 or not result['data']:
+            logger.error('获取船只列表失败')
+            return
+        ship_list = result['data']
+        # 均匀选取测试的船只
+        step = max(1, len(ship_list) // ships_count)
+        sample_ships = ship_list[::step][:ships_count]
+        result = await get_sample_users(sample_ships[0], users_count)
+        if result.get('code', None) != 1000:
+            logger.error('获取测试用户失败')
+            return
+        sample_users = result['data']
+        for storage in [TABLE_STORAGE, PARTITIONED_STORAGE]:
+            region_total_times = []
+            leader_times = []
+            for ship_id in sample_ships:
+                region_total_times.append(await run_queries(
+                    [storage.get_region_total_sql(ship_id, SHIP_CACHE_KEYS)]
+                ))
+                leader_times.append(await run_queries(
+                    [storage.get_leader_sql(ship_id, LEADER_KEYS, LEADER_BATTLES_LIMIT)]
+                ))
+            user_ships_times = []
+            for region_id, account_id in sample_users:
+                user_ships_times.append(await run_queries(
+                    get_user_ships_sql(storage, ship_list, region_id, account_id)
+                ))
+            log_result('region_total', storage.name, region_total_times)
+            log_result('leader', storage.name, leader_times)
+            if user_ships_times:
+                log_result('user_ships', storage.name, user_ships_times)
+        # user_ship_stats每个用户一行，和存储方式无关
+        user_stats_times = []
+        for region_id, account_id in sample_users:
+            user_stats_times.append(await run_queries(
+                [TABLE_STORAGE.get_user_stats_sql(account_id, region_id)]
+            ))
+        if user_stats_times:
+            log_result('user_ships', TABLE_STORAGE.USER_TABLE_NAME, user_stats_times)
+    finally:
+        await DatabaseConnection.close_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='对比两种船只数据存储方式的查询耗时')
+    parser.add_argument('--ships', type=int, default=20, help='测试的船只数量')
+    parser.add_argument('--users', type=int, default=20, help='测试的用户数量')
+    args = parser.parse_args()
+    asyncio.run(main(args.ships, args.users))
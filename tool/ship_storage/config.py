@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+from pydantic_settings import BaseSettings
+
+class LoadConfig(BaseSettings):
+    LOG_PATH: str
+
+    MYSQL_HOST: str
+    MYSQL_PORT: int
+    MYSQL_USERNAME: str
+    MYSQL_PASSWORD: str
+    MYSQL_POOL_SIZE: int = 4            # 连接池的最大连接数
+    SLOW_QUERY_TIME: float = 1.0        # 超过该耗时(s)的语句会记录为慢查询
+
+    DB_NAME_SHIP: str
+
+    # 迁移时每次复制的行数(按ship_{id}表的id范围)
+    MIGRATE_BATCH_SIZE: int = 50000
+
+    class Config:
+        env_file = ".env"
+        extra = 'allow'
+
+settings = LoadConfig()
@@ -0,0 +1,22 @@
+import os
+import sys
+
+# 各个更新进程共用tool/common中的数据库模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from log import log as logger
+from common import (
+    DatabaseConnection,
+    transaction,
+    execute,
+    executemany,
+    fetchone,
+    fetchall,
+    stream_rows,
+    SHIP_CACHE_KEYS,
+    ShipTableStorage,
+    PartitionedShipStorage
+)
+
+DatabaseConnection.configure(settings, logger)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''将ship_{id}表中的数据迁移到分区的ship_stats表
+
+迁移完成后对比两种存储方式中每个船只按服务器汇总的用户数量和场次，
+全部一致后再将SHIP_STORAGE修改为partitioned
+
+用法:
+    python main.py              迁移所有船只并校验
+    python main.py --verify     只校验
+'''
+import time
+import asyncio
+import argparse
+
+from log import log as logger
+from db import DatabaseConnection
+from model import (
+    TABLE_STORAGE,
+    PARTITIONED_STORAGE,
+    get_ship_list,
+    create_partitioned_table,
+    copy_ship_table,
+    get_region_total
+)
+
+
+async def migrate(ship_list: list) -> bool:
+    result = await create_partitioned_table()
+    if result.get('code', None) != 1000:
+        logger.error('ship_stats或user_ship_stats表创建失败')
+        return False
+    for ship_id in ship_list:
+        start_time = time.time()
+        result = await copy_ship_table(ship_id)
+        if result.get('code', None) != 1000:
+            logger.error(f'{ship_id} | 数据复制失败')
+            return False
+        logger.info(f"{ship_id} | 复制 {result['data']} 行, 耗时 {round(time.time() - start_time, 2)} s")
+    return True
+
+async def verify(ship_list: list) -> bool:
+    mismatch = []
+    for ship_id in ship_list:
+        table_result = await get_region_total(TABLE_STORAGE, ship_id)
+        partitioned_result = await get_region_total(PARTITIONED_STORAGE, ship_id)
+        if table_result.get('code', None) != 1000 or partitioned_result.get('code', None) != 1000:
+            logger.error(f'{ship_id} | 数据读取失败')
+            return False
+        if table_result['data'] != partitioned_result['data']:
+            logger.warning(f"{ship_id} | 数据不一致 {table_result['data']} != {partitioned_result['data']}")
+            mismatch.append(ship_id)
+    logger.info(f'校验完成, 船只 {len(ship_list)} 个, 不一致 {len(mismatch)} 个')
+    return mismatch == []
+
+async def main(only_verify: bool):
+    await DatabaseConnection.init_pool()
+    try:
+        result = await get_ship_list()
+        if result.get('code', None) != 1000:
+            logger.error('获取船只列表失败')
+            return
+        ship_list = result['data']
+        logger.info(f'共 {len(ship_list)} 个船只')
+        if not only_verify and not await migrate(ship_list):
+            return
+        await verify(ship_list)
+    finally:
+        await DatabaseConnection.close_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='迁移船只数据到ship_stats表')
+    parser.add_argument('--verify', action='store_true', help='只校验两种存储方式的数据是否一致')
+    args = parser.parse_args()
+    logger.info('开始运行ShipStorage迁移进程')
+    try:
+        asyncio.run(main(args.verify))
+    except KeyboardInterrupt:
+        logger.info('收到进程关闭信号')
+    logger.info('ShipStorage迁移进程已停止')
@@ -0,0 +1,125 @@
+import time
+import traceback
+import aiomysql
+from db import transaction, SHIP_CACHE_KEYS, ShipTableStorage, PartitionedShipStorage
+
+from config import settings
+from log import log as logger
+
+CACHE_DB = settings.DB_NAME_SHIP
+
+TABLE_STORAGE = ShipTableStorage(CACHE_DB)
+PARTITIONED_STORAGE = PartitionedShipStorage(CACHE_DB)
+
+
+async def get_ship_list():
+    """获取存在的船只id列表"""
+    try:
+        async with transaction() as cur:
+            await cur.execute(
+                f"SELECT ship_id FROM {CACHE_DB}.existing_ships ORDER BY ship_id;"
+            )
+            rows = await cur.fetchall()
+            data = [row['ship_id'] for row in rows]
+        return {'status': 'ok','code': 1000,'message': 'Success','data': data}
+    except Exception:
+        logger.error(traceback.format_exc())
+        return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
+
+async def create_partitioned_table():
+    """创建ship_stats表以及两种存储方式共用的user_ship_stats表，表已经存在时不做任何操作"""
+    try:
+        async with transaction() as cur:
+            await cur.execute(PARTITIONED_STORAGE.get_schema_sql())
+            await cur.execute(PARTITIONED_STORAGE.get_user_schema_sql())
+        return {'status': 'ok','code': 1000,'message': 'Success','data': None}
+    except Exception:
+        logger.error(traceback.format_exc())
+        return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
+
+async def copy_ship_table(ship_id: int, batch_size: int = settings.MIGRATE_BATCH_SIZE):
+    """将ship_{id}表中的数据复制到ship_stats表
+
+    数据在服务器内通过INSERT ... SELECT复制，按id范围分批，每批一个事务，可以重复执行
+
+    返回:
+        data: 复制的行数
+    """
+    try:
+        source_table = TABLE_STORAGE.get_table_name(ship_id)
+        async with transaction() as cur:
+            await cur.execute(f"SELECT MAX(id) AS max_id FROM {source_table};")
+            row = await cur.fetchone()
+        max_id = row['max_id'] or 0
+        columns = ['account_id', 'region_id'] + SHIP_CACHE_KEYS
+        update_sql = ', '.join([f'{key} = VALUES({key})' for key in SHIP_CACHE_KEYS])
+        copy_sql = (
+            f"INSERT INTO {PARTITIONED_STORAGE.get_table_name()} (ship_id, {', '.join(columns)}) "
+            f"SELECT %s, {', '.join(columns)} FROM {source_table} WHERE id > %s AND id <= %s "
+            f"ON DUPLICATE KEY UPDATE {update_sql};"
+        )
+        rows_count = 0
+        for start_id in range(0, max_id, batch_size):
+            async with transaction() as cur:
+                await cur.execute(copy_sql, [ship_id, start_id, start_id + batch_size])
+                # 更新已有行时rowcount为2，这里只用于日志
+                rows_count += cur.rowcount
+        return {'status': 'ok','code': 1000,'message': 'Success','data': rows_count}
+    except Exception:
+        logger.error(traceback.format_exc())
+        return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
+
+async def get_region_total(storage, ship_id: int):
+    """获取船只在某种存储方式下按服务器汇总的用户数量和场次
+
+    返回:
+        data: {region_id: [user_count, battles_count]}
+    """
+    try:
+        async with transaction() as cur:
+            await cur.execute(*storage.get_region_total_sql(ship_id, ['battles_count']))
+            rows = await cur.fetchall()
+        data = {}
+        for row in rows:
+            data[row['region_id']] = [int(row['user_count']), int(row['battles_count'] or 0)]
+        return {'status': 'ok','code': 1000,'message': 'Success','data': data}
+    except Exception:
+        logger.error(traceback.format_exc())
+        return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
+
+async def time_query(sql: str, params: list = None):
+    """执行一条只读语句并返回耗时
+
+    返回:
+        data: [耗时(s), 行数]
+    """
+    try:
+        async with transaction(aiomysql.Cursor) as cur:
+            start_time = time.perf_counter()
+            await cur.execute(sql, params)
+            rows = await cur.fetchall()
+            cost_time = time.perf_counter() - start_time
+        return {'status': 'ok','code': 1000,'message': 'Success','data': [cost_time, len(rows)]}
+    except Exception:
+        logger.error(traceback.format_exc())
+        return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
+
+async def get_sample_users(ship_id: int, limit: int):
+    """从某个船只的数据中读取用户，用于测试查询用户的所有船只
+
+    返回:
+        data: [[region_id, account_id]]
+    """
+    try:
+        async with transaction() as cur:
+            await cur.execute(
+                f"SELECT region_id, account_id FROM {TABLE_STORAGE.get_table_name(ship_id)} "
+                "ORDER BY battles_count DESC LIMIT %s;",
+                [limit]
+            )
+            rows = await cur.fetchall()
+        data = [[row['region_id'], row['account_id']] for row in rows]
+        return {'status': 'ok','code': 1000,'message': 'Success','data': data}
+    except Exception:
+        logger.error(traceback.format_exc())
+        return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
@@ -9,15 +9,27 @@ class LoadConfig(BaseSettings):
     MYSQL_PORT: int
     MYSQL_USERNAME: str
     MYSQL_PASSWORD: str
+    MYSQL_POOL_SIZE: int = 4            # 连接池的最大连接数
+    SLOW_QUERY_TIME: float = 1.0        # 超过该耗时(s)的语句会记录为慢查询
 
     DB_NAME_MAIN: str
     DB_NAME_BOT: str
     DB_NAME_SHIP: str
+    # 船只缓存数据的存储方式
+    # tables: 每个船只一张ship_{id}表
+    # partitioned: 所有船只保存在按ship_id分区的ship_stats表中
+    SHIP_STORAGE: str = 'tables'
     
     RABBITMQ_HOST: str
     RABBITMQ_USERNAME: str
     RABBITMQ_PASSWORD: str
 
+    # 并发更新的配置
+    UPDATE_WORKERS: int = 16            # 同时更新的用户数量
+    REGION_CONCURRENCY: int = 8         # 每个服务器同时更新的用户数量
+    REQUESTS_PER_SECOND: float = 20     # 所有服务器每秒的上游请求数量，0表示不限制
+    WRITE_BATCH_SIZE: int = 100         # 数据库每批写入的用户数量
+
     class Config:
         env_file = ".env"
         extra = 'allow'
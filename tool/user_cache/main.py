@@ -5,9 +5,9 @@ import time
 import asyncio
 from log import log as logger
 
-from update import Update
 from db import DatabaseConnection
-from model import get_user_max_number, get_user_cache_batch, get_user_token
+from pipeline import UpdatePipeline
+from model import get_user_token, provision_user_ship_stats
 
 class ContinuousUserCacheUpdater:
     def __init__(self):
@@ -17,32 +17,11 @@ class ContinuousUserCacheUpdater:
         start_time = int(time.time())
         # 更新用户
         limit = 1000
-        token_result = get_user_token()
+        token_result = await get_user_token()
         if token_result['code'] != 1000:
-            logger.error(f"获取UserToken时发生错误，Error: {request_result.get('message')}")
-        request_result = get_user_max_number()
-        if request_result['code'] != 1000:
-            logger.error(f"获取MaxUserID时发生错误，Error: {request_result.get('message')}")
+            logger.error(f"获取UserToken时发生错误，Error: {token_result.get('message')}")
         else:
-            max_id = request_result['data']['max_id']
-            max_offset = (int(max_id / limit) + 1) * limit
-            offset = 0
-            while offset <= max_offset:
-                users_result = get_user_cache_batch(offset, limit)
-                if users_result['code'] == 1000:
-                    i = 1
-                    for user in users_result['data']:
-                        account_id = user['user_basic']['account_id']
-                        region_id = user['user_basic']['region_id']
-                        if (str(region_id)+str(account_id)) in token_result['data']:
-                            user['user_basic']['ac_value'] = token_result['data'][str(region_id)+str(account_id)]
-                        logger.info(f'{region_id} - {account_id} | ------------------[ {offset + i} / {max_id} ]')
-                        await Update.main(user)
-                        # await asyncio.sleep(1)
-                        i += 1
-                else:
-                    logger.error(f"获取CacheUsers时发生错误，Error: {users_result.get('message')}")
-                offset += limit
+            await UpdatePipeline().run(token_result['data'], limit)
         end_time = int(time.time())
         # 避免测试时候的循环bug
         if end_time - start_time <= 4*60*60-10:
@@ -60,6 +39,14 @@ class ContinuousUserCacheUpdater:
         self.stop_event.set()  # 设置停止事件
 
 async def main():
+    # 连接池需要在事件循环中创建
+    await DatabaseConnection.init_pool()
+    # 已有的部署中可能还没有user_ship_stats表
+    result = await provision_user_ship_stats()
+    if result.get('code', None) != 1000:
+        logger.error('user_ship_stats表创建失败')
+        await DatabaseConnection.close_pool()
+        return
     updater = ContinuousUserCacheUpdater()
 
     # 创建并启动异步更新任务
@@ -68,17 +55,17 @@ async def main():
         await update_task
     except asyncio.CancelledError:
         updater.stop()
+    finally:
+        # 退出并释放资源
+        await DatabaseConnection.close_pool()
 
 if __name__ == "__main__":
     logger.info('开始运行UserCache更新进程')
-    DatabaseConnection.init_pool()
     # 开始不间断更新
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info('收到进程关闭信号')
-    # 退出并释放资源
-    DatabaseConnection.close_pool()
     wait_second = 3
     while wait_second > 0:
         logger.info(f'进程将在 {wait_second} s后关闭')
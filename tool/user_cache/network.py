@@ -13,7 +13,13 @@ VORTEX_API_URL_LIST = {
 }
 
 class Network:
-    async def fetch_data(url, method: str = 'get', data: Optional[dict] = None):
+    # 全局请求速率限制，需要实现 async acquire()，None表示不限制
+    limiter = None
+
+    @classmethod
+    async def fetch_data(self, url, method: str = 'get', data: Optional[dict] = None):
+        if self.limiter is not None:
+            await self.limiter.acquire()
         async with httpx.AsyncClient() as client:
             try:
                 if method == 'get':
@@ -0,0 +1,133 @@
+import time
+import asyncio
+
+from log import log as logger
+from config import settings
+from update import Update
+from network import Network
+from model import stream_user_cache
+
+
+class RateLimiter:
+    '''令牌桶限速，所有worker共享
+
+    rate: 每秒产生的令牌数量
+    burst: 令牌桶的容量
+    '''
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class UpdatePipeline:
+    '''用户缓存的并发更新流程
+
+    producer: 从数据库流式读取需要检查的用户
+    worker: N个协程并发请求上游数据并判断需要更新的内容，每个服务器有独立的并发上限
+    writer: 将worker产生的数据库写入按批次异步执行，和网络请求同时进行
+
+    上游请求通过全局令牌桶限速，达到上限前吞吐量随并发数量增加
+    '''
+    def __init__(
+        self,
+        workers: int = settings.UPDATE_WORKERS,
+        region_concurrency: int = settings.REGION_CONCURRENCY,
+        requests_per_second: float = settings.REQUESTS_PER_SECOND,
+        write_batch_size: int = settings.WRITE_BATCH_SIZE
+    ):
+        self.workers = workers
+        self.write_batch_size = write_batch_size
+        self.region_semaphores = {
+            region_id: asyncio.Semaphore(region_concurrency) for region_id in [1, 2, 3, 4, 5]
+        }
+        self.limiter = RateLimiter(requests_per_second) if requests_per_second > 0 else None
+        self.user_queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        self.write_queue: asyncio.Queue = asyncio.Queue(maxsize=write_batch_size * 2)
+        self.stats = {'read': 0, 'updated': 0, 'written': 0}
+
+    async def producer(self, tokens: dict, limit: int) -> None:
+        try:
+            async for user in stream_user_cache(limit):
+                key = str(user['user_basic']['region_id']) + str(user['user_basic']['account_id'])
+                if key in tokens:
+                    user['user_basic']['ac_value'] = tokens[key]
+                await self.user_queue.put(user)
+                self.stats['read'] += 1
+        except Exception:
+            logger.error(f'获取CacheUsers时发生错误')
+        finally:
+            for _ in range(self.workers):
+                await self.user_queue.put(None)
+
+    async def worker(self) -> None:
+        while True:
+            user = await self.user_queue.get()
+            if user is None:
+                return
+            region_id = user['user_basic']['region_id']
+            async with self.region_semaphores[region_id]:
+                writes = await Update.main(user)
+            self.stats['updated'] += 1
+            if writes:
+                await self.write_queue.put(writes)
+
+    async def writer(self) -> None:
+        batch = []
+        while True:
+            writes = await self.write_queue.get()
+            if writes is not None:
+                batch.append(writes)
+            if batch and (writes is None or len(batch) >= self.write_batch_size or self.write_queue.empty()):
+                await self.apply_batch(batch)
+                self.stats['written'] += len(batch)
+                batch = []
+            if writes is None:
+                return
+
+    @staticmethod
+    async def apply_batch(batch: list) -> None:
+        "执行一批用户的写入，所有用户的船只数据最后在一个事务中批量写入"
+        ship_batch = []
+        for writes in batch:
+            await Update.apply_writes(writes, ship_batch)
+        if ship_batch:
+            await Update.write_ship_batch(ship_batch)
+
+    async def run(self, tokens: dict, limit: int = 1000) -> dict:
+        '''执行一次完整的更新
+
+        返回:
+            dict 读取、更新和写入的用户数量
+        '''
+        start_time = time.time()
+        Network.limiter = self.limiter
+        try:
+            writer_task = asyncio.create_task(self.writer())
+            await asyncio.gather(
+                self.producer(tokens, limit),
+                *[self.worker() for _ in range(self.workers)]
+            )
+            await self.write_queue.put(None)
+            await writer_task
+        finally:
+            Network.limiter = None
+        cost_time = time.time() - start_time
+        logger.info(
+            f"更新完成, 读取 {self.stats['read']} 更新 {self.stats['updated']} 写入 {self.stats['written']}, "
+            f"耗时: {round(cost_time,2)} s, {round(self.stats['updated'] / cost_time, 2) if cost_time else 0} 用户/s"
+        )
+        return self.stats
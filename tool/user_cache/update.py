@@ -1,38 +1,69 @@
 import time
-import hashlib
 import traceback
 
 from log import log as logger
 from network import Network
+from utils import UserShipsDiff
 from model import (
     check_user_basic, 
     check_user_info, 
     get_user_cache, 
     check_existing_ship, 
-    update_user_ship, 
+    update_user_ship_batch, 
     update_user_ships
 )
 
 class Update:
     @classmethod
-    async def main(self, user_data: dict):
+    async def main(self, user_data: dict) -> list:
         '''UserCache更新入口函数
+
+        只请求上游数据并判断需要更新的内容，数据库写入通过apply_writes执行
+
+        返回:
+            list 需要执行的数据库写入 [(func, account_id, region_id, data)]
         '''
         start_time = time.time()
+        writes = []
         try:
             account_id = user_data['user_basic']['account_id']
             region_id = user_data['user_basic']['region_id']
             logger.debug(f'{region_id} - {account_id} | ┌── 开始用户更新流程')
-            await self.service_master(self, user_data)
+            await self.service_master(self, user_data, writes)
         except:
             error = traceback.format_exc()
             logger.error(f'{region_id} - {account_id} | ├── 数据更新时发生错误')
             logger.error(f'Error: {error}')
+            writes = []
         finally:
             cost_time = time.time() - start_time
             logger.debug(f'{region_id} - {account_id} | └── 本次更新完成, 耗时: {round(cost_time,2)} s')
+        return writes
+
+    async def apply_writes(writes: list, ship_batch: list) -> None:
+        '''按顺序执行一个用户的数据库写入
+
+        需要写入船只表的数据不会立即写入，而是添加到ship_batch中，由调用方通过write_ship_batch批量写入
+        '''
+        for func, account_id, region_id, data in writes:
+            try:
+                ship_data = await func(account_id, region_id, data)
+                if ship_data:
+                    ship_batch.append(ship_data)
+            except:
+                logger.error(f'{region_id} - {account_id} | ├── 数据库写入时发生错误')
+                logger.error(f'Error: {traceback.format_exc()}')
+                return
 
-    async def service_master(self, user_data: dict):
+    async def write_ship_batch(ship_batch: list) -> None:
+        "在一个事务中写入多个用户的船只数据"
+        result = await update_user_ship_batch(ship_batch)
+        if result.get('code', None) != 1000:
+            logger.error(f"{len(ship_batch)} 个用户的船只数据更新失败，Error: {result.get('code')} {result.get('message')}")
+            return
+        logger.debug(f"{len(ship_batch)} 个用户的船只数据更新完成, 写入 {result['data']} 行")
+
+    async def service_master(self, user_data: dict, writes: list):
         # 用于更新user_cache的数据
         account_id = user_data['user_basic']['account_id']
         region_id = user_data['user_basic']['region_id']
@@ -79,8 +110,8 @@ class Update:
         if basic_data[0]['code'] == 1001:
             # 用户数据不存在
             user_info['is_active'] = 0
-            self.update_user_info(account_id, region_id, user_info)
-            self.update_user_cache(account_id, region_id, user_cache)
+            writes.append((self.update_user_info, account_id, region_id, user_info))
+            writes.append((self.update_user_cache, account_id, region_id, user_cache))
             return
         else:
             user_basic['nickname'] = basic_data[0]['data'][str(account_id)]['name']
@@ -88,9 +119,9 @@ class Update:
                 # 隐藏战绩
                 user_info['is_public'] = 0
                 user_info['active_level'] = self.get_active_level(user_info)
-                self.update_user_basic(account_id, region_id, user_basic)
-                self.update_user_info(account_id, region_id, user_info)
-                self.update_user_cache(account_id, region_id, user_cache)
+                writes.append((self.update_user_basic, account_id, region_id, user_basic))
+                writes.append((self.update_user_info, account_id, region_id, user_info))
+                writes.append((self.update_user_cache, account_id, region_id, user_cache))
                 return
             user_basic_data = basic_data[0]['data'][str(account_id)]['statistics']
             if (
@@ -99,18 +130,18 @@ class Update:
             ):
                 # 用户没有数据
                 user_info['is_active'] = 0
-                self.update_user_basic(account_id, region_id, user_basic)
-                self.update_user_info(account_id, region_id, user_info)
-                self.update_user_cache(account_id, region_id, user_cache)
+                writes.append((self.update_user_basic, account_id, region_id, user_basic))
+                writes.append((self.update_user_info, account_id, region_id, user_info))
+                writes.append((self.update_user_cache, account_id, region_id, user_cache))
                 return
             if user_basic_data['basic']['leveling_points'] == 0:
                 # 用户没有数据
                 user_info['total_battles'] = 0
                 user_info['last_battle_time'] = 0
                 user_info['active_level'] = self.get_active_level(user_info)
-                self.update_user_basic(account_id, region_id, user_basic)
-                self.update_user_info(account_id, region_id, user_info)
-                self.update_user_cache(account_id, region_id, user_cache)
+                writes.append((self.update_user_basic, account_id, region_id, user_basic))
+                writes.append((self.update_user_info, account_id, region_id, user_info))
+                writes.append((self.update_user_cache, account_id, region_id, user_cache))
                 return
             # 获取user_info的数据并更新数据库
             user_info['total_battles'] = user_basic_data['basic']['leveling_points']
@@ -118,93 +149,91 @@ class Update:
             user_info['active_level'] = self.get_active_level(user_info)
         if user_data['user_ships']['battles_count'] == user_info['total_battles']:
             user_cache['battles_count'] = user_info['total_battles']
-            self.update_user_basic(account_id, region_id, user_basic)
-            self.update_user_info(account_id, region_id, user_info)
-            self.update_user_cache(account_id, region_id, user_cache)
+            writes.append((self.update_user_basic, account_id, region_id, user_basic))
+            writes.append((self.update_user_info, account_id, region_id, user_info))
+            writes.append((self.update_user_cache, account_id, region_id, user_cache))
             logger.debug(f'{region_id} - {account_id} | ├── 未有更新数据，跳过更新')
             return
         user_ships_data = await Network.get_cache_data(account_id,region_id,ac_value)
         if user_ships_data.get('code', None) != 1000:
             return
         new_user_data = user_ships_data['data']
-        sorted_dict = dict(sorted(new_user_data['basic'].items()))
-        new_hash_value = hashlib.sha256(str(sorted_dict).encode('utf-8')).hexdigest()
+        new_hash_value = UserShipsDiff.get_hash_value(new_user_data['basic'])
         if user_data['user_ships']['hash_value'] == new_hash_value:
             logger.debug(f'{region_id} - {account_id} | ├── 未有更新数据，跳过更新')
             user_cache['battles_count'] = user_info['total_battles']
-            self.update_user_basic(account_id, region_id, user_basic)
-            self.update_user_info(account_id, region_id, user_info)
-            self.update_user_cache(account_id, region_id, user_cache)
+            writes.append((self.update_user_basic, account_id, region_id, user_basic))
+            writes.append((self.update_user_info, account_id, region_id, user_info))
+            writes.append((self.update_user_cache, account_id, region_id, user_cache))
             return
         else:
             user_cache['battles_count'] = user_info['total_battles']
             user_cache['hash_value'] = new_hash_value
-            user_cache['ships_data'] = sorted_dict
+            user_cache['ships_data'] = new_user_data['basic']
             user_cache['details_data'] = new_user_data['details']
-            self.update_user_basic(account_id, region_id, user_basic)
-            self.update_user_info(account_id, region_id, user_info)
-            self.update_user_cache(account_id, region_id, user_cache)
+            writes.append((self.update_user_basic, account_id, region_id, user_basic))
+            writes.append((self.update_user_info, account_id, region_id, user_info))
+            writes.append((self.update_user_cache, account_id, region_id, user_cache))
             return
 
-    def update_user_basic(account_id: int, region_id: int, user_data: dict):
+    async def update_user_basic(account_id: int, region_id: int, user_data: dict):
         # 更新user_basic表的信息
-        result = check_user_basic(user_data)
+        result = await check_user_basic(user_data)
         if result.get('code', None) != 1000:
             logger.error(f"{region_id} - {account_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
             return
         logger.debug(f"{region_id} - {account_id} | ├── 用户basic数据更新完成")
         return
 
-    def update_user_info(account_id: int, region_id: int, user_data: dict):
+    async def update_user_info(account_id: int, region_id: int, user_data: dict):
         # 更新user_info表信息
-        result = check_user_info(user_data)
+        result = await check_user_info(user_data)
         if result.get('code', None) != 1000:
             logger.error(f"{region_id} - {account_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
             return
         logger.debug(f"{region_id} - {account_id} | ├── 用户info数据更新完成")
         return
     
-    def update_user_cache(account_id: int, region_id: int, user_data: dict):
-        user_cache_result = get_user_cache(account_id, region_id)
+    async def update_user_cache(account_id: int, region_id: int, user_data: dict):
+        "更新user_ships表，哈希值变化时返回需要和user_ships一起写入的船只数据"
+        user_cache_result = await get_user_cache(account_id, region_id)
         if user_cache_result.get('code', None) != 1000:
             logger.error(f"{region_id} - {account_id} | ├── 获取用户缓存数据失败，Error: {user_cache_result.get('code')} {user_cache_result.get('message')}")
             return
-        ship_id_set = set()
-        delete_ship_list = []
-        replace_ship_dict = {}
         ship_data = None
         if 'hash_value' in user_data:
-            for ship_id, ship_battles in user_data['ships_data'].items():
-                if (
-                    int(ship_id) not in user_cache_result['data']['ships_data'] or 
-                    ship_battles != user_cache_result['data']['ships_data']
-                ):
-                    replace_ship_dict[int(ship_id)] = user_data['details_data'][ship_id]
-                    ship_id_set.add(int(ship_id))
-            data = {
+            # 只有新增、场次变化和已经不存在的船只需要写入船只表
+            added, changed, removed = UserShipsDiff.get_delta(
+                user_cache_result['data']['ships_data'], user_data['ships_data']
+            )
+            details_data = user_data['details_data']
+            replace_ship_dict = {ship_id: details_data[ship_id] for ship_id in added + changed}
+            check_ship_id_result = await check_existing_ship(set(added + changed + removed))
+            if check_ship_id_result.get('code', None) != 1000:
+                logger.error(f"{region_id} - {account_id} | ├── 船只表检查失败，Error: {check_ship_id_result.get('code')} {check_ship_id_result.get('message')}")
+                return
+            logger.debug(
+                f"{region_id} - {account_id} | ├── 船只数据变化 新增 {len(added)} 更新 {len(changed)} 删除 {len(removed)}"
+            )
+            # 哈希值变化时user_ship_stats始终更新
+            # 新的哈希值和船只数据由write_ship_batch和船只数据在同一个事务中写入，
+            # 船只数据写入失败时哈希值保持不变，下次更新会重新写入这些差异
+            del user_data['details_data']
+            ship_data = {
                 'account_id': account_id,
                 'region_id': region_id,
-                'ship_dict': replace_ship_dict
+                'ship_dict': replace_ship_dict,
+                'delete_ship_list': removed,
+                'ships_stats': details_data,
+                'user_ships': user_data
             }
-            check_ship_id_result = check_existing_ship(ship_id_set)
-            if check_ship_id_result.get('code', None) != 1000:
-                return check_ship_id_result
-            if delete_ship_list != [] or replace_ship_dict != {}:
-                ship_data = data
-            del user_data['details_data']
-        if user_data:
-            result = update_user_ships(user_data)
+        else:
+            result = await update_user_ships(user_data)
             if result.get('code', None) != 1000:
                 logger.error(f"{region_id} - {account_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
                 return
             logger.debug(f"{region_id} - {account_id} | ├── 用户ships数据更新完成")
-        if ship_data:
-            result = update_user_ship(ship_data)
-            if result.get('code', None) != 1000:
-                logger.error(f"{region_id} - {account_id} | ├── 数据库更新失败，Error: {result.get('code')} {result.get('message')}")
-                return
-            logger.debug(f"{region_id} - {account_id} | ├── 用户cache数据更新完成")
-        return
+        return ship_data
 
     def seconds_to_time(seconds: int) -> str:
         hours = seconds // 3600
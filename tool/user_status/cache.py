@@ -0,0 +1,60 @@
+from multiprocessing.managers import BaseManager
+
+
+class LookupCache:
+    '''用户名称和工会标签的查询缓存
+
+    通过批量的get_many/update读写，多进程模式下由CacheManager托管，每次调用只需要一次进程间通信
+    '''
+    def __init__(self):
+        self.data = {}
+
+    def get_many(self, keys: list) -> dict:
+        data = self.data
+        return {key: data[key] for key in keys if key in data}
+
+    def update(self, data: dict) -> None:
+        self.data.update(data)
+
+    def size(self) -> int:
+        return len(self.data)
+
+
+class SharedLookupCache:
+    '''进程内缓存 + 进程间共享缓存
+
+    先查询进程内缓存，未命中的部分再批量查询共享缓存，写入时同时写入两者
+    '''
+    def __init__(self, shared):
+        self.local = {}
+        self.shared = shared
+
+    def get_many(self, keys: list) -> dict:
+        local = self.local
+        result = {}
+        missing = []
+        for key in keys:
+            if key in local:
+                result[key] = local[key]
+            else:
+                missing.append(key)
+        if missing:
+            shared_result = self.shared.get_many(missing)
+            local.update(shared_result)
+            result.update(shared_result)
+        return result
+
+    def update(self, data: dict) -> None:
+        if not data:
+            return
+        self.local.update(data)
+        self.shared.update(data)
+
+    def size(self) -> int:
+        return self.shared.size()
+
+
+class CacheManager(BaseManager):
+    pass
+
+CacheManager.register('LookupCache', LookupCache)
@@ -11,15 +11,29 @@ class LoadConfig(BaseSettings):
     MYSQL_PORT: int
     MYSQL_USERNAME: str
     MYSQL_PASSWORD: str
+    MYSQL_POOL_SIZE: int = 4            # 连接池的最大连接数
+    SLOW_QUERY_TIME: float = 1.0        # 超过该耗时(s)的语句会记录为慢查询
 
     DB_NAME_MAIN: str
     DB_NAME_BOT: str
     DB_NAME_SHIP: str
+    # 船只缓存数据的存储方式
+    # tables: 每个船只一张ship_{id}表
+    # partitioned: 所有船只保存在按ship_id分区的ship_stats表中
+    SHIP_STORAGE: str = 'tables'
     
     RABBITMQ_HOST: str
     RABBITMQ_USERNAME: str
     RABBITMQ_PASSWORD: str
 
+    # 并行统计的进程数量，1表示在当前进程中逐个船只统计
+    BUILD_WORKERS: int = 1
+    # 服务器数据的统计方式
+    # mysql: 在数据库中汇总，只读取上榜的用户
+    # python: 读取所有用户数据逐行汇总
+    # check: 两种方式都执行并对比结果，使用python的结果
+    AGGREGATE_MODE: str = 'mysql'
+
     class Config:
         env_file = ".env"
         extra = 'allow'
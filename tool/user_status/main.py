@@ -4,14 +4,37 @@ import asyncio.selector_events
 import time
 import json
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from log import log as logger
 
 from update import Update
 from network import Network
+from config import settings
 from db import DatabaseConnection
+from cache import LookupCache, SharedLookupCache, CacheManager
+from writer import StatusWriter
 from model import update_game_version, get_game_version, get_ship_list
 
 
+# 子进程中的事件循环和缓存
+_worker = {}
+
+def init_worker(shared_user_cache, shared_clan_cache):
+    "子进程初始化，每个子进程使用独立的事件循环和数据库连接池"
+    _worker['loop'] = asyncio.new_event_loop()
+    _worker['loop'].run_until_complete(DatabaseConnection.init_pool())
+    _worker['user_cache'] = SharedLookupCache(shared_user_cache)
+    _worker['clan_cache'] = SharedLookupCache(shared_clan_cache)
+
+def build_ship(ship_id: int, version: dict, ship_tier: int):
+    "在子进程中统计单个船只的数据"
+    start_time = time.time()
+    ship_result = _worker['loop'].run_until_complete(
+        Update.main(ship_id, version, _worker['user_cache'], _worker['clan_cache'], ship_tier)
+    )
+    return ship_id, ship_result, time.time() - start_time
+
+
 class ContinuousUserCacheUpdater:
     def __init__(self):
         self.stop_event = asyncio.Event()  # 停止信号
@@ -24,9 +47,9 @@ class ContinuousUserCacheUpdater:
         #     if result['code'] != 1000:
         #         logger.error(f'{region_id} | 获取服务器最新版本失败')
         #     if result['data']['version']:
-        #         result = update_game_version(region_id, result['data']['version'])
+        #         result = await update_game_version(region_id, result['data']['version'])
 
-        # result = get_game_version()
+        # result = await get_game_version()
         result = {
             'status': 'ok', 
             'code': 1000, 
@@ -52,20 +75,16 @@ class ContinuousUserCacheUpdater:
         temp.close()
         for k, v in data.items():
             ship_data[int(k)] = v['tier']
-        ship_id_data = get_ship_list()
+        ship_id_data = await get_ship_list()
         if result['code'] != 1000:
             logger.error(f'读取服务器版本失败')
         elif result['code'] != 1000:
             logger.error(f'读取服务器船只列表失败')
         else:
-            user_cache = {}
-            clan_cache = {}
-            i = 0
-            for ship_id in ship_id_data['data']:
-                i += 1
-                logger.info(f"{ship_id} 缓存数据 用户: {len(user_cache)} 工会: {len(clan_cache)}")
-                await Update.main(ship_id, result['data'], user_cache, clan_cache, ship_data)
-                logger.info(f"{ship_id} 数据更新完成   [{i}/{len(ship_id_data['data'])}]")
+            if settings.BUILD_WORKERS > 1:
+                await self.build_parallel(ship_id_data['data'], result['data'], ship_data)
+            else:
+                await self.build_serial(ship_id_data['data'], result['data'], ship_data)
         end_time = int(time.time())
         # 避免测试时候的循环bug
         if end_time - start_time <= 4*60*60-10:
@@ -73,6 +92,69 @@ class ContinuousUserCacheUpdater:
             logger.info(f'更新线程休眠 {round(sleep_time,2)} s')
             await asyncio.sleep(sleep_time)
 
+    async def build_serial(self, ship_ids: list, version: dict, ship_data: dict):
+        "在当前进程中逐个船只统计"
+        user_cache = LookupCache()
+        clan_cache = LookupCache()
+        writer = StatusWriter(version)
+        i = 0
+        for ship_id in ship_ids:
+            i += 1
+            logger.info(f"{ship_id} 缓存数据 用户: {user_cache.size()} 工会: {clan_cache.size()}")
+            start_time = time.time()
+            ship_result = await Update.main(ship_id, version, user_cache, clan_cache, ship_data.get(ship_id, 1))
+            if ship_result:
+                writer.add(ship_id, ship_result)
+            logger.info(f"{ship_id} 数据更新完成, 耗时: {round(time.time() - start_time, 2)} s   [{i}/{len(ship_ids)}]")
+        writer.flush()
+
+    async def build_parallel(self, ship_ids: list, version: dict, ship_data: dict):
+        '''通过进程池并行统计
+
+        用户名称和工会标签的缓存由CacheManager在进程间共享，
+        统计结果按船只列表的顺序记录，输出和逐个统计时一致
+        '''
+        workers = settings.BUILD_WORKERS
+        logger.info(f'使用 {workers} 个进程并行统计')
+        writer = StatusWriter(version)
+        manager = CacheManager()
+        manager.start()
+        try:
+            shared_user_cache = manager.LookupCache()
+            shared_clan_cache = manager.LookupCache()
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(shared_user_cache, shared_clan_cache)
+            ) as executor:
+                pending = set()
+                finished = {}
+                next_index = 0  # 下一个需要写入结果的船只
+                submit_index = 0
+                while next_index < len(ship_ids):
+                    # 同时进行的任务数量不超过进程数量的两倍
+                    while submit_index < len(ship_ids) and len(pending) < workers * 2:
+                        ship_id = ship_ids[submit_index]
+                        future = loop.run_in_executor(executor, build_ship, ship_id, version, ship_data.get(ship_id, 1))
+                        pending.add(future)
+                        submit_index += 1
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        ship_id, ship_result, cost_time = future.result()
+                        finished[ship_id] = ship_result
+                        logger.info(f"{ship_id} 数据更新完成, 耗时: {round(cost_time, 2)} s")
+                    while next_index < len(ship_ids) and ship_ids[next_index] in finished:
+                        ship_id = ship_ids[next_index]
+                        ship_result = finished.pop(ship_id)
+                        if ship_result:
+                            writer.add(ship_id, ship_result)
+                        next_index += 1
+                    logger.info(f"已完成 [{next_index}/{len(ship_ids)}] 缓存数据 用户: {shared_user_cache.size()} 工会: {shared_clan_cache.size()}")
+        finally:
+            manager.shutdown()
+        writer.flush()
+
     async def continuous_update(self):
         # 持续循环更新，直到接收到停止信号
         # 似乎写不写没区别(
@@ -83,6 +165,8 @@ class ContinuousUserCacheUpdater:
         self.stop_event.set()  # 设置停止事件
 
 async def main():
+    # 连接池需要在事件循环中创建
+    await DatabaseConnection.init_pool()
     updater = ContinuousUserCacheUpdater()
 
     # 创建并启动异步更新任务
@@ -91,17 +175,17 @@ async def main():
         await update_task
     except asyncio.CancelledError:
         updater.stop()
+    finally:
+        # 退出并释放资源
+        await DatabaseConnection.close_pool()
 
 if __name__ == "__main__":
     logger.info('开始运行UserCache更新进程')
-    DatabaseConnection.init_pool()
     # 开始不间断更新
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info('收到进程关闭信号')
-    # 退出并释放资源
-    DatabaseConnection.close_pool()
     wait_second = 3
     while wait_second > 0:
         logger.info(f'进程将在 {wait_second} s后关闭')
@@ -1,7 +1,8 @@
 import time
 import traceback
-import pymysql
-from db import DatabaseConnection
+import aiomysql
+from db import transaction, stream_rows
+from common import SHIP_CACHE_KEYS, get_ship_storage
 
 from config import settings
 from log import log as logger
@@ -10,246 +11,182 @@ MAIN_DB = settings.DB_NAME_MAIN
 BOT_DB = settings.DB_NAME_BOT
 CACHE_DB = settings.DB_NAME_SHIP
 
+# 船只缓存数据的存储方式
+SHIP_STORAGE = get_ship_storage(settings.SHIP_STORAGE, CACHE_DB)
 
-def get_ship_list():
+
+async def get_ship_list():
     """获取存在的船只id列表"""
-    pool = DatabaseConnection.get_pool()
-    conn = pool.connection()
-    cur = None
     try:
-        conn.begin()
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-
-        cur.execute(
-            f"SELECT ship_id FROM {CACHE_DB}.existing_ships"
-        )
-        data = []
-        rows = cur.fetchall()
-        for row in rows:
-            data.append(row['ship_id'])
-        
-        conn.commit()
+        async with transaction() as cur:
+            await cur.execute(
+                f"SELECT ship_id FROM {CACHE_DB}.existing_ships"
+            )
+            data = []
+            rows = await cur.fetchall()
+            for row in rows:
+                data.append(row['ship_id'])
         return {'status': 'ok','code': 1000,'message': 'Success','data': data}
     except Exception:
-        conn.rollback()
         logger.error(traceback.format_exc())
         return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
-    finally:
-        if cur:
-            cur.close()
-        conn.close()
 
-def get_game_version():
+async def get_game_version():
     """从数据库中读取当前的版本，主要是用于接口维护的时候"""
-    pool = DatabaseConnection.get_pool()
-    conn = pool.connection()
-    cur = None
     try:
-        conn.begin()
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-
-        cur.execute(
-            f"SELECT region_id, game_version, UNIX_TIMESTAMP(version_start) AS start_time FROM {MAIN_DB}.region_version;"
-        )
-        rows = cur.fetchall()
-        data = {}
-        for row in rows:
-            data[row['region_id']] = [row['game_version'], row['start_time']]
-        
-        conn.commit()
+        async with transaction() as cur:
+            await cur.execute(
+                f"SELECT region_id, game_version, UNIX_TIMESTAMP(version_start) AS start_time FROM {MAIN_DB}.region_version;"
+            )
+            rows = await cur.fetchall()
+            data = {}
+            for row in rows:
+                data[row['region_id']] = [row['game_version'], row['start_time']]
         return {'status': 'ok','code': 1000,'message': 'Success','data': data}
     except Exception:
-        conn.rollback()
         logger.error(traceback.format_exc())
         return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
-    finally:
-        if cur:
-            cur.close()
-        conn.close()
-
-def update_game_version(region_id: int, game_version: str):
-    pool = DatabaseConnection.get_pool()
-    conn = pool.connection()
-    cur = None
+
+async def update_game_version(region_id: int, game_version: str):
     try:
-        conn.begin()
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-
-        version = ".".join(game_version.split(".")[:2])
-        cur.execute(
-            f"SELECT game_version FROM {MAIN_DB}.region_version WHERE region_id = %s;",
-            [region_id]
-        )
-        row = cur.fetchone()
-        if row['game_version'] != version:
-            cur.execute(
-                f"UPDATE {MAIN_DB}.region_version SET game_version = %s, "
-                "version_start = CURRENT_TIMESTAMP, full_version = %s WHERE region_id = %s;",
-                [version, game_version, region_id]
+        async with transaction() as cur:
+            version = ".".join(game_version.split(".")[:2])
+            await cur.execute(
+                f"SELECT game_version FROM {MAIN_DB}.region_version WHERE region_id = %s;",
+                [region_id]
             )
-        else:
-            cur.execute(
-                f"UPDATE {MAIN_DB}.region_version SET full_version = %s WHERE region_id = %s;",
-                [game_version, region_id]
-            )
-        
-        conn.commit()
+            row = await cur.fetchone()
+            if row['game_version'] != version:
+                await cur.execute(
+                    f"UPDATE {MAIN_DB}.region_version SET game_version = %s, "
+                    "version_start = CURRENT_TIMESTAMP, full_version = %s WHERE region_id = %s;",
+                    [version, game_version, region_id]
+                )
+            else:
+                await cur.execute(
+                    f"UPDATE {MAIN_DB}.region_version SET full_version = %s WHERE region_id = %s;",
+                    [game_version, region_id]
+                )
         return {'status': 'ok','code': 1000,'message': 'Success','data': None}
     except Exception:
-        conn.rollback()
         logger.error(traceback.format_exc())
         return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
-    finally:
-        if cur:
-            cur.close()
-        conn.close()
 
 
-def get_ship_max_number(ship_id: int):
-    '''获取数据库中id的最大值
+async def stream_cache(ship_id: int, limit = 10000, fetch_size = 1000):
+    '''遍历船只表中的用户数据
+
+    按主键分页读取，用于服务器数据的统计，读取顺序由SHIP_STORAGE决定
 
-    获取id的最大值，用于数据库遍历更新时确定边界
+    每一行只做累加，通过服务端游标流式读取，内存中最多只保留fetch_size行
 
     参数:
-        - ship_id
+        ship_id: 船只id
+        limit: 每页读取多少条数据
+        fetch_size: 每次从服务器读取多少条数据
+
+    返回:
+        异步生成器，逐行返回用户数据
+    '''
+    for select_sql, key_column, key_name, where, params in SHIP_STORAGE.get_stream_queries(
+        ship_id, ['account_id', 'region_id'] + SHIP_CACHE_KEYS
+    ):
+        async for row in stream_rows(
+            select_sql, key_column, key_name, where, params, limit=limit, fetch_size=fetch_size
+        ):
+            yield row
+
+async def get_ship_region_total(ship_id: int, update_keys: list):
+    '''在数据库中按服务器汇总船只数据
+
+    参数:
+        ship_id: 船只id
+        update_keys: 需要求和的字段
+
+    返回:
+        data: {region_id: [user_count, sum(key) ...]}
     '''
-    pool = DatabaseConnection.get_pool()
-    conn = pool.connection()
-    cur = None
     try:
-        conn.begin()
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-
-        cur.execute(
-            f"SELECT MAX(id) AS max_id FROM {CACHE_DB}.ship_{ship_id};"
-        )
-        data = cur.fetchone()
-        
-        conn.commit()
+        async with transaction() as cur:
+            await cur.execute(*SHIP_STORAGE.get_region_total_sql(ship_id, update_keys))
+            data = {}
+            for row in await cur.fetchall():
+                # SUM的结果为Decimal
+                data[row['region_id']] = [int(row['user_count'])] + [int(row[key] or 0) for key in update_keys]
         return {'status': 'ok','code': 1000,'message': 'Success','data': data}
     except Exception:
-        conn.rollback()
         logger.error(traceback.format_exc())
         return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
-    finally:
-        if cur:
-            cur.close()
-        conn.close()
 
-def get_cache_batch(ship_id: int, offset: int, limit = 1000):
-    '''批量获取用户缓存的数据
-
-    获取用户缓存数据，用于缓存的更新
+async def get_leader_batch(ship_id: int, battles_limit: int, leader_keys: list):
+    '''获取场次达到排行榜要求的用户数据
 
     参数:
-        offset: 从哪个id开始读取
-        limit: 每次读取多少条数据
+        ship_id: 船只id
+        battles_limit: 上榜需要的最低场次
+        leader_keys: 需要读取的字段
     '''
-    pool = DatabaseConnection.get_pool()
-    conn = pool.connection()
-    cur = None
     try:
-        conn.begin()
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-
-        data = []
-        cur.execute(
-            "SELECT account_id, region_id, battles_count, battle_type_1, battle_type_2, "
-            "battle_type_3, wins, damage_dealt, frags, exp, survived, scouting_damage, "
-            "art_agro, planes_killed, max_exp, max_damage_dealt, max_frags "
-            f"FROM {CACHE_DB}.ship_%s "
-            "WHERE id BETWEEN %s AND %s;", 
-            [ship_id, offset+1, offset+limit]
-        )
-        data = cur.fetchall()
-        
-        conn.commit()
+        async with transaction(aiomysql.Cursor) as cur:
+            await cur.execute(*SHIP_STORAGE.get_leader_sql(ship_id, leader_keys, battles_limit))
+            data = list(await cur.fetchall())
         return {'status': 'ok','code': 1000,'message': 'Success','data': data}
     except Exception:
-        conn.rollback()
         logger.error(traceback.format_exc())
         return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
-    finally:
-        if cur:
-            cur.close()
-        conn.close()
-
-def get_user_name(user_list: list):
-    pool = DatabaseConnection.get_pool()
-    conn = pool.connection()
-    cur = None
+
+async def get_user_name(user_list: list):
     try:
-        conn.begin()
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-
-        data = {}
-        i = 0
-        limit = 1000
-        while user_list[i: i + limit] != []:
-            region_list = []
-            id_list = []
-            for user in user_list[i: i + limit]:
-                region_list.append(user[0])
-                id_list.append(user[1])
-            region_ids_str = ', '.join(map(str, region_list))
-            id_ids_str = ', '.join(map(str, id_list))
-            cur.execute(
-                f"SELECT b.account_id, b.region_id, i.active_level, b.username, c.clan_id FROM {MAIN_DB}.user_basic AS b "
-                F"LEFT JOIN {MAIN_DB}.user_info AS i ON b.account_id = i.account_id "
-                f"LEFT JOIN {MAIN_DB}.user_clan AS c ON b.account_id = c.account_id "
-                f"WHERE b.region_id IN ({region_ids_str}) AND b.account_id IN ({id_ids_str});"
-            )
-            rows = cur.fetchall()
-            for row in rows:
-                data[row['account_id']] = [row['username'], row['region_id'], row['clan_id'], row['active_level']]
-            i += limit
-        
-        conn.commit()
+        async with transaction() as cur:
+            data = {}
+            i = 0
+            limit = 1000
+            while user_list[i: i + limit] != []:
+                region_list = []
+                id_list = []
+                for user in user_list[i: i + limit]:
+                    region_list.append(user[0])
+                    id_list.append(user[1])
+                region_ids_str = ', '.join(map(str, region_list))
+                id_ids_str = ', '.join(map(str, id_list))
+                await cur.execute(
+                    f"SELECT b.account_id, b.region_id, i.active_level, b.username, c.clan_id FROM {MAIN_DB}.user_basic AS b "
+                    F"LEFT JOIN {MAIN_DB}.user_info AS i ON b.account_id = i.account_id "
+                    f"LEFT JOIN {MAIN_DB}.user_clan AS c ON b.account_id = c.account_id "
+                    f"WHERE b.region_id IN ({region_ids_str}) AND b.account_id IN ({id_ids_str});"
+                )
+                rows = await cur.fetchall()
+                for row in rows:
+                    data[row['account_id']] = [row['username'], row['region_id'], row['clan_id'], row['active_level']]
+                i += limit
         return {'status': 'ok','code': 1000,'message': 'Success','data': data}
     except Exception:
-        conn.rollback()
         logger.error(traceback.format_exc())
         return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
-    finally:
-        if cur:
-            cur.close()
-        conn.close()
-
-def get_clan_tag(clan_list: list):
-    pool = DatabaseConnection.get_pool()
-    conn = pool.connection()
-    cur = None
+
+async def get_clan_tag(clan_list: list):
     try:
-        conn.begin()
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-
-        data = {}
-        i = 0
-        limit = 1000
-        while clan_list[i: i + limit] != []:
-            region_list = []
-            id_list = []
-            for user in clan_list[i: i + limit]:
-                region_list.append(user[0])
-                id_list.append(user[1])
-            region_ids_str = ', '.join(map(str, region_list))
-            id_ids_str = ', '.join(map(str, id_list))
-            cur.execute(
-                f"SELECT clan_id, tag, league FROM {MAIN_DB}.clan_basic "
-                f"WHERE region_id IN ({region_ids_str}) AND clan_id IN ({id_ids_str});"
-            )
-            rows = cur.fetchall()
-            for row in rows:
-                data[row['clan_id']] = [row['tag'], row['league']]
-            i += limit
-        
-        conn.commit()
+        async with transaction() as cur:
+            data = {}
+            i = 0
+            limit = 1000
+            while clan_list[i: i + limit] != []:
+                region_list = []
+                id_list = []
+                for user in clan_list[i: i + limit]:
+                    region_list.append(user[0])
+                    id_list.append(user[1])
+                region_ids_str = ', '.join(map(str, region_list))
+                id_ids_str = ', '.join(map(str, id_list))
+                await cur.execute(
+                    f"SELECT clan_id, tag, league FROM {MAIN_DB}.clan_basic "
+                    f"WHERE region_id IN ({region_ids_str}) AND clan_id IN ({id_ids_str});"
+                )
+                rows = await cur.fetchall()
+                for row in rows:
+                    data[row['clan_id']] = [row['tag'], row['league']]
+                i += limit
         return {'status': 'ok','code': 1000,'message': 'Success','data': data}
     except Exception:
-        conn.rollback()
         logger.error(traceback.format_exc())
         return {'status': 'error','code': 3000,'message': 'DatabaseError','data': None}
-    finally:
-        if cur:
-            cur.close()
-        conn.close()
@@ -1,12 +1,14 @@
 import os
-import json
 import time
 import csv
 import traceback
 
 from log import log as logger
 from config import settings
-from model import get_ship_max_number, get_cache_batch, get_clan_tag, get_user_name
+from model import (
+    stream_cache, get_clan_tag, get_user_name,
+    get_ship_region_total, get_leader_batch
+)
 
 
 OLD_SHIP_ID_LIST = [
@@ -49,184 +51,262 @@ OLD_SHIP_ID_LIST = [
     '4279219920'
 ]
 
+# 服务器数据统计的字段
+UPDATE_KEYS = [
+    'battles_count', 'wins', 'damage_dealt',
+    'frags', 'exp', 'survived', 'scouting_damage',
+    'art_agro', 'planes_killed'
+]
+# 各等级上榜需要的最低场次
+LEADERBOARD_LIMIT = {
+    6: 40, 7: 40,
+    8: 40, 9: 50,
+    10: 60, 11: 60
+}
+# 排行榜需要保留的用户字段
+LEADER_KEYS = [
+    'account_id', 'region_id', 'battles_count', 'battle_type_1', 'wins',
+    'damage_dealt', 'frags', 'exp', 'max_damage_dealt', 'max_frags', 'max_exp'
+]
+
 class Update:
     @classmethod
-    async def main(self, ship_id: int, version: dict, user_cache: dict, clan_cache: dict, ship_data: dict):
+    async def main(self, ship_id: int, version: dict, user_cache, clan_cache, ship_tier: int):
         '''UserCache更新入口函数
+
+        参数:
+            user_cache/clan_cache: 用户名称和工会标签的缓存，需要实现get_many/update
+
+        返回:
+            dict 各服务器的统计数据 {region_id: {'total','status'}}，发生错误时返回None
         '''
         start_time = time.time()
         try:
             logger.debug(f'{ship_id} | ┌── 开始统计更新流程')
-            await self.service_master(self, ship_id, version, user_cache, clan_cache, ship_data)
+            return await self.service_master(self, ship_id, version, user_cache, clan_cache, ship_tier)
         except:
             error = traceback.format_exc()
             logger.error(f'{ship_id} | ├── 数据更新时发生错误')
             logger.error(f'Error: {error}')
+            return None
         finally:
             cost_time = time.time() - start_time
             logger.debug(f'{ship_id} | └── 本次更新完成, 耗时: {round(cost_time,2)} s')
 
-    async def service_master(self, ship_id: int, version: dict, user_cache: dict, clan_cache: dict, ship_data: dict):
-        request_result = get_ship_max_number(ship_id)
-        if request_result['code'] != 1000:
-            logger.error(f"{ship_id} | ├── 获取表MaxID时发生错误，Error: {request_result.get('message')}")
-            return
-        max_offset = request_result['data']['max_id']
-        limit = 1000
-        offset = 0
-        total_result = {
-            0: {}, 1: {}, 2: {}, 3: {}, 4: {}, 5: {}
-        }
-        status_result = {
-            0: {}, 1: {}, 2: {}, 3: {}, 4: {}, 5: {}
-        }
-        leader_list = []    # 符合排行榜场次的用户
-        update_keys = [
-            'battles_count', 'wins', 'damage_dealt',
-            'frags', 'exp', 'survived', 'scouting_damage',
-            'art_agro', 'planes_killed'
-        ]
-        ship_tier = ship_data.get(ship_id, 1)
-        leaderboard_limit = {
-            6: 40, 7: 40,
-            8: 40, 9: 50,
-            10: 60, 11: 60
-        }
-        while offset <= max_offset:
-            cache_result = get_cache_batch(ship_id, offset, limit)
-            if cache_result['code'] == 1000:
-                i = 1
-                for user in cache_result['data']:
-                    if user['battles_count'] >= leaderboard_limit.get(ship_tier, 99999):
-                        leader_list.append(user)
-                    region_id = user['region_id']
-                    if total_result[0] == {}:
-                        for key in update_keys:
-                            total_result[0][key] = 0
-                    if total_result[region_id] == {}:
-                        for key in update_keys:
-                            total_result[region_id][key] = 0
-                    else:
-                        for key in update_keys:
-                            total_result[0][key] += user[key]
-                            total_result[region_id][key] += user[key]
-                    i += 1
-            else:
-                logger.error(f"{ship_id} | ├── 获取cache时发生错误，Error: {cache_result.get('message')}")
-            offset += limit
-        for region_id in total_result.keys():
-            if total_result[region_id] != {}:
-                for key in update_keys:
-                    status_result[region_id][key] = 0
-                if total_result[region_id][update_keys[0]] == 0:
-                    continue
-                status_result[region_id][update_keys[0]] = total_result[region_id][update_keys[0]]
-                for key in update_keys[1:]:
-                    status_result[region_id][key] = round(total_result[region_id][key]/total_result[region_id][update_keys[0]],6)
-        for region_id in [0, 1, 2, 3, 4, 5]:
-            result = {
-                'total': total_result[region_id],
-                'status': status_result[region_id]
-            }
-            if result['total'] == {}:
+    async def service_master(self, ship_id: int, version: dict, user_cache, clan_cache, ship_tier: int):
+        need_leaderboard = str(ship_id) not in OLD_SHIP_ID_LIST and ship_tier > 5
+        battles_limit = LEADERBOARD_LIMIT.get(ship_tier, 99999) if need_leaderboard else None
+        aggregate_mode = settings.AGGREGATE_MODE
+        if aggregate_mode == 'mysql':
+            aggregate_result = await self.aggregate_by_mysql(ship_id, battles_limit)
+        else:
+            aggregate_result = await self.aggregate_by_rows(ship_id, battles_limit)
+            if aggregate_mode == 'check' and aggregate_result is not None:
+                self.check_aggregate_result(ship_id, aggregate_result, await self.aggregate_by_mysql(ship_id, battles_limit))
+        if aggregate_result is None:
+            return None
+        total_list, user_count, leader_list = aggregate_result
+        ship_result = self.get_status_result(total_list, user_count)
+        logger.debug(f"{ship_id} | ├── 船只服务器数据统计完成")
+        if not need_leaderboard:
+            logger.debug(f"{ship_id} | ├── 船只不符合排行榜要求")
+            return ship_result
+        await self.update_leaderboard(ship_id, leader_list, ship_result, user_cache, clan_cache)
+        return ship_result
+
+    async def aggregate_by_rows(ship_id: int, battles_limit: int | None):
+        '''读取所有用户数据逐行汇总
+
+        参数:
+            battles_limit: 上榜需要的最低场次，None表示不需要排行榜数据
+
+        返回:
+            (total_list, user_count, leader_list)，发生错误时返回None
+        '''
+        # 各服务器数据的累加值，0表示全部服务器，固定大小，不保存每一行的数据
+        total_list = [[0] * len(UPDATE_KEYS) for _ in range(6)]
+        user_count = [0] * 6
+        leader_list = []    # 符合排行榜场次的用户，只保留计算排行榜需要的字段
+        async for user in stream_cache(ship_id):
+            region_id = user['region_id']
+            values = [user[key] for key in UPDATE_KEYS]
+            region_total = total_list[region_id]
+            all_total = total_list[0]
+            for k, value in enumerate(values):
+                region_total[k] += value
+                all_total[k] += value
+            user_count[region_id] += 1
+            user_count[0] += 1
+            if battles_limit is not None and user['battles_count'] >= battles_limit:
+                leader_list.append(tuple(user[key] for key in LEADER_KEYS))
+        return total_list, user_count, leader_list
+
+    async def aggregate_by_mysql(ship_id: int, battles_limit: int | None):
+        '''在数据库中按服务器汇总，只读取上榜用户的数据
+
+        参数和返回值同aggregate_by_rows
+        '''
+        total_list = [[0] * len(UPDATE_KEYS) for _ in range(6)]
+        user_count = [0] * 6
+        total_result = await get_ship_region_total(ship_id, UPDATE_KEYS)
+        if total_result['code'] != 1000:
+            logger.error(f"{ship_id} | ├── 汇总数据时发生错误，Error: {total_result.get('message')}")
+            return None
+        for region_id, values in total_result['data'].items():
+            user_count[region_id] += values[0]
+            user_count[0] += values[0]
+            for k, value in enumerate(values[1:]):
+                total_list[region_id][k] += value
+                total_list[0][k] += value
+        leader_list = []
+        if battles_limit is not None:
+            leader_result = await get_leader_batch(ship_id, battles_limit, LEADER_KEYS)
+            if leader_result['code'] != 1000:
+                logger.error(f"{ship_id} | ├── 获取排行榜用户时发生错误，Error: {leader_result.get('message')}")
+                return None
+            leader_list = [tuple(row) for row in leader_result['data']]
+        return total_list, user_count, leader_list
+
+    def check_aggregate_result(ship_id: int, row_result: tuple, mysql_result: tuple | None) -> bool:
+        "对比两种统计方式的结果是否一致"
+        if mysql_result is None:
+            logger.error(f"{ship_id} | ├── 统计结果对比失败，数据库汇总发生错误")
+            return False
+        names = ['total_list', 'user_count', 'leader_list']
+        matched = True
+        for name, row_value, mysql_value in zip(names, row_result, mysql_result):
+            if row_value != mysql_value:
+                matched = False
+                logger.error(f"{ship_id} | ├── 统计结果不一致: {name}")
+        if matched:
+            logger.debug(f"{ship_id} | ├── 统计结果一致")
+        return matched
+
+    def get_status_result(total_list: list, user_count: list) -> dict:
+        '''根据累加值计算各服务器的统计数据
+
+        没有用户数据的服务器不会出现在结果中
+        '''
+        result = {}
+        for region_id in range(6):
+            if user_count[region_id] == 0:
                 continue
-            if region_id == 0:
-                file_path = os.path.join(settings.CACHE_PATH, 'main.json')
-                self.update_json(file_path, ship_id, result)
-            else:
-                region_version = version.get(region_id)[0]
-                file_path = os.path.join(settings.CACHE_PATH, str(region_id), f'{region_version}.json')
-                self.update_json(file_path, ship_id, result)
+            total = dict(zip(UPDATE_KEYS, total_list[region_id]))
+            status = {key: 0 for key in UPDATE_KEYS}
+            battles_count = total[UPDATE_KEYS[0]]
+            if battles_count != 0:
+                status[UPDATE_KEYS[0]] = battles_count
+                for key in UPDATE_KEYS[1:]:
+                    status[key] = round(total[key]/battles_count,6)
+            result[region_id] = {
+                'total': total,
+                'status': status
+            }
+        return result
+
+    @classmethod
+    async def update_leaderboard(self, ship_id: int, leader_list: list, ship_result: dict, user_cache, clan_cache):
+        "计算排行榜数据并写入csv"
         # 用户缓存数据读取
-        logger.debug(f"{ship_id} | ├── 船只服务器数据更新完成")
-        if str(ship_id) in OLD_SHIP_ID_LIST or ship_tier <= 5:
-            logger.debug(f"{ship_id} | ├── 船只不符合排行榜要求")
-            return
-        nocache_user = []
-        nocache_clan = []
-        for user in leader_list:
-            if user['account_id'] not in user_cache:
-                nocache_user.append([user['region_id'], user['account_id']])
-        user_cache_result = get_user_name(nocache_user)
+        account_ids = list({user[0] for user in leader_list})
+        user_info = user_cache.get_many(account_ids)
+        nocache_user = [
+            [user[1], user[0]] for user in leader_list if user[0] not in user_info
+        ]
+        user_cache_result = await get_user_name(nocache_user)
         if user_cache_result['code'] != 1000:
             logger.error(f"{ship_id} | ├── 读取用户名称数据失败")
         else:
+            new_user_info = {}
             for k, v in user_cache_result['data'].items():
-                user_cache[k] = [v[0], v[2], v[3]]
-                if v[2] and v[2] not in clan_cache:
-                    nocache_clan.append([v[1], v[2]])
+                new_user_info[k] = [v[0], v[2], v[3], v[1]]
+            user_cache.update(new_user_info)
+            user_info.update(new_user_info)
             logger.debug(f"{ship_id} | ├── 读取 {len(nocache_user)} 个用户缓存")
-        clan_cache_result = get_clan_tag(nocache_clan)
+        clan_ids = list({v[1] for v in user_info.values() if v[1]})
+        clan_info = clan_cache.get_many(clan_ids)
+        nocache_clan = []
+        for v in user_info.values():
+            if v[1] and v[1] not in clan_info:
+                nocache_clan.append([v[3], v[1]])
+        clan_cache_result = await get_clan_tag(nocache_clan)
         if clan_cache_result['code'] != 1000:
             logger.error(f"{ship_id} | ├── 读取工会名称数据失败")
         else:
+            new_clan_info = {}
             for k, v in clan_cache_result['data'].items():
-                clan_cache[k] = [v[0], v[1]]
+                new_clan_info[k] = [v[0], v[1]]
+            clan_cache.update(new_clan_info)
+            clan_info.update(new_clan_info)
             logger.debug(f"{ship_id} | ├── 读取 {len(nocache_clan)} 个工会缓存")
         # 计算排行榜
+        empty_status = {'battles_count': 0}
+        server_status = {
+            region_id: ship_result.get(region_id, {}).get('status', empty_status)
+            for region_id in range(6)
+        }
         leaderboard = {}
         sort_dict = {}
         remove_user = 0
         for user in leader_list:
-            user_info = user_cache.get(user['account_id'], ['NULL', None, 0])
-            clan_info = clan_cache.get(user_info[1], ['NULL', 5]) if user_info[1] else None
-            if user_info[2] == 9:
+            (
+                account_id, region_id, battles_count, battle_type_1, wins,
+                damage_dealt, frags, exp, max_damage_dealt, max_frags, max_exp
+            ) = user
+            info = user_info.get(account_id, ['NULL', None, 0])
+            clan = clan_info.get(info[1], ['NULL', 5]) if info[1] else None
+            if info[2] == 9:
                 remove_user += 1
                 continue
-            battles_count = user['battles_count']
-            user_ship_data = [
-                battles_count, user['wins'], user['damage_dealt'], user['frags']
-            ]
+            user_ship_data = [battles_count, wins, damage_dealt, frags]
             basic_rating = self.get_rating_by_data(
                 ship_data = user_ship_data,
                 server_data = [
-                    status_result[0]['wins'], 
-                    status_result[0]['damage_dealt'], 
-                    status_result[0]['frags']
-                ] if status_result[0]['battles_count'] >= 1000 else {}
+                    server_status[0]['wins'], 
+                    server_status[0]['damage_dealt'], 
+                    server_status[0]['frags']
+                ] if server_status[0]['battles_count'] >= 1000 else {}
             )
             region_rating = self.get_rating_by_data(
                 ship_data = user_ship_data,
                 server_data = [
-                    status_result[user['region_id']]['wins'], 
-                    status_result[user['region_id']]['damage_dealt'], 
-                    status_result[user['region_id']]['frags']
-                ] if status_result[user['region_id']]['battles_count'] >= 1000 else {}
+                    server_status[region_id]['wins'], 
+                    server_status[region_id]['damage_dealt'], 
+                    server_status[region_id]['frags']
+                ] if server_status[region_id]['battles_count'] >= 1000 else {}
             )
             if region_rating[0] == -1:
                 continue
-            sort_dict[user['account_id']] = region_rating[0]
+            sort_dict[account_id] = region_rating[0]
             rating_diff = int(region_rating[0]) - int(basic_rating[0])
             rating_info = str(int(basic_rating[0])) + (' + ' + str(rating_diff) if rating_diff >= 0 else ' - ' + str(abs(rating_diff)))
-            temp = {
+            leaderboard[account_id] = {
                 # 用户信息
-                'account_id': str(user['account_id']),
-                'region_id': str(user['region_id']),
-                'clan_id': user_info[1],
-                'user_name': user_info[0],
-                'clan_tag': clan_info[0] if clan_info else None,
+                'account_id': str(account_id),
+                'region_id': str(region_id),
+                'clan_id': info[1],
+                'user_name': info[0],
+                'clan_tag': clan[0] if clan else None,
                 # 场次
-                'battles_count': str(user['battles_count']),
-                'battle_type': str(round(user['battle_type_1']/battles_count*100,2)),
+                'battles_count': str(battles_count),
+                'battle_type': str(round(battle_type_1/battles_count*100,2)),
                 # 评分
                 'rating': str(int(region_rating[0])),
                 'rating_info': rating_info,
                 # 基本数据
-                'win_rate': str(round(user['wins']/battles_count*100, 2)),
-                'avg_dmg': str(int(user['damage_dealt']/battles_count)),
-                'avg_frags': str(round(user['frags']/battles_count, 2)),
-                'avg_exp': str(int(user['exp']/battles_count)),
+                'win_rate': str(round(wins/battles_count*100, 2)),
+                'avg_dmg': str(int(damage_dealt/battles_count)),
+                'avg_frags': str(round(frags/battles_count, 2)),
+                'avg_exp': str(int(exp/battles_count)),
                 # 最高记录
-                'max_dmg': str(user['max_damage_dealt']),
-                'max_frags': str(user['max_frags']),
-                'max_exp': str(user['max_exp'])
+                'max_dmg': str(max_damage_dealt),
+                'max_frags': str(max_frags),
+                'max_exp': str(max_exp)
             }
-            leaderboard[user['account_id']] = temp
         logger.debug(f"{ship_id} | ├── 不活跃下榜用户数量 {remove_user}")
         sorted_dict = dict(sorted(sort_dict.items(), key=lambda item: item[1], reverse=True))
         if len(sorted_dict) == 0:
             return
-        i = 0
         data = []
         region_ids = {
             '1': 'Asia',
@@ -241,7 +321,6 @@ class Update:
             user_data['battle_type'] = user_data['battle_type'] + '%'
             user_data['win_rate'] = user_data['win_rate'] + '%'
             data.append(user_data)
-            i += 1
         csv_file_path = os.path.join(settings.LEADER_PATH, f'{ship_id}.csv')
         fields = ['region', 'region_id', 'clan_tag', 'clan_id', 'user_name', 'account_id', 'battles_count', 'battle_type', 'rating', 'rating_info', 'win_rate', 'avg_dmg', 'avg_frags', 'avg_exp', 'max_dmg', 'max_frags', 'max_exp']
         with open(csv_file_path, mode='w', newline='', encoding='utf-8') as file:
@@ -251,22 +330,6 @@ class Update:
         logger.debug(f"{ship_id} | ├── 排行榜数据更新完成")
         return 
     
-    def update_json(file_path: str, ship_id: int, ship_data: dict):
-        if os.path.exists(file_path):
-            temp = open(file_path, "r", encoding="utf-8")
-            data = json.load(temp)
-            temp.close()
-            data[str(ship_id)] = ship_data
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(data, ensure_ascii=False))
-            f.close()
-        else:
-            data = {}
-            data[str(ship_id)] = ship_data
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(data, ensure_ascii=False))
-            f.close()
-        
     def get_rating_by_data(
         ship_data: list,
         server_data: list
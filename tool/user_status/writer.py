@@ -0,0 +1,81 @@
+import os
+import json
+import time
+
+from log import log as logger
+from config import settings
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def write_atomic(file_path: str, content: bytes) -> None:
+    "先写入临时文件再替换，读取方不会读到写入到一半的文件"
+    temp_path = f'{file_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, file_path)
+
+
+class StatusWriter:
+    '''服务器统计数据的批量写入
+
+    一次统计过程中的结果先保存在内存中，结束后每个文件只读取和写入一次
+
+    文件通过os.replace整体替换，读取方通过文件的mtime/size即可检测数据是否更新
+
+    写入完成后更新manifest.json，只记录数据版本、更新时间以及每个文件的大小和船只数量，用于运维查看
+    '''
+    def __init__(self, version: dict):
+        self.version = version
+        # {file_path: {ship_id: result}}
+        self.files: dict[str, dict] = {}
+
+    def get_file_path(self, region_id: int) -> str:
+        if region_id == 0:
+            return os.path.join(settings.CACHE_PATH, 'main.json')
+        region_version = self.version.get(region_id)[0]
+        return os.path.join(settings.CACHE_PATH, str(region_id), f'{region_version}.json')
+
+    def add(self, ship_id: int, ship_result: dict) -> None:
+        "记录单个船只的统计数据 {region_id: {'total','status'}}"
+        for region_id, result in ship_result.items():
+            file_path = self.get_file_path(region_id)
+            if file_path not in self.files:
+                self.files[file_path] = {}
+            self.files[file_path][str(ship_id)] = result
+
+    def flush(self) -> dict:
+        '''将所有结果写入文件并更新manifest
+
+        已有文件中本次没有统计的船只数据会被保留
+
+        返回:
+            dict manifest数据
+        '''
+        manifest_path = os.path.join(settings.CACHE_PATH, MANIFEST_NAME)
+        manifest = {'version': 0, 'files': {}}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        for file_path, ship_results in self.files.items():
+            data = {}
+            if os.path.exists(file_path):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            data.update(ship_results)
+            content = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            write_atomic(file_path, content)
+            manifest['files'][os.path.relpath(file_path, settings.CACHE_PATH)] = {
+                'size': len(content),
+                'ships': len(data)
+            }
+            logger.debug(f'{file_path} 写入 {len(ship_results)} 个船只数据')
+        manifest['version'] += 1
+        manifest['updated_at'] = int(time.time())
+        write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+        logger.info(f"统计数据写入完成, 版本: {manifest['version']}")
+        self.files = {}
+        return manifest